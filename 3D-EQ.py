@@ -1,17 +1,2482 @@
 # 3D-EQ.py
 
+import argparse
+import bisect
+import fcntl
+import gzip
+import hashlib
+import heapq
+import json
+import mimetypes
+import mmap
 import os
-from flask import Flask, render_template_string
+import queue
+import shutil
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from urllib.parse import urlencode, urlsplit
 
-# Define Flask app
-app = Flask(__name__)
+import numpy as np
+from flask import Flask, Response, abort, jsonify, render_template_string, request
 
-# Retrieve the Cesium Ion Access Token from environment variables
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from gevent.monkey import get_original
+except ImportError:
+    get_original = None
+
+# Define Flask app; static assets are served by our own content-hashed route
+app = Flask(__name__, static_folder=None)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Long-lived caching for content-hashed assets
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# CesiumJS release loaded by the pages
+CESIUM_URL = 'https://cesium.com/downloads/cesiumjs/releases/1.104/Build/Cesium'
+
+# Service worker keeping the page shell and recent API payloads for instant repeat visits
+# (0 serves a worker that clears its caches and unregisters itself)
+OFFLINE_CACHE = os.environ.get('OFFLINE_CACHE', '1') != '0'
+
+# Retrieve the Cesium Ion Access Token from environment variables (required to serve the pages)
 CESIUM_ION_ACCESS_TOKEN = os.environ.get('CESIUM_ION_ACCESS_TOKEN')
 
-# Ensure the Cesium Ion Access Token is available
-if not CESIUM_ION_ACCESS_TOKEN:
-    raise ValueError("CESIUM_ION_ACCESS_TOKEN environment variable is not set.")
+# Upstream USGS FDSN event service (override to point at a local fake server)
+USGS_BASE_URL = os.environ.get('USGS_BASE_URL', 'https://earthquake.usgs.gov/fdsnws/event/1/query')
+
+# Shared upstream response cache settings
+CACHE_TTL = int(os.environ.get('CACHE_TTL', '60'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '32'))
+UPSTREAM_TIMEOUT = float(os.environ.get('UPSTREAM_TIMEOUT', '30'))
+
+# Upstream connection pool: at most this many concurrent USGS requests,
+# callers waiting longer than the queue timeout get a 503
+UPSTREAM_MAX_CONCURRENCY = int(os.environ.get('UPSTREAM_MAX_CONCURRENCY', '4'))
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get('UPSTREAM_QUEUE_TIMEOUT', '10'))
+
+# Place search: bundled GeoNames-format gazetteer, then the upstream geocoder for misses
+# (override GEOCODER_URL to point at a local stub), cached for GEOCODE_CACHE_TTL seconds
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.tsv'))
+GEOCODER_URL = os.environ.get('GEOCODER_URL', 'https://nominatim.openstreetmap.org/search')
+GEOCODE_CACHE_TTL = int(os.environ.get('GEOCODE_CACHE_TTL', '86400'))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.environ.get('GEOCODE_CACHE_MAX_ENTRIES', '1024'))
+GEOCODER_USER_AGENT = '3D-earthquake-viewer'
+
+# Largest date window offered by the slider
+MAX_DAYS = 30
+
+# Background ingestion into a local event store (0 disables it and every
+# request falls back to the cached on-demand USGS fetch)
+INGEST_INTERVAL = float(os.environ.get('INGEST_INTERVAL', '60'))
+EVENT_STORE_PATH = os.environ.get('EVENT_STORE_PATH', 'earthquakes.sqlite3')
+
+# Other FDSN event services merged with USGS by the ingest, as comma-separated name=url
+# entries (FDSN text format; name:geojson=url for USGS-style GeoJSON services), and the
+# largest origin time (s), epicentre (km) and magnitude differences of one quake's origins
+CATALOG_PROVIDERS = os.environ.get('CATALOG_PROVIDERS', '')
+MERGE_TIME_TOLERANCE = float(os.environ.get('MERGE_TIME_TOLERANCE', '16'))
+MERGE_DISTANCE_TOLERANCE = float(os.environ.get('MERGE_DISTANCE_TOLERANCE', '100'))
+MERGE_MAG_TOLERANCE = float(os.environ.get('MERGE_MAG_TOLERANCE', '0.5'))
+
+# Live feed: messages buffered per client before it is dropped as a slow consumer,
+# keep-alive comment interval (s) and a cap on concurrent streams
+STREAM_BUFFER = int(os.environ.get('STREAM_BUFFER', '64'))
+STREAM_HEARTBEAT = float(os.environ.get('STREAM_HEARTBEAT', '15'))
+STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', '5000'))
+
+# Memory-mapped catalog snapshot shared by the worker processes (written by the one that
+# runs the ingest, polled by the others every SNAPSHOT_POLL_INTERVAL seconds)
+CATALOG_SNAPSHOT_PATH = os.environ.get('CATALOG_SNAPSHOT_PATH', 'earthquakes.snapshot')
+SNAPSHOT_POLL_INTERVAL = float(os.environ.get('SNAPSHOT_POLL_INTERVAL', '1'))
+
+# Metrics: per-worker files merged by /metrics (empty keeps them per process)
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+
+# Per-request sampling profiler, enabled for requests whose X-Profile header equals
+# PROFILE_TOKEN (empty disables it); collapsed stacks are written to PROFILE_DIR
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.005'))
+
+# Historical archive: month-partitioned column files under ARCHIVE_PATH (empty disables it),
+# filled with `python 3D-EQ.py archive FIRST_MONTH LAST_MONTH`
+ARCHIVE_PATH = os.environ.get('ARCHIVE_PATH', 'archive')
+
+# Rendered heatmap tiles kept in memory (least recently used are evicted first)
+HEAT_TILE_CACHE_ENTRIES = int(os.environ.get('HEAT_TILE_CACHE_ENTRIES', '2048'))
+
+# A parsed upstream response, kept past its TTL so it can be revalidated
+CachedResponse = namedtuple('CachedResponse', 'catalog upstream_etag last_modified fetched_at')
+
+# Upstream geocoder results for one query
+GeocodeResponse = namedtuple('GeocodeResponse', 'results fetched_at')
+
+# Binary columnar payload: 'EQCB', version, reserved, event count, place count
+CATALOG_MAGIC = b'EQCB'
+CATALOG_VERSION = 2
+CATALOG_HEADER = struct.Struct('<4sHHII')
+
+# Lower bounds of the legend's magnitude classes
+MAGNITUDE_CLASSES = (2.0, 3.0, 4.0, 5.0)
+
+# WGS84 ellipsoid semi-major axis (m) and first eccentricity squared
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class UpstreamBusy(UpstreamError):
+    pass
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+# Process-local metrics rendered in the Prometheus text format. A metric keeps one series per
+# tuple of label values and every update takes only that metric's lock. With METRICS_DIR set,
+# each worker process also writes its series there (at most once per METRICS_DUMP_INTERVAL)
+# and /metrics adds up all workers: counters and histograms of every process that wrote a
+# file, gauges of live processes only.
+class Metric:
+    def __init__(self, kind, name, documentation, labels):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(value) if isinstance(value, list) else value for labels, value in self.series.items()}
+
+    # Text-format sample lines for merged series
+    def samples(self, series):
+        return [f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}" for labels, value in sorted(series.items())]
+
+
+class Counter(Metric):
+    def __init__(self, name, documentation, labels=()):
+        super().__init__('counter', name, documentation, labels)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    def __init__(self, name, documentation, labels=()):
+        super().__init__('gauge', name, documentation, labels)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self.series[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+# Series are per-bucket counts (the last bucket is +Inf) followed by the sum
+class Histogram(Metric):
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labels=(), buckets=BUCKETS):
+        super().__init__('histogram', name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self, series):
+        lines = []
+        for labels, value in sorted(series.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), value):
+                total += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), labels + (le,))} {total}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {format_value(value[-1])}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {total}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, directory=None, dump_interval=1.0):
+        self.directory = directory
+        self.dump_interval = dump_interval
+        self.metrics = []
+        self._dumped_at = 0.0
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=Histogram.BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    # Write this process's series for the other workers' /metrics (throttled unless forced)
+    def dump(self, force=False):
+        now = time.monotonic()
+        if self.directory is None or (not force and now - self._dumped_at < self.dump_interval):
+            return
+        self._dumped_at = now
+        series = {metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()] for metric in self.metrics}
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{path}.tmp", 'w') as file:
+            json.dump(series, file)
+        os.replace(f"{path}.tmp", path)
+
+    # This process's series plus those written by the other workers
+    def collect(self):
+        merged = {metric.name: metric.snapshot() for metric in self.metrics}
+        if self.directory is None:
+            return merged
+        kinds = {metric.name: metric.kind for metric in self.metrics}
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            pid = name[:-len('.json')]
+            if not name.endswith('.json') or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            alive = process_alive(int(pid))
+            try:
+                with open(os.path.join(self.directory, name)) as file:
+                    dumped = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for metric_name, series in dumped.items():
+                if metric_name not in merged or (kinds[metric_name] == 'gauge' and not alive):
+                    continue
+                target = merged[metric_name]
+                for labels, value in series:
+                    labels = tuple(labels)
+                    if isinstance(value, list):
+                        current = target.get(labels)
+                        target[labels] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        target[labels] = target.get(labels, 0) + value
+        return merged
+
+    def render(self):
+        merged = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(merged[metric.name]))
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"' for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+metrics = Metrics(METRICS_DIR or None)
+HTTP_REQUESTS = metrics.counter('eq_http_requests_total', 'HTTP requests by endpoint and status code.', ('endpoint', 'status'))
+HTTP_DURATION = metrics.histogram('eq_http_request_duration_seconds', 'Time to produce a response (streamed bodies are not included).', ('endpoint',))
+HTTP_IN_FLIGHT = metrics.gauge('eq_http_requests_in_flight', 'Requests being handled.', ('endpoint',))
+PAGE_RENDER = metrics.histogram('eq_page_render_seconds', 'Time to render the index page.')
+UPSTREAM_DURATION = metrics.histogram('eq_upstream_request_duration_seconds', 'Upstream request latency.', ('upstream',))
+UPSTREAM_REQUESTS = metrics.counter('eq_upstream_requests_total', 'Upstream requests by status code (error for failed requests).', ('upstream', 'status'))
+UPSTREAM_BYTES = metrics.counter('eq_upstream_response_bytes_total', 'Upstream response body bytes.', ('upstream',))
+CACHE_LOOKUPS = metrics.counter('eq_cache_lookups_total', 'Cache lookups by result (hit, stale or miss).', ('cache', 'result'))
+CACHE_EVICTIONS = metrics.counter('eq_cache_evictions_total', 'Entries evicted from a full cache.', ('cache',))
+SERIALIZE_DURATION = metrics.histogram('eq_serialize_seconds', 'Time to encode a catalog response body.', ('format',))
+COMPRESS_DURATION = metrics.histogram('eq_compress_seconds', 'Time to compress a response body.', ('encoding',))
+STREAM_CLIENTS = metrics.gauge('eq_stream_clients', 'Connected live feed clients.')
+STREAM_EVICTIONS = metrics.counter('eq_stream_evictions_total', 'Live feed clients dropped as slow consumers.')
+
+
+# Sampling profiler for one request: a native thread records the request thread's stack every
+# PROFILE_INTERVAL seconds, and the samples are written to PROFILE_DIR in the collapsed-stack
+# format flame graph tools read. Under gevent the sampled thread runs every greenlet of the
+# worker, so concurrent requests appear in each other's profiles.
+class RequestProfiler:
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = {}
+        self.stopped = False
+        self._target = native('_thread', 'get_ident')()
+        native('_thread', 'start_new_thread')(self._run, ())
+
+    def _run(self):
+        sleep = native('time', 'sleep')
+        while not self.stopped:
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+            sleep(self.interval)
+
+    # Stop sampling and write the profile; returns its file name
+    def stop(self, label):
+        self.stopped = True
+        samples = dict(self.samples)
+        slug = ''.join(c if c.isalnum() else '_' for c in label.strip('/')) or 'index'
+        name = f"{int(time.time() * 1000)}-{os.getpid()}-{slug}.folded"
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, name), 'w') as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in sorted(samples.items()))
+        return name
+
+
+# Unpatched stdlib function, so the profiler gets a native thread under gevent
+def native(module, name):
+    if get_original is not None:
+        return get_original(module, name)
+    return getattr(__import__(module), name)
+
+
+# Keep-alive HTTP client for the upstream service with a bounded number of in-flight requests
+class UpstreamClient:
+    def __init__(self, name, base_url, max_concurrency, queue_timeout, timeout):
+        self.name = name
+        parts = urlsplit(base_url)
+        self._connection_class = HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+        self._netloc = parts.netloc
+        self._path = parts.path or '/'
+        self._timeout = timeout
+        self._queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._idle = queue.LifoQueue()
+
+    # Perform a GET and return (status, headers, body); non-2xx statuses are returned, not raised
+    def get(self, params, headers=None):
+        if not self._slots.acquire(timeout=self._queue_timeout):
+            raise UpstreamBusy('Too many concurrent upstream requests.')
+        start = time.perf_counter()
+        try:
+            path = f"{self._path}?{urlencode(params)}"
+            connection, pooled = self._checkout()
+            try:
+                status, response_headers, body = self._request(connection, path, headers or {})
+            except TimeoutError:
+                raise
+            except (HTTPException, OSError):
+                # A pooled connection may have been closed by the server; retry once on a fresh
+                # one (a fresh connection that failed, or timed out, is not retried)
+                if not pooled:
+                    raise
+                status, response_headers, body = self._request(self._connect(), path, headers or {})
+        except (HTTPException, OSError) as error:
+            UPSTREAM_REQUESTS.inc(self.name, 'error')
+            raise UpstreamError(f"Upstream request failed: {error}") from error
+        finally:
+            self._slots.release()
+            UPSTREAM_DURATION.observe(time.perf_counter() - start, self.name)
+        UPSTREAM_REQUESTS.inc(self.name, str(status))
+        UPSTREAM_BYTES.inc(self.name, amount=len(body))
+        return status, response_headers, body
+
+    def _request(self, connection, path, headers):
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except BaseException:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._idle.put(connection)
+        return response.status, response.headers, body
+
+    # An idle keep-alive connection, or a new one; and whether it came from the pool
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _connect(self):
+        return self._connection_class(self._netloc, timeout=self._timeout)
+
+
+# Collapse concurrent calls for the same key into a single execution
+class SingleFlight:
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+# Columnar copy of an earthquake catalog with memoized derived products
+class Catalog:
+    def __init__(self, ids, lon, lat, depth, mag, time, place_index, places):
+        self.ids = ids
+        self.lon = lon
+        self.lat = lat
+        self.depth = depth
+        self.mag = mag
+        self.time = time
+        self.place_index = place_index
+        self.places = places
+        self._memo = {}
+        self._memo_lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Build from (id, lon, lat, depth, mag, time, place) rows; None becomes NaN
+    @classmethod
+    def from_rows(cls, rows):
+        ids, lon, lat, depth, mag, times, place_names = zip(*rows) if rows else ((),) * 7
+        places = list(dict.fromkeys(place_names))
+        place_lookup = {place: i for i, place in enumerate(places)}
+        return cls(
+            list(ids),
+            np.array(lon, dtype=np.float32),
+            np.array(lat, dtype=np.float32),
+            np.array(depth, dtype=np.float32),
+            np.array(mag, dtype=np.float32),
+            np.array(times, dtype=np.float64),
+            np.fromiter((place_lookup[place] for place in place_names), dtype=np.uint32, count=len(ids)),
+            places
+        )
+
+    # Columns over a to_binary() payload without copying (e.g. a memory-mapped snapshot);
+    # only the string tables are decoded
+    @classmethod
+    def from_binary(cls, buffer):
+        magic, version, _, count, place_count = CATALOG_HEADER.unpack_from(buffer, 0)
+        if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+            raise ValueError('Not a catalog payload.')
+        offset = CATALOG_HEADER.size
+
+        def column(dtype, length):
+            nonlocal offset
+            array = np.frombuffer(buffer, dtype=dtype, count=length, offset=offset)
+            offset += array.nbytes
+            return array
+
+        def strings(length):
+            nonlocal offset
+            offsets = column('<u4', length + 1).tolist()
+            data = bytes(buffer[offset:offset + offsets[-1]])
+            offset += offsets[-1] + -offsets[-1] % 4
+            return [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+        lon, lat, depth, mag = (column('<f4', count) for _ in range(4))
+        times = column('<f8', count)
+        positions = column('<f4', 3 * count).reshape(count, 3)
+        place_index = column('<u4', count)
+        places = strings(place_count)
+        catalog = cls(strings(count), lon, lat, depth, mag, times, place_index, places)
+        catalog._memo['positions'] = positions
+        return catalog
+
+    # Parse a USGS GeoJSON FeatureCollection
+    @classmethod
+    def from_geojson(cls, body):
+        return cls.from_rows([row[:7] for row in parse_features(body)])
+
+    # Earth-centered (ECEF) hypocenter positions in metres, shape (n, 3); unknown depths sit on the surface
+    def positions(self):
+        return self.memo('positions', lambda: geodetic_to_ecef(self.lon, self.lat, self.depth))
+
+    # Catalog of the events at `indices`, with an unused-free place table
+    def take(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        used_places, place_index = np.unique(self.place_index[indices], return_inverse=True)
+        subset = Catalog(
+            [self.ids[i] for i in indices],
+            self.lon[indices],
+            self.lat[indices],
+            self.depth[indices],
+            self.mag[indices],
+            self.time[indices],
+            place_index.astype(np.uint32),
+            [self.places[i] for i in used_places]
+        )
+        subset._memo['positions'] = self.positions()[indices]
+        return subset
+
+    # Events at or after `start_ms` of a time-sorted catalog, as views of the same columns
+    # with the place table compacted to the window's places (as in take()); memoized per window
+    def since(self, start_ms):
+        def build():
+            start = int(np.searchsorted(self.time, start_ms))
+            used_places, place_index = np.unique(self.place_index[start:], return_inverse=True)
+            subset = Catalog(
+                self.ids[start:], self.lon[start:], self.lat[start:], self.depth[start:], self.mag[start:],
+                self.time[start:], place_index.astype(np.uint32), [self.places[i] for i in used_places]
+            )
+            subset._memo['positions'] = self.positions()[start:]
+            return subset
+        return self.memo(('since', start_ms), build)
+
+    def grid(self):
+        return self.memo('grid', lambda: GridIndex(self.lon, self.lat))
+
+    def clusters(self):
+        return self.memo('clusters', lambda: ClusterPyramid.from_catalog(self))
+
+    def heat_tiles(self):
+        return self.memo('heat_tiles', lambda: HeatTiles(HEAT_TILE_CACHE_ENTRIES))
+
+    def stats(self):
+        return self.memo('stats', lambda: SeismicityStats.from_catalog(self))
+
+    # Events inside a lon/lat box at or above `min_mag`; with `limit`, the largest magnitudes win
+    def query(self, bbox=None, min_mag=None, limit=None):
+        if bbox is not None:
+            indices = self.grid().query(*bbox)
+        else:
+            indices = np.arange(len(self))
+        if min_mag is not None:
+            indices = indices[self.mag[indices] >= min_mag]
+        if limit is not None and len(indices) > limit:
+            mags = np.nan_to_num(self.mag[indices], nan=-np.inf)
+            indices = indices[np.argpartition(-mags, limit - 1)[:limit]]
+        return np.sort(indices)
+
+    # Compute a derived product once per catalog
+    def memo(self, key, fn):
+        with self._memo_lock:
+            if key not in self._memo:
+                self._memo[key] = fn()
+            return self._memo[key]
+
+    # Event indices sorted by a table column, unknown values last; memoized per direction
+    def order(self, column, descending=False):
+        def build():
+            if column == 'place':
+                ranks = np.empty(len(self.places), dtype=np.int64)
+                ranks[sorted(range(len(self.places)), key=lambda i: self.places[i].casefold())] = np.arange(len(self.places))
+                keys = ranks[self.place_index]
+            else:
+                keys = getattr(self, column)
+            if not descending:
+                return np.argsort(keys, kind='stable')
+            ascending = self.order(column)
+            known = len(self) - int(np.count_nonzero(np.isnan(keys))) if column != 'place' else len(self)
+            return np.concatenate([ascending[:known][::-1], ascending[known:]])
+        return self.memo(('order', column, descending), build)
+
+    # [id, mag, depth, place, time, lon, lat] rows for the table view
+    def table_rows(self, indices):
+        return [[
+            self.ids[i], number(self.mag[i], 2), number(self.depth[i], 3), self.places[self.place_index[i]],
+            int(self.time[i]), number(self.lon[i], 5), number(self.lat[i], 5)
+        ] for i in indices.tolist()]
+
+    # Largest `top_n` events (partial selection, then a sort of just those), event counts per
+    # legend magnitude class and depth statistics
+    def summary(self, top_n):
+        def build():
+            mags = np.nan_to_num(self.mag, nan=-np.inf)
+            count = min(top_n, len(self))
+            top = np.argpartition(-mags, count - 1)[:count] if count else np.empty(0, dtype=np.int64)
+            top = top[np.argsort(-mags[top], kind='stable')]
+
+            # Unknown magnitudes are drawn in the lowest class, as on the globe
+            classes = np.bincount(np.digitize(np.nan_to_num(self.mag, nan=0), MAGNITUDE_CLASSES), minlength=len(MAGNITUDE_CLASSES) + 1)
+            bounds = [None, *MAGNITUDE_CLASSES, None]
+            known_depths = self.depth[~np.isnan(self.depth)]
+            return {
+                'count': len(self),
+                'top': self.table_rows(top),
+                'magnitude_classes': [
+                    {'min': bounds[k], 'max': bounds[k + 1], 'count': int(classes[k])}
+                    for k in range(len(classes) - 1, -1, -1)
+                ],
+                'max_depth': number(known_depths.max(), 3) if len(known_depths) else None,
+                'mean_depth': number(known_depths.mean(dtype=np.float64), 3) if len(known_depths) else None
+            }
+        return self.memo(('summary', top_n), build)
+
+    # Time-bucket index for playback: offsets into the time order where each of `buckets`
+    # buckets of `bucket_ms` from `start_ms` begins (plus the end of the last), with the
+    # event count and largest magnitude per bucket; memoized per bucket grid
+    def timeline(self, start_ms, bucket_ms, buckets):
+        def build():
+            order = self.order('time')
+            edges = start_ms + bucket_ms * np.arange(buckets + 1, dtype=np.float64)
+            offsets = np.searchsorted(self.time[order], edges)
+            counts = np.diff(offsets)
+            max_mag = np.full(buckets, -np.inf, dtype=np.float32)
+            filled = counts > 0
+            if filled.any():
+                mags = np.nan_to_num(self.mag[order[:offsets[-1]]], nan=-np.inf)
+                max_mag[filled] = np.maximum.reduceat(mags, offsets[:-1][filled])
+            return {
+                'offsets': offsets.tolist(),
+                'counts': counts.tolist(),
+                'max_mag': [None if np.isinf(mag) else round(float(mag), 2) for mag in max_mag]
+            }
+        return self.memo(('timeline', start_ms, bucket_ms, buckets), build)
+
+    # Minimal GeoJSON carrying the fields the page uses
+    def to_geojson(self):
+        return json.dumps({'type': 'FeatureCollection', 'features': self.features()}, separators=(',', ':')).encode('utf-8')
+
+    # One GeoJSON Feature per line
+    def to_ndjson(self):
+        return b''.join(json.dumps(feature, separators=(',', ':')).encode('utf-8') + b'\n' for feature in self.features())
+
+    def features(self):
+        return [{
+            'type': 'Feature',
+            'id': self.ids[i],
+            'properties': {
+                'mag': number(self.mag[i], 2),
+                'place': self.places[self.place_index[i]] or None,
+                'time': int(self.time[i])
+            },
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [number(self.lon[i], 5), number(self.lat[i], 5), number(self.depth[i], 3)]
+            }
+        } for i in range(len(self))]
+
+    # Little-endian typed-array columns readable zero-copy by the browser:
+    # header, Float32 lon/lat/depth/mag, Float64 time (ms), Float32 interleaved
+    # ECEF x/y/z, Uint32 place index, then the place and id string tables
+    def to_binary(self):
+        parts = [
+            CATALOG_HEADER.pack(CATALOG_MAGIC, CATALOG_VERSION, 0, len(self), len(self.places)),
+            self.lon.astype('<f4').tobytes(),
+            self.lat.astype('<f4').tobytes(),
+            self.depth.astype('<f4').tobytes(),
+            self.mag.astype('<f4').tobytes(),
+            self.time.astype('<f8').tobytes(),
+            self.positions().astype('<f4').tobytes(),
+            self.place_index.astype('<u4').tobytes(),
+            encode_string_table(self.places),
+            encode_string_table(self.ids)
+        ]
+        return b''.join(parts)
+
+
+# Float32 columns are rounded back to the precision USGS publishes; NaN becomes None
+def number(value, digits):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+# Uniform lon/lat grid over event indices. Events are sorted by cell in row-major
+# (lat, lon) order, so each latitude row of a bounding box is one contiguous slice.
+class GridIndex:
+    CELL_DEGREES = 1.0
+
+    def __init__(self, lon, lat):
+        self.columns = int(round(360 / self.CELL_DEGREES))
+        self.rows = int(round(180 / self.CELL_DEGREES))
+        self.lon = lon
+        self.lat = lat
+        cells = self._row(lat) * self.columns + self._column(lon)
+        self.order = np.argsort(cells, kind='stable')
+        self.starts = np.searchsorted(cells[self.order], np.arange(self.rows * self.columns + 1))
+
+    def _row(self, lat):
+        return np.clip(((np.asarray(lat) + 90) // self.CELL_DEGREES).astype(np.int64), 0, self.rows - 1)
+
+    def _column(self, lon):
+        return np.clip(((np.asarray(lon) + 180) // self.CELL_DEGREES).astype(np.int64), 0, self.columns - 1)
+
+    # Indices of events inside [west, east] x [south, north]; west > east crosses the antimeridian
+    def query(self, west, south, east, north):
+        spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        first_row, last_row = self._row(south), self._row(north)
+        slices = []
+        for span_west, span_east in spans:
+            first_column, last_column = self._column(span_west), self._column(span_east)
+            for row in range(first_row, last_row + 1):
+                base = row * self.columns
+                slices.append(self.order[self.starts[base + first_column]:self.starts[base + last_column + 1]])
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.concatenate(slices)
+
+        # Cells on the box edge are only partially covered
+        lon, lat = self.lon[candidates], self.lat[candidates]
+        inside = (lat >= south) & (lat <= north)
+        if west <= east:
+            inside &= (lon >= west) & (lon <= east)
+        else:
+            inside &= (lon >= west) | (lon <= east)
+        return candidates[inside]
+
+
+# Parse `west,south,east,north` in degrees
+def parse_bbox(value):
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except ValueError:
+        raise InvalidQuery("bbox must be 'west,south,east,north' in degrees.") from None
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise InvalidQuery('bbox is out of range.')
+    return west, south, east, north
+
+
+# Vectorized WGS84 geodetic -> ECEF conversion; depth is in km below the ellipsoid
+def geodetic_to_ecef(lon, lat, depth_km):
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    height = -1000.0 * np.nan_to_num(np.asarray(depth_km, dtype=np.float64))
+    sin_lat = np.sin(lat_rad)
+    cos_lat = np.cos(lat_rad)
+    prime_vertical = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+    positions = np.empty((len(lon_rad), 3), dtype=np.float64)
+    positions[:, 0] = (prime_vertical + height) * cos_lat * np.cos(lon_rad)
+    positions[:, 1] = (prime_vertical + height) * cos_lat * np.sin(lon_rad)
+    positions[:, 2] = (prime_vertical * (1.0 - WGS84_E2) + height) * sin_lat
+    return positions
+
+
+# Parse a USGS GeoJSON body into (id, lon, lat, depth, mag, time, place, updated, deleted) rows
+def parse_features(body):
+    try:
+        features = json.loads(body)['features']
+    except (ValueError, KeyError, TypeError) as error:
+        raise UpstreamError('Invalid earthquake data format.') from error
+
+    rows = []
+    for feature in features:
+        properties = feature.get('properties') or {}
+        coordinates = (feature.get('geometry') or {}).get('coordinates') or [0, 0, None]
+        rows.append((
+            str(feature.get('id', '')),
+            coordinates[0],
+            coordinates[1],
+            coordinates[2] if len(coordinates) > 2 else None,
+            properties.get('mag'),
+            properties.get('time') or 0,
+            properties.get('place') or '',
+            properties.get('updated') or properties.get('time') or 0,
+            properties.get('status') == 'deleted'
+        ))
+    return rows
+
+
+# Parse an FDSN time (ISO 8601, optional fraction and Z, always UTC) to epoch ms
+def parse_fdsn_time(value):
+    whole, _, fraction = value.rstrip('Z').partition('.')
+    parsed = datetime.strptime(whole, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000) + (int(fraction[:3].ljust(3, '0')) if fraction else 0)
+
+
+# Parse an FDSN text body (EventID|Time|Latitude|Longitude|Depth/km|Author|Catalog|
+# Contributor|ContributorID|MagType|Magnitude|MagAuthor|EventLocationName) into the same
+# rows as parse_features. The format carries no revision times or deletions, so every
+# row is stamped `updated` and none is deleted.
+def parse_fdsn_text(body, updated):
+    def optional(value):
+        return float(value) if value.strip() else None
+
+    rows = []
+    try:
+        for line in body.decode('utf-8').splitlines():
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.split('|')
+            rows.append((
+                fields[0].strip(),
+                float(fields[3]),
+                float(fields[2]),
+                optional(fields[4]),
+                optional(fields[10]),
+                parse_fdsn_time(fields[1].strip()),
+                fields[12].strip() if len(fields) > 12 else '',
+                updated,
+                False
+            ))
+    except (UnicodeDecodeError, ValueError, IndexError) as error:
+        raise UpstreamError('Invalid FDSN text data format.') from error
+    return rows
+
+
+# UTF-8 string table: Uint32 offsets (count + 1) followed by the bytes, padded to 4 bytes
+def encode_string_table(strings):
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = b''.join(encoded)
+    return offsets.tobytes() + data + b'\0' * (-len(data) % 4)
+
+
+# In-process cache with a freshness TTL and least-recently-used eviction
+class TTLCache:
+    def __init__(self, name, ttl, max_entries):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Return (entry, is_fresh); stale entries are still returned for revalidation
+    def get(self, key):
+        entry, fresh = self.peek(key)
+        CACHE_LOOKUPS.inc(self.name, 'miss' if entry is None else 'hit' if fresh else 'stale')
+        return entry, fresh
+
+    # get() without counting the lookup (for re-checks inside a flight)
+    def peek(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            self._entries.move_to_end(key)
+            return entry, time.monotonic() - entry.fetched_at < self.ttl
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.inc(self.name)
+
+
+usgs_cache = TTLCache('usgs', CACHE_TTL, CACHE_MAX_ENTRIES)
+usgs_client = UpstreamClient('usgs', USGS_BASE_URL, UPSTREAM_MAX_CONCURRENCY, UPSTREAM_QUEUE_TIMEOUT, UPSTREAM_TIMEOUT)
+usgs_flights = SingleFlight()
+
+
+# Build the USGS query for the last `days` days (open-ended, so it runs up to now)
+def usgs_params(days):
+    start = datetime.now(timezone.utc).date() - timedelta(days=days)
+    return (('format', 'geojson'), ('starttime', start.isoformat()))
+
+
+# Fetch a USGS query through the shared cache; concurrent misses share one upstream request.
+# An expired entry is served while USGS is failing: a stale catalog beats an error.
+def fetch_usgs(params):
+    cached, fresh = usgs_cache.get(params)
+    if fresh:
+        return cached
+    try:
+        return usgs_flights.do(params, lambda: refresh_usgs(params))
+    except UpstreamError:
+        if cached is not None:
+            return cached
+        raise
+
+
+# Fetch or revalidate a cache entry from USGS
+def refresh_usgs(params):
+    cached, fresh = usgs_cache.peek(params)
+    if fresh:
+        # Another flight refreshed this entry while we were queued
+        return cached
+
+    headers = {'Accept': 'application/json'}
+    if cached is not None:
+        if cached.upstream_etag:
+            headers['If-None-Match'] = cached.upstream_etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+    status, response_headers, body = usgs_client.get(params, headers)
+    if status == 304 and cached is not None:
+        entry = cached._replace(fetched_at=time.monotonic())
+    elif status == 200:
+        entry = CachedResponse(
+            catalog=Catalog.from_geojson(body),
+            upstream_etag=response_headers.get('ETag'),
+            last_modified=response_headers.get('Last-Modified'),
+            fetched_at=time.monotonic()
+        )
+    else:
+        raise UpstreamError(f"USGS returned HTTP {status}")
+
+    usgs_cache.put(params, entry)
+    return entry
+
+
+# Search key for place names: accents stripped, case-folded, single spaces
+def search_key(text):
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+
+# Offline place lookup from a GeoNames-format file (name, asciiname, alternatenames,
+# latitude, longitude, country code and population columns are used). Every name of a
+# place is a key in one sorted array, so a prefix query is two binary searches; matches
+# are ranked exact-first, then by population.
+class Gazetteer:
+    Place = namedtuple('Place', 'name country lat lon population')
+
+    def __init__(self, places, keys):
+        self.places = places
+        self.keys = [key for key, _ in keys]
+        self.indices = [index for _, index in keys]
+
+    @classmethod
+    def load(cls, path):
+        places, keys = [], []
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    if line.startswith('#') or not line.strip():
+                        continue
+                    columns = line.rstrip('\n').split('\t')
+                    if len(columns) < 15:
+                        continue
+                    index = len(places)
+                    places.append(cls.Place(columns[1], columns[8], float(columns[4]), float(columns[5]), int(columns[14] or 0)))
+                    names = {search_key(name) for name in (columns[1], columns[2], *columns[3].split(','))}
+                    keys.extend((key, index) for key in names if key)
+        else:
+            app.logger.warning('Gazetteer %s not found; place search uses the upstream geocoder only', path)
+        keys.sort()
+        return cls(places, keys)
+
+    def search(self, text, limit):
+        prefix = search_key(text)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\U0010ffff', start)
+        exact = {self.indices[i] for i in range(start, end) if self.keys[i] == prefix}
+        matches = {self.indices[i] for i in range(start, end)}
+        best = heapq.nsmallest(limit, matches, key=lambda i: (i not in exact, -self.places[i].population))
+        return [self.places[i] for i in best]
+
+
+gazetteer = Gazetteer.load(GAZETTEER_PATH)
+geocode_cache = TTLCache('geocode', GEOCODE_CACHE_TTL, GEOCODE_CACHE_MAX_ENTRIES)
+geocode_client = UpstreamClient('geocoder', GEOCODER_URL, 2, UPSTREAM_QUEUE_TIMEOUT, UPSTREAM_TIMEOUT)
+geocode_flights = SingleFlight()
+
+
+# Geocode with the upstream service through the cache; a stale answer beats an error
+def geocode_upstream(text, limit):
+    key = (search_key(text), limit)
+    cached, fresh = geocode_cache.get(key)
+    if fresh:
+        return cached.results
+    try:
+        return geocode_flights.do(key, lambda: refresh_geocode(key)).results
+    except UpstreamError:
+        if cached is not None:
+            return cached.results
+        raise
+
+
+# Query the upstream geocoder (Nominatim-style JSON list) and cache the answer, including "no results"
+def refresh_geocode(key):
+    text, limit = key
+    params = (('format', 'json'), ('q', text), ('limit', limit))
+    status, _, body = geocode_client.get(params, {'Accept': 'application/json', 'User-Agent': GEOCODER_USER_AGENT})
+    if status != 200:
+        raise UpstreamError(f"Geocoder returned HTTP {status}")
+    try:
+        results = [
+            {'name': item['display_name'], 'country': None, 'lat': float(item['lat']), 'lon': float(item['lon'])}
+            for item in json.loads(body)
+        ]
+    except (ValueError, KeyError, TypeError) as error:
+        raise UpstreamError(f"Invalid geocoder response: {error}") from error
+    entry = GeocodeResponse(results, time.monotonic())
+    geocode_cache.put(key, entry)
+    return entry
+
+
+# Start of the window covering the last `days` days, as UTC milliseconds
+def window_start_ms(days):
+    start = datetime.now(timezone.utc).date() - timedelta(days=days)
+    return datetime(start.year, start.month, start.day, tzinfo=timezone.utc).timestamp() * 1000
+
+
+# UTC day number of a millisecond timestamp
+def epoch_day(ms):
+    return int(ms // 86400000)
+
+
+# Hierarchical grid clusters (supercluster-style). Level z splits the globe into
+# BASE_COLUMNS * 2**z columns; every cell keeps per-UTC-day aggregates so any date
+# window can be answered, and each level is derived from the four children below it.
+# Changes only recompute the cells they touch and their ancestors.
+class ClusterPyramid:
+    MAX_ZOOM = 8
+    BASE_COLUMNS = 8
+
+    # Per-day aggregate: count, max magnitude, representative (largest) event id and place,
+    # its position, and lon/lat sums for the centroid
+    Aggregate = namedtuple('Aggregate', 'count max_mag rep_id rep_place rep_lon rep_lat lon_sum lat_sum')
+
+    def __init__(self):
+        self.members = {}
+        self.event_cells = {}
+        self.levels = [{} for _ in range(self.MAX_ZOOM + 1)]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        pyramid = cls()
+        pyramid.apply(zip(
+            catalog.ids, catalog.lon.tolist(), catalog.lat.tolist(), catalog.depth.tolist(), catalog.mag.tolist(),
+            catalog.time.tolist(), (catalog.places[i] for i in catalog.place_index)
+        ), [])
+        return pyramid
+
+    @classmethod
+    def cell_size(cls, z):
+        return 360.0 / (cls.BASE_COLUMNS << z)
+
+    @classmethod
+    def cell(cls, lon, lat, z):
+        size = cls.cell_size(z)
+        columns = cls.BASE_COLUMNS << z
+        return min(max(int((lon + 180) // size), 0), columns - 1), min(max(int((lat + 90) // size), 0), columns // 2 - 1)
+
+    # Add or replace (id, lon, lat, depth, mag, time, place) rows and drop deleted ids
+    def apply(self, rows, deleted):
+        with self._lock:
+            touched = set()
+            for event_id in deleted:
+                touched.add(self._remove(event_id))
+            for event_id, lon, lat, _, mag, event_time, place in rows:
+                touched.add(self._remove(event_id))
+                cell = self.cell(lon, lat, self.MAX_ZOOM)
+                mag = -np.inf if mag is None or mag != mag else mag
+                self.members.setdefault(cell, {})[event_id] = (lon, lat, mag, epoch_day(event_time), place)
+                self.event_cells[event_id] = cell
+                touched.add(cell)
+            touched.discard(None)
+
+            finest = self.levels[self.MAX_ZOOM]
+            for cell in touched:
+                members = self.members.get(cell)
+                if members:
+                    finest[cell] = self._aggregate_members(members)
+                else:
+                    self.members.pop(cell, None)
+                    finest.pop(cell, None)
+
+            for z in range(self.MAX_ZOOM - 1, -1, -1):
+                children = self.levels[z + 1]
+                touched = {(x >> 1, y >> 1) for x, y in touched}
+                for x, y in touched:
+                    days = {}
+                    for child in ((2 * x, 2 * y), (2 * x + 1, 2 * y), (2 * x, 2 * y + 1), (2 * x + 1, 2 * y + 1)):
+                        for day, aggregate in children.get(child, {}).items():
+                            days[day] = self._merge(days.get(day), aggregate)
+                    if days:
+                        self.levels[z][(x, y)] = days
+                    else:
+                        self.levels[z].pop((x, y), None)
+
+    def _remove(self, event_id):
+        cell = self.event_cells.pop(event_id, None)
+        if cell is not None:
+            del self.members[cell][event_id]
+        return cell
+
+    def _aggregate_members(self, members):
+        days = {}
+        for event_id, (lon, lat, mag, day, place) in members.items():
+            days[day] = self._merge(days.get(day), self.Aggregate(1, mag, event_id, place, lon, lat, lon, lat))
+        return days
+
+    def _merge(self, a, b):
+        if a is None:
+            return b
+        rep = a if a.max_mag >= b.max_mag else b
+        return self.Aggregate(
+            a.count + b.count, rep.max_mag, rep.rep_id, rep.rep_place, rep.rep_lon, rep.rep_lat,
+            a.lon_sum + b.lon_sum, a.lat_sum + b.lat_sum
+        )
+
+    # Clusters at level z inside a lon/lat box for events on or after `start_day`, as
+    # [lon, lat, count, max_mag, rep_id, rep_place, rep_lon, rep_lat] (centroid first)
+    def query(self, z, bbox, start_day):
+        z = min(max(z, 0), self.MAX_ZOOM)
+        with self._lock:
+            level = self.levels[z]
+            cells = level.keys()
+            if bbox is not None:
+                west, south, east, north = bbox
+                first_x, first_y = self.cell(west, south, z)
+                last_x, last_y = self.cell(east, north, z)
+                columns = self.BASE_COLUMNS << z
+                xs = range(first_x, last_x + 1) if first_x <= last_x else [*range(first_x, columns), *range(0, last_x + 1)]
+                if len(xs) * (last_y - first_y + 1) < len(level):
+                    cells = [(x, y) for x in xs for y in range(first_y, last_y + 1) if (x, y) in level]
+                else:
+                    xs = set(xs)
+                    cells = [(x, y) for x, y in level if x in xs and first_y <= y <= last_y]
+
+            clusters = []
+            for cell in cells:
+                total = None
+                for day, aggregate in level[cell].items():
+                    if day >= start_day:
+                        total = self._merge(total, aggregate)
+                if total is not None:
+                    clusters.append([
+                        round(total.lon_sum / total.count, 4), round(total.lat_sum / total.count, 4), total.count,
+                        None if total.max_mag == -np.inf else round(total.max_mag, 2),
+                        total.rep_id, total.rep_place, total.rep_lon, total.rep_lat
+                    ])
+        return clusters
+
+
+# RGBA image (height, width, 4) as an uncompressed-filter PNG
+def encode_png(rgba):
+    height, width = rgba.shape[:2]
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)),
+        chunk(b'IEND', b'')
+    ])
+
+
+# Heatmap as Web Mercator XYZ PNG tiles: a Gaussian kernel density estimate of the window's
+# events, binned to a padded pixel grid and blurred with a separable kernel (two matrix
+# products), so a tile costs the same whatever the event count. Rendered tiles are kept in
+# an LRU cache; store changes drop only the tiles within a kernel radius of the old and new
+# position of each changed event.
+class HeatTiles:
+    SIZE = 256
+    SIGMA = 6.0
+    PAD = 18
+    MAX_ZOOM = 10
+    MAX_LAT = 85.05112878
+
+    # Per-event weight and the density that maps to the top of the colour ramp (log scale)
+    WEIGHTS = {
+        'count': (lambda mag: np.ones_like(mag), 200.0),
+        'mag': (lambda mag: np.clip(np.nan_to_num(mag), 0, None), 600.0),
+        'energy': (lambda mag: 10 ** (1.5 * (np.clip(np.nan_to_num(mag, nan=-np.inf), None, 10) - 4)), 100000.0)
+    }
+
+    _offsets = np.arange(SIZE + 2 * PAD)[None, :] - PAD - np.arange(SIZE)[:, None]
+    KERNEL = np.where(np.abs(_offsets) <= PAD, np.exp(-0.5 * (_offsets / SIGMA) ** 2), 0).astype(np.float32)
+
+    # Transparent blue through cyan, yellow and orange to red
+    RAMP = np.stack([
+        np.interp(np.linspace(0, 1, 256), [0, 0.2, 0.45, 0.65, 0.85, 1], channel)
+        for channel in ([0, 0, 0, 255, 255, 255], [0, 0, 255, 255, 140, 0], [255, 255, 255, 0, 0, 0], [0, 110, 150, 180, 210, 230])
+    ], axis=1).astype(np.uint8)
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.tile_keys = {}
+        self.positions = {}
+        self.generation = 0
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+
+    # World pixel coordinates at zoom z
+    @classmethod
+    def project(cls, lon, lat, z):
+        world = cls.SIZE << z
+        lat = np.radians(np.clip(lat, -cls.MAX_LAT, cls.MAX_LAT))
+        return (np.asarray(lon, dtype=np.float64) + 180) / 360 * world, (1 - np.arcsinh(np.tan(lat)) / np.pi) / 2 * world
+
+    @classmethod
+    def latitude(cls, pixel_y, z):
+        return float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * pixel_y / (cls.SIZE << z))))))
+
+    # Tiles whose padded extent contains a point, at every zoom level
+    @classmethod
+    def tiles_near(cls, lon, lat):
+        for z in range(cls.MAX_ZOOM + 1):
+            px, py = cls.project(lon, lat, z)
+            count = 1 << z
+            xs = {int((px + d) // cls.SIZE) % count for d in (-cls.PAD, cls.PAD)}
+            ys = {min(max(int((py + d) // cls.SIZE), 0), count - 1) for d in (-cls.PAD, cls.PAD)}
+            for x in xs:
+                for y in ys:
+                    yield z, x, y
+
+    # Store listener: invalidate the tiles around the old and new position of every changed event
+    def apply(self, rows, deleted):
+        with self._lock:
+            moved = [self.positions.pop(event_id, None) for event_id in deleted]
+            for event_id, lon, lat, *_ in rows:
+                moved.append(self.positions.pop(event_id, None))
+                self.positions[event_id] = (lon, lat)
+                moved.append((lon, lat))
+            self.generation += 1
+            if not self.cache:
+                return
+            for tile in {tile for position in moved if position is not None for tile in self.tiles_near(*position)}:
+                for key in self.tile_keys.pop(tile, ()):
+                    self.cache.pop(key, None)
+
+    # PNG tile for the events of `load()` (called after the generation is read, so a tile
+    # rendered from a catalog that changed meanwhile is not cached)
+    def tile(self, load, start_ms, weight, z, x, y):
+        key = (start_ms, weight, z, x, y)
+        with self._lock:
+            body = self.cache.get(key)
+            CACHE_LOOKUPS.inc('heat_tiles', 'miss' if body is None else 'hit')
+            if body is not None:
+                self.cache.move_to_end(key)
+                return body
+            generation = self.generation
+
+        def render():
+            body = PrecompressedBody(encode_png(self.render(load(), weight, z, x, y)), 'image/png', compress=False)
+            with self._lock:
+                if generation == self.generation:
+                    self.cache[key] = body
+                    self.tile_keys.setdefault((z, x, y), set()).add(key)
+                    while len(self.cache) > self.max_entries:
+                        evicted, _ = self.cache.popitem(last=False)
+                        CACHE_EVICTIONS.inc('heat_tiles')
+                        keys = self.tile_keys.get(evicted[2:])
+                        keys.discard(evicted)
+                        if not keys:
+                            del self.tile_keys[evicted[2:]]
+            return body
+
+        return self._flights.do(key, render)
+
+    # RGBA pixels of one tile
+    def render(self, catalog, weight, z, x, y):
+        size, pad, world = self.SIZE, self.PAD, self.SIZE << z
+        left, top = x * size, y * size
+        if world <= size + 2 * pad:
+            west, east = -180.0, 180.0
+        else:
+            west = (left - pad) / world * 360 - 180
+            east = (left + size + pad) / world * 360 - 180
+            west, east = (west + 180) % 360 - 180, (east + 180) % 360 - 180
+        north = self.latitude(max(top - pad, 0), z)
+        south = self.latitude(min(top + size + pad, world), z)
+        indices = catalog.query((west, south, east, north))
+
+        grid = size + 2 * pad
+        pixels = np.zeros((size, size, 4), dtype=np.uint8)
+        if not len(indices):
+            return pixels
+        px, py = self.project(catalog.lon[indices], catalog.lat[indices], z)
+        weigh, saturation = self.WEIGHTS[weight]
+        weights = weigh(catalog.mag[indices].astype(np.float64))
+
+        # Copies shifted by one world width cover events across the antimeridian
+        columns, rows, values = [], [], []
+        for shift in (-world, 0, world):
+            dx = px + shift - left + pad
+            inside = (dx >= 0) & (dx < grid)
+            columns.append(dx[inside])
+            rows.append(py[inside] - top + pad)
+            values.append(weights[inside])
+        columns, rows, values = np.concatenate(columns), np.concatenate(rows), np.concatenate(values)
+        inside = (rows >= 0) & (rows < grid)
+        cells = rows[inside].astype(np.int64) * grid + columns[inside].astype(np.int64)
+        counts = np.bincount(cells, weights=values[inside], minlength=grid * grid).reshape(grid, grid)
+
+        density = self.KERNEL @ counts.astype(np.float32) @ self.KERNEL.T
+        level = np.clip(np.log1p(density) / np.log1p(saturation), 0, 1)
+        return self.RAMP[(level * 255).astype(np.uint8)]
+
+
+# Seismicity statistics from per-cell, per-UTC-day aggregates: a magnitude histogram and
+# the radiated energy sum of every 10 degree cell, kept in a ring of day slots covering the
+# slider's range. Store changes add and subtract only the changed events' contributions, and
+# a query sums the slots and cells of its window and region, whatever the event count.
+class SeismicityStats:
+    CELL_SIZE = 10
+    COLUMNS, ROWS = 360 // CELL_SIZE, 180 // CELL_SIZE
+    SLOTS = MAX_DAYS + 2
+
+    # Magnitude bins of 0.1 from -1.0 to 9.9; lower magnitudes fall in the first bin,
+    # higher ones in the last
+    MAG_MIN = -1.0
+    MAG_STEP = 0.1
+    MAG_BINS = 110
+
+    # Fewest events above the completeness magnitude for a b-value estimate
+    MIN_B_EVENTS = 50
+
+    def __init__(self):
+        cells = self.COLUMNS * self.ROWS
+        self.histograms = np.zeros((self.SLOTS, cells, self.MAG_BINS), dtype=np.uint32)
+        self.unknown = np.zeros((self.SLOTS, cells), dtype=np.uint32)
+        self.energy = np.zeros((self.SLOTS, cells), dtype=np.float64)
+        self.slot_days = np.full(self.SLOTS, -1, dtype=np.int64)
+        # Per-event contribution (day, cell, bin or -1 without magnitude, energy), so a
+        # revision or deletion can take it back out
+        self.events = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        stats = cls()
+        stats.apply(zip(
+            catalog.ids, catalog.lon.tolist(), catalog.lat.tolist(), catalog.depth.tolist(), catalog.mag.tolist(),
+            catalog.time.tolist(), [None] * len(catalog.ids)
+        ), [])
+        return stats
+
+    # Radiated energy in joules (Gutenberg-Richter energy relation, log10 E = 1.5 M + 4.8)
+    @staticmethod
+    def radiated_energy(mag):
+        return 10 ** (1.5 * mag + 4.8)
+
+    # Flat indices of the cells overlapping a lon/lat box (every cell for None)
+    @classmethod
+    def cells(cls, bbox):
+        if bbox is None:
+            return np.arange(cls.COLUMNS * cls.ROWS)
+        west, south, east, north = bbox
+        first_x, last_x = (min(max(int((lon + 180) // cls.CELL_SIZE), 0), cls.COLUMNS - 1) for lon in (west, east))
+        first_y, last_y = (min(max(int((lat + 90) // cls.CELL_SIZE), 0), cls.ROWS - 1) for lat in (south, north))
+        xs = np.arange(first_x, last_x + 1) if first_x <= last_x else np.r_[first_x:cls.COLUMNS, 0:last_x + 1]
+        return (np.arange(first_y, last_y + 1)[:, None] * cls.COLUMNS + xs[None, :]).ravel()
+
+    # Add or replace (id, lon, lat, depth, mag, time, place) rows and drop deleted ids
+    def apply(self, rows, deleted):
+        rows = list(rows)
+        with self._lock:
+            removed = [self.events.pop(event_id, None) for event_id in deleted]
+            removed += [self.events.pop(row[0], None) for row in rows]
+            removed = [event for event in removed if event is not None]
+            if removed:
+                days, cells, bins, energy = (np.array(column) for column in zip(*removed))
+                self._add(days, cells, bins, energy, -1)
+            if not rows:
+                return
+
+            ids, lon, lat, _, mag, event_time, _ = zip(*rows)
+            lon, lat = np.array(lon, dtype=np.float64), np.array(lat, dtype=np.float64)
+            mag = np.array(mag, dtype=np.float64)
+            days = np.array(event_time, dtype=np.int64) // 86400000
+            xs = np.clip(((lon + 180) // self.CELL_SIZE).astype(np.int64), 0, self.COLUMNS - 1)
+            ys = np.clip(((lat + 90) // self.CELL_SIZE).astype(np.int64), 0, self.ROWS - 1)
+            cells = ys * self.COLUMNS + xs
+            known = ~np.isnan(mag)
+            bins = np.where(known, np.clip(np.floor((np.nan_to_num(mag) - self.MAG_MIN) / self.MAG_STEP + 1e-6), 0, self.MAG_BINS - 1), -1).astype(np.int64)
+            energy = np.where(known, self.radiated_energy(np.nan_to_num(mag)), 0.0)
+
+            # Days older than the ring are not kept; a slot reused for a newer day is cleared
+            newest = max(int(days.max()), int(self.slot_days.max()))
+            kept = days > newest - self.SLOTS
+            for day in np.unique(days[kept]).tolist():
+                slot = day % self.SLOTS
+                if self.slot_days[slot] != day:
+                    self.histograms[slot] = 0
+                    self.unknown[slot] = 0
+                    self.energy[slot] = 0
+                    self.slot_days[slot] = day
+            self.events.update(zip(
+                (event_id for event_id, keep in zip(ids, kept.tolist()) if keep),
+                zip(days[kept].tolist(), cells[kept].tolist(), bins[kept].tolist(), energy[kept].tolist())
+            ))
+            self._add(days[kept], cells[kept], bins[kept], energy[kept], 1)
+
+    # Add (sign 1) or subtract (sign -1) contributions; those of days whose slot has since
+    # been reused are already gone
+    def _add(self, days, cells, bins, energy, sign):
+        slots = days % self.SLOTS
+        current = self.slot_days[slots] == days
+        slots, cells, bins, energy = slots[current], cells[current], bins[current], energy[current]
+        known = bins >= 0
+        ufunc = np.add if sign > 0 else np.subtract
+        ufunc.at(self.histograms, (slots[known], cells[known], bins[known]), 1)
+        ufunc.at(self.unknown, (slots[~known], cells[~known]), 1)
+        ufunc.at(self.energy, (slots, cells), energy)
+
+    # Completeness magnitude (maximum curvature plus 0.2) and Aki-Utsu maximum-likelihood
+    # b-value with the Shi & Bolt standard error, for a magnitude histogram
+    @classmethod
+    def b_value(cls, histogram):
+        if not histogram.any():
+            return None
+        mags = cls.MAG_MIN + cls.MAG_STEP * np.arange(cls.MAG_BINS)
+        first = min(int(np.argmax(histogram)) + int(round(0.2 / cls.MAG_STEP)), cls.MAG_BINS - 1)
+        counts = histogram[first:].astype(np.float64)
+        n = counts.sum()
+        if n < cls.MIN_B_EVENTS:
+            return None
+        mean = (counts * mags[first:]).sum() / n
+        completeness = mags[first]
+        if mean <= completeness - cls.MAG_STEP / 2:
+            return None
+        b = np.log10(np.e) / (mean - (completeness - cls.MAG_STEP / 2))
+        error = 2.3 * b * b * np.sqrt((counts * (mags[first:] - mean) ** 2).sum() / (n * (n - 1)))
+        return {'b': round(float(b), 3), 'error': round(float(error), 3), 'mc': round(float(completeness), 1), 'count': int(n)}
+
+    # Counts, energy release, magnitude histogram, b-value, daily series and busiest cells of
+    # the events in the cells overlapping `bbox` on or after `start_day`
+    def query(self, bbox, start_day, top_n=5):
+        cells = self.cells(bbox)
+        with self._lock:
+            slots = np.flatnonzero(self.slot_days >= start_day)
+            slots = slots[np.argsort(self.slot_days[slots])]
+            days = self.slot_days[slots]
+            selected = self.histograms[np.ix_(slots, cells)]
+            unknown = self.unknown[np.ix_(slots, cells)].astype(np.int64)
+            energy = np.clip(self.energy[np.ix_(slots, cells)], 0, None)
+
+        histograms = selected.sum(axis=0, dtype=np.int64)
+        daily_counts = selected.sum(axis=(1, 2), dtype=np.int64) + unknown.sum(axis=1)
+        histogram = histograms.sum(axis=0)
+        cell_counts = histograms.sum(axis=1) + unknown.sum(axis=0)
+        cell_energy = energy.sum(axis=0)
+        total_energy = float(cell_energy.sum())
+        binned = np.flatnonzero(histogram)
+        low, high = (int(binned[0]), int(binned[-1]) + 1) if len(binned) else (0, 0)
+
+        busiest = []
+        for i in np.argsort(-cell_counts, kind='stable')[:top_n].tolist():
+            if not cell_counts[i]:
+                break
+            cell_bins = np.flatnonzero(histograms[i])
+            x, y = int(cells[i]) % self.COLUMNS, int(cells[i]) // self.COLUMNS
+            busiest.append({
+                'bbox': [x * self.CELL_SIZE - 180, y * self.CELL_SIZE - 90, (x + 1) * self.CELL_SIZE - 180, (y + 1) * self.CELL_SIZE - 90],
+                'count': int(cell_counts[i]),
+                'energy': float(cell_energy[i]),
+                'max_mag': number(self.MAG_MIN + self.MAG_STEP * cell_bins[-1], 1) if len(cell_bins) else None,
+                'b_value': self.b_value(histograms[i])
+            })
+
+        return {
+            'count': int(cell_counts.sum()),
+            'without_magnitude': int(unknown.sum()),
+            'energy': total_energy,
+            'energy_magnitude': number((np.log10(total_energy) - 4.8) / 1.5, 2) if total_energy > 0 else None,
+            'max_mag': number(self.MAG_MIN + self.MAG_STEP * (high - 1), 1) if high else None,
+            'histogram': {'min': number(self.MAG_MIN + self.MAG_STEP * low, 1), 'step': self.MAG_STEP, 'counts': histogram[low:high].tolist()},
+            'b_value': self.b_value(histogram),
+            'daily': [
+                {'date': (datetime(1970, 1, 1) + timedelta(days=day)).strftime('%Y-%m-%d'), 'count': int(count)}
+                for day, count in zip(days.tolist(), daily_counts.tolist())
+            ],
+            'cells': busiest
+        }
+
+
+# Persistent SQLite store of events keyed by id, shared by all worker processes. Only the
+# process holding the snapshot writer lock applies upstream changes; every change gets a new
+# sequence number, which clients use as their sync cursor. Each process follows the store
+# up to the cursor of the published snapshot and calls its listeners with the
+# (id, lon, lat, depth, mag, time, place) rows and deleted ids of every change. With
+# several providers, each one's origins are kept in their own table and merged into events,
+# which then record the provenance of the quake's origins in `sources`.
+class EventStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            id TEXT PRIMARY KEY,
+            lon REAL, lat REAL, depth REAL, mag REAL,
+            time INTEGER NOT NULL,
+            place TEXT NOT NULL,
+            updated INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            seq INTEGER NOT NULL,
+            sources TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS events_seq ON events (seq);
+        CREATE INDEX IF NOT EXISTS events_time ON events (time);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS origins (
+            source TEXT NOT NULL,
+            id TEXT NOT NULL,
+            lon REAL, lat REAL, depth REAL, mag REAL,
+            time INTEGER NOT NULL,
+            place TEXT NOT NULL,
+            updated INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (source, id)
+        );
+        CREATE INDEX IF NOT EXISTS origins_time ON origins (time);
+    """
+
+    UPSERT = """
+        INSERT INTO events (id, lon, lat, depth, mag, time, place, updated, deleted, seq)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            lon = excluded.lon, lat = excluded.lat, depth = excluded.depth, mag = excluded.mag,
+            time = excluded.time, place = excluded.place, updated = excluded.updated,
+            deleted = excluded.deleted, seq = excluded.seq
+        WHERE excluded.updated > events.updated OR excluded.deleted != events.deleted
+    """
+
+    # Merged events are written whenever they differ from the stored row
+    REPLACE = """
+        INSERT INTO events (id, lon, lat, depth, mag, time, place, updated, deleted, seq, sources)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            lon = excluded.lon, lat = excluded.lat, depth = excluded.depth, mag = excluded.mag,
+            time = excluded.time, place = excluded.place, updated = excluded.updated,
+            deleted = excluded.deleted, seq = excluded.seq, sources = excluded.sources
+    """
+
+    # Origins are only rewritten when a newer revision changes them (the FDSN text format
+    # restamps unchanged events on every fetch)
+    UPSERT_ORIGIN = """
+        INSERT INTO origins (source, id, lon, lat, depth, mag, time, place, updated, deleted)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (source, id) DO UPDATE SET
+            lon = excluded.lon, lat = excluded.lat, depth = excluded.depth, mag = excluded.mag,
+            time = excluded.time, place = excluded.place, updated = excluded.updated,
+            deleted = excluded.deleted
+        WHERE excluded.updated > origins.updated
+            AND (excluded.lon, excluded.lat, excluded.depth, excluded.mag, excluded.time, excluded.place, excluded.deleted)
+                IS NOT (origins.lon, origins.lat, origins.depth, origins.mag, origins.time, origins.place, origins.deleted)
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(self.SCHEMA)
+            # Stores created before provenance was recorded
+            if 'sources' not in (row[1] for row in self._db.execute('PRAGMA table_info(events)')):
+                self._db.execute("ALTER TABLE events ADD COLUMN sources TEXT NOT NULL DEFAULT ''")
+        self._cursor = 0
+        self._listeners = []
+        self.clusters = ClusterPyramid()
+        self.heat = HeatTiles(HEAT_TILE_CACHE_ENTRIES)
+        self.stats = SeismicityStats()
+        self.subscribe(self.clusters.apply)
+        self.subscribe(self.heat.apply)
+        self.subscribe(self.stats.apply)
+
+    # Register fn(rows, deleted_ids); with `replay` it is first called with every live event
+    def subscribe(self, fn, replay=True):
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, lon, lat, depth, mag, time, place FROM events WHERE deleted = 0 AND seq <= ?',
+                (self._cursor,)
+            ).fetchall() if replay else []
+            self._listeners.append(fn)
+        if rows:
+            fn(rows, [])
+
+    # Newest change this process has followed (and its listeners have seen)
+    @property
+    def cursor(self):
+        return self._cursor
+
+    def _max_seq(self):
+        return self._db.execute('SELECT COALESCE(MAX(seq), 0) FROM events').fetchone()[0]
+
+    # Newest `updated` timestamp seen upstream, or from one merged source (None before the first sync)
+    def watermark(self, source=None):
+        key = 'watermark' if source is None else f"watermark:{source}"
+        with self._lock:
+            row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    # Insert or update parsed feature rows; older revisions of an event are ignored.
+    # Returns the number of changed events (writer only).
+    def apply(self, rows):
+        changed = 0
+        with self._lock, self._db:
+            seq = self._max_seq()
+            for event_id, lon, lat, depth, mag, event_time, place, updated, is_deleted in rows:
+                params = (event_id, lon, lat, depth, mag, event_time, place, updated, int(is_deleted), seq + 1)
+                if self._db.execute(self.UPSERT, params).rowcount:
+                    seq += 1
+                    changed += 1
+            if rows:
+                self._db.execute(
+                    "INSERT INTO meta (key, value) VALUES ('watermark', ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)",
+                    (max(row[7] for row in rows),)
+                )
+        return changed
+
+    # Insert or update one source's origin rows; returns the number of changed origins (writer only)
+    def apply_origins(self, source, rows):
+        changed = 0
+        with self._lock, self._db:
+            for event_id, lon, lat, depth, mag, event_time, place, updated, is_deleted in rows:
+                params = (source, event_id, lon, lat, depth, mag, event_time, place, updated, int(is_deleted))
+                changed += self._db.execute(self.UPSERT_ORIGIN, params).rowcount
+            if rows:
+                self._db.execute(
+                    "INSERT INTO meta (key, value) VALUES (?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)",
+                    (f"watermark:{source}", max(row[7] for row in rows))
+                )
+        return changed
+
+    # Forget the origins and watermarks of every source not in `sources`; returns the number
+    # of origins removed (writer only)
+    def retain_sources(self, sources):
+        placeholders = ', '.join('?' * len(sources))
+        with self._lock, self._db:
+            self._db.execute(
+                f"DELETE FROM meta WHERE key LIKE 'watermark:%' AND substr(key, 11) NOT IN ({placeholders})",
+                sources
+            )
+            return self._db.execute(f"DELETE FROM origins WHERE source NOT IN ({placeholders})", sources).rowcount
+
+    # Live (source, id, lon, lat, depth, mag, time, place, updated) origins from `start_ms` on
+    def origins(self, start_ms):
+        with self._lock:
+            return self._db.execute(
+                'SELECT source, id, lon, lat, depth, mag, time, place, updated FROM origins '
+                'WHERE deleted = 0 AND time >= ?',
+                (start_ms,)
+            ).fetchall()
+
+    # Make the live events from `start_ms` on exactly the merged `rows`: rows that differ
+    # from the stored event are written and events missing from `rows` are tombstoned.
+    # Returns the number of changed events (writer only).
+    def reconcile(self, rows, start_ms):
+        changed = 0
+        with self._lock, self._db:
+            seq = self._max_seq()
+            stored = {
+                row[0]: row[1:] for row in self._db.execute(
+                    'SELECT id, lon, lat, depth, mag, time, place, sources FROM events WHERE deleted = 0 AND time >= ?',
+                    (start_ms,)
+                )
+            }
+            for event_id, lon, lat, depth, mag, event_time, place, updated, is_deleted, sources in rows:
+                if stored.pop(event_id, None) != (lon, lat, depth, mag, event_time, place, sources):
+                    seq += 1
+                    changed += 1
+                    params = (event_id, lon, lat, depth, mag, event_time, place, updated, int(is_deleted), seq, sources)
+                    self._db.execute(self.REPLACE, params)
+            for event_id in stored:
+                seq += 1
+                self._db.execute('UPDATE events SET deleted = 1, seq = ? WHERE id = ?', (seq, event_id))
+        return changed + len(stored)
+
+    # (source, id, lon, lat, depth, mag, time, place) origins merged into a live event,
+    # preferred first; an event stored from a single provider is its own `source` origin
+    def event_origins(self, event_id, source):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT sources, lon, lat, depth, mag, time, place FROM events WHERE id = ? AND deleted = 0', (event_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if not row[0]:
+                return [(source, event_id) + row[1:]]
+            origins = []
+            for member in row[0].split():
+                source, _, origin_id = member.partition(':')
+                origin = self._db.execute(
+                    'SELECT source, id, lon, lat, depth, mag, time, place FROM origins WHERE source = ? AND id = ?',
+                    (source, origin_id)
+                ).fetchone()
+                if origin:
+                    origins.append(origin)
+        return origins
+
+    # Tombstone events that have aged out of every window, so followers and delta clients
+    # see them go; tombstones a day past the cutoff are removed for good, as are aged-out
+    # origins (writer only)
+    def prune(self, before_ms):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM events WHERE deleted = 1 AND time < ?', (before_ms - 86400000,))
+            self._db.execute('DELETE FROM origins WHERE time < ?', (before_ms,))
+            return self._db.execute(
+                'UPDATE events SET deleted = 1, seq = ? WHERE deleted = 0 AND time < ?',
+                (self._max_seq() + 1, before_ms)
+            ).rowcount
+
+    # Catch up with the changes up to `cursor` and notify the listeners, which already see
+    # the new cursor (the live feed stamps its deltas with it); if a listener fails the
+    # cursor goes back, so the next call delivers the changes again
+    def follow(self, cursor):
+        previous = self._cursor
+        if cursor <= previous:
+            return
+        rows = self._changes(previous, cursor)
+        upserts = [row[:7] for row in rows if not row[7]]
+        deleted = [row[0] for row in rows if row[7]]
+        self._cursor = cursor
+        if upserts or deleted:
+            try:
+                for fn in self._listeners:
+                    fn(upserts, deleted)
+            except Exception:
+                self._cursor = previous
+                raise
+
+    def _changes(self, since, until):
+        with self._lock:
+            return self._db.execute(
+                'SELECT id, lon, lat, depth, mag, time, place, deleted FROM events '
+                'WHERE seq > ? AND seq <= ? ORDER BY seq',
+                (since, until)
+            ).fetchall()
+
+    # Events inserted, updated or deleted after `cursor` (up to the followed cursor), as
+    # [id, lon, lat, depth, mag, time, place, x, y, z] rows (ECEF metres, rounded by
+    # with_positions like the catalog payloads) and deleted ids
+    def changes_since(self, cursor, until=None):
+        rows = self._changes(cursor, self._cursor if until is None else until)
+        events = with_positions(row[:7] for row in rows if not row[7])
+        deleted = [row[0] for row in rows if row[7]]
+        return events, deleted
+
+    # Time-sorted catalog of the full window and its cursor, for publishing a snapshot (writer only)
+    def latest(self):
+        with self._lock:
+            cursor = self._max_seq()
+            rows = self._db.execute(
+                'SELECT id, lon, lat, depth, mag, time, place FROM events '
+                'WHERE deleted = 0 AND time >= ? ORDER BY time',
+                (window_start_ms(MAX_DAYS),)
+            ).fetchall()
+        return Catalog.from_rows(rows), cursor
+
+
+# (id, lon, lat, depth, mag, time, place) rows as lists with ECEF x, y, z (metres) appended.
+# Numbers are stored and rounded like the catalog columns (float32, then number()), so a
+# client's merged rows match a full reload.
+def with_positions(rows):
+    rows = list(rows)
+    if not rows:
+        return []
+    ids, lon, lat, depth, mag, times, places = zip(*rows)
+    lon, lat, depth, mag = (np.array(column, dtype=np.float64).astype(np.float32) for column in (lon, lat, depth, mag))
+    positions = geodetic_to_ecef(lon, lat, depth).round(1).tolist()
+    return [
+        [ids[i], number(lon[i], 5), number(lat[i], 5), number(depth[i], 3), number(mag[i], 2), int(times[i]), places[i], *positions[i]]
+        for i in range(len(ids))
+    ]
+
+
+# The full-window catalog as one read-only binary snapshot file (the 'bin' payload) that
+# every worker process memory-maps, so numeric columns are shared zero-copy between
+# workers. The writer publishes a new version by writing a temporary file and renaming it
+# over the snapshot, then bumping the generation counter in a small shared file; readers
+# compare the counter on every use and remap when it changes.
+class CatalogSnapshot:
+    COUNTER = struct.Struct('<QQ')
+
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(f"{path}.gen", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < self.COUNTER.size:
+                os.ftruncate(fd, self.COUNTER.size)
+            self._counter = mmap.mmap(fd, self.COUNTER.size)
+        finally:
+            os.close(fd)
+        self._lock_file = None
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.cursor = None
+        self._catalog = None
+
+    # Try to become the single writer; the lock is held until the process exits
+    def acquire_writer(self):
+        if self._lock_file is None:
+            lock_file = open(f"{self.path}.lock", 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        return True
+
+    # Atomically replace the snapshot, then announce it with a new generation
+    def publish(self, catalog, cursor):
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as file:
+            file.write(catalog.to_binary())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+        generation, _ = self.COUNTER.unpack(self._counter)
+        self._counter[:] = self.COUNTER.pack(generation + 1, cursor)
+
+    # Map the newest published snapshot; returns True if it changed
+    def refresh(self):
+        generation, cursor = self.COUNTER.unpack(self._counter)
+        if generation == self.generation:
+            return False
+        with self._lock:
+            if generation != self.generation:
+                with open(self.path, 'rb') as file:
+                    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._catalog = Catalog.from_binary(mapped)
+                self.generation, self.cursor = generation, cursor
+        return True
+
+    # Window of the current snapshot starting at `start_ms` (memoized by the catalog) and its cursor
+    def window(self, start_ms):
+        self.refresh()
+        with self._lock:
+            catalog, cursor = self._catalog, self.cursor
+        return catalog.since(start_ms), cursor
+
+
+# An FDSN event service the ingest pulls from. fetch() returns (id, lon, lat, depth, mag,
+# time, place, updated, deleted) rows for events since `start_ms` or, incrementally, those
+# updated after `updated_ms`; subclasses speak one response format. Further providers
+# register a class in PROVIDER_FORMATS.
+class FdsnProvider:
+    format = None
+
+    def __init__(self, name, client):
+        self.name = name
+        self.client = client
+
+    def params(self, start_ms, updated_ms):
+        params = [('format', self.format), ('orderby', 'time-asc')]
+        if updated_ms is None:
+            params.append(('starttime', datetime.fromtimestamp(start_ms / 1000, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')))
+        else:
+            updated_after = datetime.fromtimestamp(updated_ms / 1000, timezone.utc)
+            params.append(('updatedafter', updated_after.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]))
+        return params
+
+    def fetch(self, start_ms, updated_ms=None):
+        fetched_ms = int(time.time() * 1000)
+        status, _, body = self.client.get(self.params(start_ms, updated_ms), {'Accept': self.accept})
+        # FDSN services answer 204 when nothing matches
+        if status == 204:
+            return []
+        if status != 200:
+            raise UpstreamError(f"{self.name} returned HTTP {status}")
+        return self.parse(body, fetched_ms)
+
+
+# USGS-style GeoJSON, with revision times and deletions
+class GeoJsonProvider(FdsnProvider):
+    format = 'geojson'
+    accept = 'application/json'
+
+    def params(self, start_ms, updated_ms):
+        params = super().params(start_ms, updated_ms)
+        if updated_ms is not None:
+            params.append(('includedeleted', 'true'))
+        return params
+
+    def parse(self, body, fetched_ms):
+        return parse_features(body)
+
+
+# The FDSN text format every fdsnws-event service offers (e.g. EMSC)
+class TextProvider(FdsnProvider):
+    format = 'text'
+    accept = 'text/plain'
+
+    def parse(self, body, fetched_ms):
+        return parse_fdsn_text(body, fetched_ms)
+
+
+PROVIDER_FORMATS = {'geojson': GeoJsonProvider, 'text': TextProvider}
+
+# Candidate origin pairs expanded at once while merging (bounds the merge's memory)
+MERGE_BATCH_PAIRS = 1 << 22
+
+
+# USGS followed by the CATALOG_PROVIDERS services, in order of preference
+def catalog_providers(spec):
+    providers = [GeoJsonProvider('usgs', usgs_client)]
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        key, _, url = entry.partition('=')
+        name, _, fmt = key.strip().partition(':')
+        if not url or fmt and fmt not in PROVIDER_FORMATS or name in (provider.name for provider in providers):
+            raise ValueError(f"Invalid CATALOG_PROVIDERS entry '{entry}'.")
+        client = UpstreamClient(name, url.strip(), UPSTREAM_MAX_CONCURRENCY, UPSTREAM_QUEUE_TIMEOUT, UPSTREAM_TIMEOUT)
+        providers.append(PROVIDER_FORMATS[fmt or 'text'](name, client))
+    return providers
+
+
+# Group (source, id, lon, lat, depth, mag, time, place, updated) origins from several
+# catalogs into quakes. Candidate pairs come from a time-sorted sweep inside a spatial
+# grid: cells are at least `distance_km` across (fewer columns towards the poles), so
+# for each origin only the 3x3 neighbouring cells' origins within `time_ms` are compared,
+# each found with two binary searches. Pairs from different sources that are within the
+# distance and magnitude tolerances are then joined closest first, never putting two
+# origins of one source in the same quake. Each quake takes the origin of the source
+# that comes first in `sources` and lists its members as space-separated source:id
+# provenance, preferred first. Origins of sources not in `sources` are left out. Returns
+# (id, lon, lat, depth, mag, time, place, updated, deleted, sources) rows.
+def merge_origins(origins, sources, time_ms, distance_km, mag_tolerance):
+    order_of = {name: rank for rank, name in enumerate(sources)}
+    origins = [origin for origin in origins if origin[0] in order_of]
+    if not origins:
+        return []
+    source, ids, lon, lat, depth, mag, times, place, updated = zip(*origins)
+    rank = np.array([order_of[name] for name in source], dtype=np.int64)
+    lon = np.array(lon, dtype=np.float64)
+    lat = np.array(lat, dtype=np.float64)
+    mag = np.array(mag, dtype=np.float64)
+    times = np.array(times, dtype=np.int64)
+    count = len(times)
+
+    # Grid rows of `size` degrees; each row's columns are as wide as `size` at its poleward edge
+    size = min(max(np.degrees(distance_km / (WGS84_A / 1000)), 0.01), 90.0)
+    rows = int(np.ceil(180 / size))
+    poleward = np.maximum(np.abs(np.arange(rows) * size - 90), np.abs(np.minimum(np.arange(1, rows + 1) * size, 180) - 90))
+    columns = np.maximum(np.floor(360 * np.cos(np.radians(poleward)) / size), 1).astype(np.int64)
+    first_cell = np.concatenate([[0], np.cumsum(columns)])
+
+    def column(row, lon):
+        return np.minimum(((lon + 180) / 360 * columns[row]).astype(np.int64), columns[row] - 1)
+
+    row = np.minimum(((lat + 90) / size).astype(np.int64), rows - 1)
+    offset = times - times.min() + int(time_ms)
+    span = int(offset.max()) + int(time_ms) + 1
+    keys = (first_cell[row] + column(row, lon)) * span + offset
+
+    # Keep candidate pairs from different sources within the distance and magnitude tolerances
+    def close_pairs(a, b):
+        lon_a, lat_a, lon_b, lat_b = (np.radians(values) for values in (lon[a], lat[a], lon[b], lat[b]))
+        haversine = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+        distance = 2 * (WGS84_A / 1000) * np.arcsin(np.sqrt(np.minimum(haversine, 1.0)))
+        close = (distance <= distance_km) & ~(np.abs(mag[a] - mag[b]) > mag_tolerance)
+        return a[close], b[close], distance[close]
+
+    # Each origin is only compared with other sources' origins, so one busy catalog does not
+    # compare against itself; candidates are expanded a bounded batch at a time
+    found = []
+    everyone = np.arange(count)
+    for other in range(len(sources)):
+        members = np.flatnonzero(rank == other)
+        if not len(members) or len(members) == count:
+            continue
+        order = members[np.argsort(keys[members], kind='stable')]
+        sorted_keys = keys[order]
+        searching = everyone[rank != other]
+        # Searching in key order keeps the binary searches cache-friendly
+        searching = searching[np.argsort(keys[searching], kind='stable')]
+        for row_offset in (-1, 0, 1):
+            near_row = row[searching] + row_offset
+            valid = (near_row >= 0) & (near_row < rows)
+            near_row = np.clip(near_row, 0, rows - 1)
+            center = column(near_row, lon[searching])
+            for column_offset in (-1, 0, 1):
+                # Rows with fewer than three columns would visit a cell twice
+                valid_cell = valid & ((column_offset == 0) | (columns[near_row] >= 3))
+                base = (first_cell[near_row] + (center + column_offset) % columns[near_row]) * span + offset[searching]
+                low = np.searchsorted(sorted_keys, base - int(time_ms), 'left')
+                lengths = np.where(valid_cell, np.searchsorted(sorted_keys, base + int(time_ms), 'right') - low, 0)
+                ends = np.cumsum(lengths)
+                cuts = np.searchsorted(ends, np.arange(MERGE_BATCH_PAIRS, int(ends[-1]) if len(ends) else 0, MERGE_BATCH_PAIRS))
+                for first, last in zip(np.concatenate([[0], cuts]), np.concatenate([cuts, [len(searching)]])):
+                    total = int(lengths[first:last].sum())
+                    if not total:
+                        continue
+                    batch = lengths[first:last]
+                    starts = np.repeat(low[first:last] - np.cumsum(batch) + batch, batch)
+                    found.append(close_pairs(np.repeat(searching[first:last], batch), order[starts + np.arange(total)]))
+
+    # Each pair once, whichever side found it
+    a, b, distance = (np.concatenate(parts) for parts in zip(*found)) if found else (np.empty(0, dtype=np.int64),) * 3
+    pairs, unique = np.unique(np.minimum(a, b) * count + np.maximum(a, b), return_index=True)
+    a, b, distance = pairs // count, pairs % count, distance[unique]
+    score = ((times[a] - times[b]) / max(time_ms, 1)) ** 2 + (distance / max(distance_km, 1e-9)) ** 2
+
+    parents = list(range(count))
+    members = (1 << rank).tolist()
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    closest = np.argsort(score, kind='stable')
+    for i, j in zip(a[closest].tolist(), b[closest].tolist()):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j and not members[root_i] & members[root_j]:
+            parents[root_j] = root_i
+            members[root_i] |= members[root_j]
+    roots = np.array(parents)
+    while True:
+        hop = roots[roots]
+        if np.array_equal(hop, roots):
+            break
+        roots = hop
+
+    grouped = np.lexsort((rank, roots))
+    group_starts = np.flatnonzero(np.concatenate([[True], roots[grouped][1:] != roots[grouped][:-1]]))
+    latest = np.maximum.reduceat(np.array(updated, dtype=np.int64)[grouped], group_starts).tolist()
+    boundaries = group_starts.tolist() + [count]
+    grouped = grouped.tolist()
+    merged = []
+    for k, first in enumerate(boundaries[:-1]):
+        group = grouped[first:boundaries[k + 1]]
+        merged.append(origins[group[0]][1:8] + (latest[k], False, ' '.join(f"{source[i]}:{ids[i]}" for i in group)))
+    return merged
+
+
+# Background poller pulling new and updated events from the providers into the store. The
+# worker that holds the snapshot writer lock syncs and publishes; in every process the worker
+# follows published snapshots and feeds their changes to the store listeners. Any failure is
+# logged and retried after a growing delay, so neither the writer role nor the listeners
+# are lost to one bad sync.
+class IngestWorker(threading.Thread):
+    MAX_BACKOFF = 60
+
+    def __init__(self, store, snapshot, providers, interval):
+        super().__init__(name='usgs-ingest', daemon=True)
+        self.store = store
+        self.snapshot = snapshot
+        self.providers = providers
+        self.interval = interval
+        self.ready = threading.Event()
+        self.published = False
+
+    def run(self):
+        next_sync = 0
+        backoff = SNAPSHOT_POLL_INTERVAL
+        while True:
+            try:
+                if time.monotonic() >= next_sync and self.snapshot.acquire_writer():
+                    next_sync = time.monotonic() + self.interval
+                    try:
+                        self.sync()
+                    except UpstreamError as error:
+                        app.logger.warning('USGS ingest failed: %s', error)
+                if self.snapshot.refresh() or self.snapshot.generation:
+                    self.store.follow(self.snapshot.cursor)
+                    self.ready.set()
+                backoff = SNAPSHOT_POLL_INTERVAL
+            except Exception:
+                app.logger.exception('Ingest worker failed; retrying in %.1f s', backoff)
+                next_sync = time.monotonic() + backoff
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.MAX_BACKOFF)
+            time.sleep(SNAPSHOT_POLL_INTERVAL)
+
+    # One incremental sync: backfill the full window first, then only events updated since the watermark
+    def sync(self):
+        if len(self.providers) == 1:
+            changed = self.store.apply(self.providers[0].fetch(window_start_ms(MAX_DAYS), self.store.watermark()))
+        else:
+            changed = self.merge()
+        changed += self.store.prune(window_start_ms(MAX_DAYS + 1))
+        if changed or not self.published:
+            self.snapshot.publish(*self.store.latest())
+            self.published = True
+
+    # Sync every provider's origins (one failing provider does not hold back the others),
+    # then re-merge the window if any origin changed; origins of providers dropped from the
+    # configuration are forgotten. Returns the number of changed events.
+    def merge(self):
+        changed = self.store.retain_sources([provider.name for provider in self.providers])
+        for provider in self.providers:
+            try:
+                rows = provider.fetch(window_start_ms(MAX_DAYS), self.store.watermark(provider.name))
+            except UpstreamError as error:
+                app.logger.warning('%s ingest failed: %s', provider.name, error)
+                continue
+            changed += self.store.apply_origins(provider.name, rows)
+        if not changed and self.published:
+            return 0
+        start_ms = window_start_ms(MAX_DAYS + 1)
+        merged = merge_origins(
+            self.store.origins(start_ms), [provider.name for provider in self.providers],
+            MERGE_TIME_TOLERANCE * 1000, MERGE_DISTANCE_TOLERANCE, MERGE_MAG_TOLERANCE
+        )
+        return self.store.reconcile(merged, start_ms)
+
+
+# Server-Sent Events fan-out of store changes. Every change is encoded once as a delta
+# message (the /api/earthquakes?since= payload, with the cursor as event id) and queued
+# to each connected client; a client whose bounded queue is full is disconnected and
+# resumes from its Last-Event-ID when the browser reconnects.
+class StreamHub:
+    class Client:
+        def __init__(self, buffer):
+            self.queue = queue.Queue(maxsize=buffer)
+            self.closed = False
+
+    def __init__(self, store, buffer, max_clients):
+        self.store = store
+        self.buffer = buffer
+        self.max_clients = max_clients
+        self.clients = set()
+        self.evicted = 0
+        self._lock = threading.Lock()
+        store.subscribe(self.publish, replay=False)
+
+    def connect(self):
+        client = self.Client(self.buffer)
+        with self._lock:
+            if len(self.clients) >= self.max_clients:
+                return None
+            self.clients.add(client)
+            STREAM_CLIENTS.set(len(self.clients))
+        return client
+
+    def disconnect(self, client):
+        with self._lock:
+            self.clients.discard(client)
+            STREAM_CLIENTS.set(len(self.clients))
+
+    @staticmethod
+    def message(cursor, events, deleted):
+        data = json.dumps({'cursor': cursor, 'events': events, 'deleted': deleted}, separators=(',', ':'))
+        return f"id: {cursor}\nevent: delta\ndata: {data}\n\n".encode('utf-8')
+
+    # Store listener: queue one shared message to every client, evicting those that are full
+    def publish(self, rows, deleted):
+        message = self.message(self.store.cursor, with_positions(rows), list(deleted))
+        with self._lock:
+            for client in list(self.clients):
+                try:
+                    client.queue.put_nowait(message)
+                except queue.Full:
+                    self.clients.discard(client)
+                    STREAM_CLIENTS.set(len(self.clients))
+                    STREAM_EVICTIONS.inc()
+                    self.evicted += 1
+                    client.closed = True
+                    with client.queue.mutex:
+                        client.queue.queue.clear()
+                    client.queue.put_nowait(None)
+
+    # Response body for one client: changes since `since` first, then live deltas and keep-alives
+    def events(self, client, since):
+        try:
+            yield f"retry: {int(STREAM_HEARTBEAT * 1000)}\n\n".encode('utf-8')
+            if since is not None:
+                cursor = self.store.cursor
+                events, deleted = self.store.changes_since(since, cursor)
+                if events or deleted:
+                    yield self.message(cursor, events, deleted)
+            while True:
+                try:
+                    message = client.queue.get(timeout=STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield b': keep-alive\n\n'
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.disconnect(client)
+
+
+# Years of catalog as month partitions: ARCHIVE_PATH/YYYY-MM/ holds one .npy file per
+# column, sorted by time, and stats.json with the partition's event count and min/max
+# time, magnitude, longitude and latitude. A query reads only the statistics of every
+# partition, skips those that cannot match, and scans the rest memory-mapped one at a time.
+class Archive:
+    COLUMNS = ('lon', 'lat', 'depth', 'mag', 'time', 'positions', 'place_index', 'ids', 'places')
+
+    def __init__(self, path):
+        self.path = path
+        self._stats = {}
+
+    # {month: stats} for every partition on disk, re-read only when a partition is rewritten
+    def partitions(self):
+        try:
+            months = sorted(name for name in os.listdir(self.path) if len(name) == 7 and name[4] == '-' and name.replace('-', '').isdigit())
+        except FileNotFoundError:
+            return {}
+        partitions = {}
+        for month in months:
+            stats_path = os.path.join(self.path, month, 'stats.json')
+            try:
+                stamp = os.stat(stats_path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            cached = self._stats.get(month)
+            if cached is None or cached[0] != stamp:
+                with open(stats_path) as file:
+                    cached = self._stats[month] = (stamp, json.load(file))
+            partitions[month] = cached[1]
+        return partitions
+
+    # Months whose statistics overlap the time range [start_ms, end_ms), bbox and minimum magnitude
+    def plan(self, start_ms, end_ms, bbox=None, min_mag=None):
+        months = []
+        for month, stats in self.partitions().items():
+            if not stats['count'] or stats['time_max'] < start_ms or stats['time_min'] >= end_ms:
+                continue
+            if min_mag is not None and (stats['mag_max'] is None or stats['mag_max'] < min_mag):
+                continue
+            if bbox is not None:
+                west, south, east, north = bbox
+                if stats['lat_max'] < south or stats['lat_min'] > north:
+                    continue
+                if west <= east and (stats['lon_max'] < west or stats['lon_min'] > east):
+                    continue
+                if west > east and stats['lon_max'] < west and stats['lon_min'] > east:
+                    continue
+            months.append(month)
+        return months
+
+    # Catalogs of the matching events of each planned month, in time order
+    def scan(self, months, start_ms, end_ms, bbox=None, min_mag=None):
+        for month in months:
+            columns = self._load(month)
+            first, last = np.searchsorted(columns['time'], [start_ms, end_ms])
+            mask = np.ones(last - first, dtype=bool)
+            if min_mag is not None:
+                mask &= columns['mag'][first:last] >= min_mag
+            if bbox is not None:
+                west, south, east, north = bbox
+                lon, lat = columns['lon'][first:last], columns['lat'][first:last]
+                mask &= (lat >= south) & (lat <= north)
+                mask &= ((lon >= west) & (lon <= east)) if west <= east else ((lon >= west) | (lon <= east))
+            indices = first + np.flatnonzero(mask)
+            if len(indices):
+                yield self._subset(columns, indices)
+
+    # Atomically replace a month's partition with `catalog`
+    def write(self, month, catalog):
+        catalog = catalog.take(np.argsort(catalog.time, kind='stable'))
+        directory = os.path.join(self.path, month)
+        temporary = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        columns = {
+            'lon': catalog.lon, 'lat': catalog.lat, 'depth': catalog.depth, 'mag': catalog.mag,
+            'time': catalog.time, 'positions': catalog.positions().astype(np.float32),
+            'place_index': catalog.place_index,
+            'ids': np.array(catalog.ids, dtype=np.str_), 'places': np.array(catalog.places, dtype=np.str_)
+        }
+        for name in self.COLUMNS:
+            np.save(os.path.join(temporary, f"{name}.npy"), columns[name])
+
+        def bounds(values):
+            values = values[~np.isnan(values)]
+            return (float(values.min()), float(values.max())) if len(values) else (None, None)
+
+        stats = {'count': len(catalog)}
+        for name in ('time', 'mag', 'lon', 'lat'):
+            stats[f"{name}_min"], stats[f"{name}_max"] = bounds(getattr(catalog, name))
+        with open(os.path.join(temporary, 'stats.json'), 'w') as file:
+            json.dump(stats, file)
+
+        retired = f"{directory}.{os.getpid()}.old"
+        if os.path.exists(directory):
+            os.rename(directory, retired)
+        os.rename(temporary, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+        return stats
+
+    # Fetch one calendar month from USGS and write it as a partition
+    def backfill(self, client, month):
+        year, number = (int(part) for part in month.split('-'))
+        start = datetime(year, number, 1, tzinfo=timezone.utc)
+        end = datetime(year + number // 12, number % 12 + 1, 1, tzinfo=timezone.utc)
+        start_ms, end_ms = start.timestamp() * 1000, end.timestamp() * 1000
+        rows = {row[0]: row for row in fetch_range(client, start, end) if start_ms <= row[5] < end_ms}
+        return self.write(month, Catalog.from_rows(list(rows.values())))
+
+    def _load(self, month):
+        directory = os.path.join(self.path, month)
+        return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in self.COLUMNS}
+
+    # Copy the rows at `indices` out of the mapped columns, with an unused-free place table
+    def _subset(self, columns, indices):
+        used_places, place_index = np.unique(columns['place_index'][indices], return_inverse=True)
+        catalog = Catalog(
+            columns['ids'][indices].tolist(),
+            np.asarray(columns['lon'][indices]),
+            np.asarray(columns['lat'][indices]),
+            np.asarray(columns['depth'][indices]),
+            np.asarray(columns['mag'][indices]),
+            np.asarray(columns['time'][indices]),
+            place_index.astype(np.uint32),
+            columns['places'][used_places].tolist()
+        )
+        catalog._memo['positions'] = np.asarray(columns['positions'][indices])
+        return catalog
+
+
+# Live (non-deleted) (id, lon, lat, depth, mag, time, place) rows for [start, end) from USGS,
+# halving the range while USGS rejects it for exceeding its per-query event limit (HTTP 400)
+def fetch_range(client, start, end):
+    params = (
+        ('format', 'geojson'),
+        ('orderby', 'time-asc'),
+        ('starttime', start.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('endtime', end.strftime('%Y-%m-%dT%H:%M:%S'))
+    )
+    status, _, body = client.get(params, {'Accept': 'application/json'})
+    if status == 400 and end - start > timedelta(hours=1):
+        middle = start + timedelta(seconds=int((end - start).total_seconds()) // 2)
+        return fetch_range(client, start, middle) + fetch_range(client, middle, end)
+    if status != 200:
+        raise UpstreamError(f"USGS returned HTTP {status}")
+    return [row[:7] for row in parse_features(body) if not row[8]]
+
+
+# 'YYYY-MM' month names from `first` to `last` inclusive
+def month_range(first, last):
+    try:
+        year, month = (int(part) for part in first.split('-'))
+        last_year, last_month = (int(part) for part in last.split('-'))
+    except ValueError:
+        raise InvalidQuery("Months must be 'YYYY-MM'.") from None
+    months = []
+    while (year, month) <= (last_year, last_month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = year + month // 12, month % 12 + 1
+    return months
+
+
+# Serving state, set up by start_serving() on the first request
+event_store = None
+catalog_snapshot = None
+ingest_worker = None
+stream_hub = None
+archive = Archive(ARCHIVE_PATH) if ARCHIVE_PATH else None
+
+
+# Response body stored once per content-coding, with a strong ETag per coding
+# (compressed lazily, on the first request that accepts each coding; already
+# compressed formats such as PNG pass compress=False)
+class PrecompressedBody:
+    def __init__(self, body, mimetype, gzip_level=9, brotli_quality=11, compress=True):
+        self.mimetype = mimetype
+        self.compress = compress
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {'identity': (body, self.digest)}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding):
+        with self._lock:
+            if encoding not in self.variants:
+                body = self.variants['identity'][0]
+                with COMPRESS_DURATION.time(encoding):
+                    if encoding == 'br':
+                        self.variants['br'] = (brotli.compress(body, quality=self.brotli_quality), f"{self.digest}-br")
+                    else:
+                        self.variants['gzip'] = (gzip.compress(body, compresslevel=self.gzip_level, mtime=0), f"{self.digest}-gz")
+            return self.variants[encoding]
+
+    # Pick the best encoding the client accepts and answer conditionally (304 on ETag match)
+    def respond(self, cache_control):
+        accepted = request.accept_encodings
+        if not self.compress:
+            encodings = ()
+        elif brotli is not None:
+            encodings = ('br', 'gzip')
+        else:
+            encodings = ('gzip',)
+        encoding = next((name for name in encodings if accepted[name]), 'identity')
+        body, etag = self.variant(encoding)
+        response = Response(body, mimetype=self.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = cache_control
+        response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+
+# Load static assets into memory under content-hashed names (app.css -> app.<hash>.css)
+def load_assets(directory):
+    assets, urls = {}, {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), 'rb') as f:
+            body = f.read()
+        stem, ext = os.path.splitext(name)
+        hashed_name = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        assets[hashed_name] = PrecompressedBody(body, mimetype)
+        urls[name] = f"/static/{hashed_name}"
+    return assets, urls
+
+
+STATIC_ASSETS, ASSET_URLS = load_assets(STATIC_DIR)
+
+
+def asset_url(name):
+    return ASSET_URLS[name]
+
 
 # HTML template with Cesium-based heatmap functionality using PointPrimitives
 HTML_TEMPLATE = """
@@ -21,240 +2486,9 @@ HTML_TEMPLATE = """
     <meta charset="UTF-8">
     <title>🌍 3D Earthquake Visualization</title>
     <!-- Include CesiumJS -->
-    <script src="https://cesium.com/downloads/cesiumjs/releases/1.104/Build/Cesium/Cesium.js"></script>
-    <link href="https://cesium.com/downloads/cesiumjs/releases/1.104/Build/Cesium/Widgets/widgets.css" rel="stylesheet">
-    <style>
-        html, body, #cesiumContainer {
-            width: 100%; height: 100%; margin: 0; padding: 0; overflow: hidden;
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background-color: #f5f5f5;
-        }
-        /* Header Styling */
-        #header {
-            position: absolute;
-            top: 0; left: 0; width: 100%;
-            background: rgba(255, 255, 255, 0.95);
-            padding: 15px 30px;
-            box-sizing: border-box;
-            z-index: 3;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        #header h1 {
-            margin: 0;
-            font-size: 24px;
-            color: #333;
-            text-align: center;
-        }
-        #header p {
-            margin: 8px 0 15px 0;
-            font-size: 14px;
-            color: #666;
-            text-align: center;
-            max-width: 800px;
-        }
-        #controls {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 15px;
-            justify-content: center;
-            align-items: center;
-        }
-        #controls label {
-            font-size: 14px;
-            color: #333;
-        }
-        /* Slider Styling */
-        #dateRangeContainer {
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-        }
-        #dateRange {
-            width: 200px;
-        }
-        #controls button, #controls select {
-            padding: 6px 12px;
-            font-size: 14px;
-            border: none;
-            border-radius: 4px;
-            cursor: pointer;
-            background-color: #0078D7;
-            color: #fff;
-            transition: background-color 0.3s;
-        }
-        #controls button:hover, #controls select:hover {
-            background-color: #005a9e;
-        }
-        /* Legend Styling */
-        #legend {
-            margin-top: 15px;
-            background: rgba(255,255,255,0.9);
-            padding: 10px 15px;
-            border-radius: 5px;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-            display: flex;
-            flex-wrap: wrap;
-            gap: 10px;
-            justify-content: center;
-        }
-        .legend-item {
-            display: flex;
-            align-items: center;
-            margin-bottom: 5px;
-        }
-        .legend-color {
-            width: 20px;
-            height: 20px;
-            margin-right: 8px;
-            border-radius: 3px;
-        }
-        /* Earthquake Bar Styling */
-        #earthquakeBar {
-            position: absolute;
-            bottom: 0;
-            left: 0;
-            width: 100%;
-            background: rgba(255, 255, 255, 0.95);
-            padding: 10px 0;
-            box-shadow: 0 -2px 4px rgba(0,0,0,0.1);
-            z-index: 3;
-            display: flex;
-            overflow-x: auto;
-            align-items: center;
-        }
-        #earthquakeBar::-webkit-scrollbar {
-            height: 8px;
-        }
-        #earthquakeBar::-webkit-scrollbar-thumb {
-            background: #ccc;
-            border-radius: 4px;
-        }
-        .bar-item {
-            flex: 0 0 auto;
-            margin: 0 15px;
-            font-size: 14px;
-            color: #0078D7;
-            cursor: pointer;
-            transition: color 0.3s;
-            white-space: nowrap;
-        }
-        .bar-item:hover {
-            color: #005a9e;
-            text-decoration: underline;
-        }
-        /* Modal Styling */
-        #modal {
-            display: none;
-            position: fixed;
-            z-index: 4;
-            left: 0;
-            top: 0;
-            width: 100%;
-            height: 100%;
-            overflow: auto;
-            background-color: rgba(0,0,0,0.5);
-        }
-        #modalContent {
-            background-color: #fff;
-            margin: 5% auto;
-            padding: 20px;
-            border: 1px solid #888;
-            width: 90%;
-            max-width: 800px;
-            border-radius: 5px;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.2);
-        }
-        #closeModal {
-            color: #aaa;
-            float: right;
-            font-size: 28px;
-            font-weight: bold;
-            cursor: pointer;
-        }
-        #closeModal:hover,
-        #closeModal:focus {
-            color: #000;
-            text-decoration: none;
-        }
-        /* Tooltip Styling */
-        #tooltip {
-            position: absolute;
-            background: rgba(0, 0, 0, 0.8);
-            color: #fff;
-            padding: 8px 12px;
-            border-radius: 4px;
-            pointer-events: none;
-            font-size: 13px;
-            z-index: 5;
-            display: none;
-            max-width: 300px;
-            word-wrap: break-word;
-        }
-        /* Search Box Styling */
-        #searchBox {
-            position: absolute;
-            top: 15px;
-            right: 30px;
-            z-index: 4;
-            display: flex;
-            align-items: center;
-            background: rgba(255, 255, 255, 0.95);
-            padding: 5px;
-            border-radius: 4px;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        }
-        #searchInput {
-            border: none;
-            outline: none;
-            padding: 5px;
-            font-size: 14px;
-        }
-        #searchButton {
-            border: none;
-            background: none;
-            cursor: pointer;
-            font-size: 16px;
-            padding: 5px;
-        }
-        /* Responsive Design */
-        @media (max-width: 768px) {
-            #header {
-                padding: 10px 20px;
-            }
-            #header h1 {
-                font-size: 20px;
-            }
-            #header p {
-                font-size: 12px;
-            }
-            #controls {
-                flex-direction: column;
-                gap: 10px;
-            }
-            #controls label, #controls input[type=range], #controls button, #controls select {
-                width: 100%;
-                text-align: center;
-            }
-            #legend {
-                flex-direction: column;
-                gap: 8px;
-            }
-            #earthquakeBar {
-                padding: 8px 0;
-            }
-            .bar-item {
-                margin: 0 10px;
-                font-size: 12px;
-            }
-            #searchBox {
-                top: 10px;
-                right: 20px;
-            }
-        }
-    </style>
+    <script src="{{ cesium_url }}/Cesium.js"></script>
+    <link href="{{ cesium_url }}/Widgets/widgets.css" rel="stylesheet">
+    <link href="{{ asset_url('app.css') }}" rel="stylesheet">
 </head>
 <body>
     <div id="cesiumContainer"></div>
@@ -273,27 +2507,66 @@ HTML_TEMPLATE = """
                 <option value="Cesium World Imagery">Cesium World Imagery (Default)</option>
                 <option value="OpenStreetMap">OpenStreetMap</option>
             </select>
-        </div>
-        <div id="legend">
-            <div class="legend-item">
-                <div class="legend-color" style="background-color: #d7191c;"></div>
-                <span>Mag ≥ 5.0</span>
-            </div>
-            <div class="legend-item">
-                <div class="legend-color" style="background-color: #fdae61;"></div>
-                <span>4.0 ≤ Mag < 5.0</span>
+            <div id="playbackControls">
+                <button id="playbackToggle">▶ Play</button>
+                <button id="playbackStop" disabled>■</button>
+                <div id="playbackTrack">
+                    <canvas id="playbackActivity" width="300" height="20"></canvas>
+                    <input type="range" id="playbackScrub" min="0" max="1000" value="1000">
+                </div>
+                <select id="playbackSpeed">
+                    <option value="1">1 h/s</option>
+                    <option value="6" selected>6 h/s</option>
+                    <option value="24">1 day/s</option>
+                    <option value="72">3 days/s</option>
+                </select>
+                <span id="playbackTime"></span>
             </div>
-            <div class="legend-item">
-                <div class="legend-color" style="background-color: #ffffbf;"></div>
-                <span>3.0 ≤ Mag < 4.0</span>
+            <div id="archiveControls" style="display: none;">
+                <label for="archiveStart">Archive:</label>
+                <input type="date" id="archiveStart">
+                <label for="archiveEnd">to</label>
+                <input type="date" id="archiveEnd">
+                <label for="archiveMinMag">Min Mag</label>
+                <input type="number" id="archiveMinMag" min="0" max="10" step="0.5" value="4">
+                <button id="archiveLoad">Load Archive</button>
+                <button id="archiveExit" style="display: none;">Back to Recent</button>
             </div>
-            <div class="legend-item">
-                <div class="legend-color" style="background-color: #a6d96a;"></div>
-                <span>2.0 ≤ Mag < 3.0</span>
+        </div>
+        <div id="legendRow">
+            <div id="legend">
+                <div class="legend-item">
+                    <div class="legend-color" style="background-color: #d7191c;"></div>
+                    <span>Mag ≥ 5.0</span>
+                    <span class="legend-count"></span>
+                </div>
+                <div class="legend-item">
+                    <div class="legend-color" style="background-color: #fdae61;"></div>
+                    <span>4.0 ≤ Mag < 5.0</span>
+                    <span class="legend-count"></span>
+                </div>
+                <div class="legend-item">
+                    <div class="legend-color" style="background-color: #ffffbf;"></div>
+                    <span>3.0 ≤ Mag < 4.0</span>
+                    <span class="legend-count"></span>
+                </div>
+                <div class="legend-item">
+                    <div class="legend-color" style="background-color: #a6d96a;"></div>
+                    <span>2.0 ≤ Mag < 3.0</span>
+                    <span class="legend-count"></span>
+                </div>
+                <div class="legend-item">
+                    <div class="legend-color" style="background-color: #1a9641;"></div>
+                    <span>Mag < 2.0</span>
+                    <span class="legend-count"></span>
+                </div>
+                <div class="legend-item" id="legendStats"></div>
             </div>
-            <div class="legend-item">
-                <div class="legend-color" style="background-color: #1a9641;"></div>
-                <span>Mag < 2.0</span>
+            <div id="statsPanel">
+                <div id="statsSummary"></div>
+                <div id="statsBValue"></div>
+                <canvas id="statsDaily" width="180" height="30"></canvas>
+                <div id="statsCells"></div>
             </div>
         </div>
     </div>
@@ -305,7 +2578,8 @@ HTML_TEMPLATE = """
 
     <!-- Search box -->
     <div id="searchBox">
-        <input type="text" id="searchInput" placeholder="Search location...">
+        <input type="text" id="searchInput" placeholder="Search location..." list="searchSuggestions" autocomplete="off">
+        <datalist id="searchSuggestions"></datalist>
         <button id="searchButton">🔍</button>
     </div>
 
@@ -317,327 +2591,609 @@ HTML_TEMPLATE = """
         <div id="modalContent">
             <span id="closeModal">&times;</span>
             <h2>All Earthquakes</h2>
-            <table id="fullEqTable">
-                <thead>
-                    <tr>
-                        <th>Mag</th>
-                        <th>Depth (km)</th>
-                        <th>Location</th>
-                        <th>Time (UTC)</th>
-                    </tr>
-                </thead>
-                <tbody></tbody>
-            </table>
+            <input type="text" id="tableFilter" placeholder="Filter by location...">
+            <div id="tableScroll">
+                <table id="fullEqTable">
+                    <thead>
+                        <tr>
+                            <th data-sort="mag">Mag</th>
+                            <th data-sort="depth">Depth (km)</th>
+                            <th data-sort="place">Location</th>
+                            <th data-sort="time">Time (UTC)</th>
+                        </tr>
+                    </thead>
+                    <tbody></tbody>
+                </table>
+            </div>
         </div>
     </div>
 
     <!-- Script Section -->
     <script>
         Cesium.Ion.defaultAccessToken = '{{ cesium_token }}';
-        const viewer = new Cesium.Viewer('cesiumContainer', {
-            terrainProvider: Cesium.createWorldTerrain(),
-            baseLayerPicker: false,
-            navigationHelpButton: true,
-            sceneModePicker: true,
-            animation: false,
-            timeline: false,
-            fullscreenButton: false,
-            homeButton: true,
-            geocoder: false,
-            infoBox: false,
-            selectionIndicator: false,
-            navigationInstructionsInitiallyVisible: false
-        });
-
-        let heatmapEnabled = false;
-        let earthquakes = [];
-        let heatmapPoints = [];
-
-        // Function to get color based on magnitude
-        function getColor(magnitude) {
-            if (magnitude >= 5.0) return Cesium.Color.RED.withAlpha(0.6);
-            if (magnitude >= 4.0) return Cesium.Color.ORANGE.withAlpha(0.6);
-            if (magnitude >= 3.0) return Cesium.Color.YELLOW.withAlpha(0.6);
-            if (magnitude >= 2.0) return Cesium.Color.GREEN.withAlpha(0.6);
-            return Cesium.Color.BLUE.withAlpha(0.6);
-        }
+        const OFFLINE_CACHE = {{ offline_cache | tojson }};
+    </script>
+    <script src="{{ asset_url('renderer.js') }}"></script>
+    <script src="{{ asset_url('app.js') }}"></script>
+</body>
+</html>
+"""
 
-        // Fetch earthquakes from USGS API based on selected date range
-        function fetchEarthquakes(days) {
-            const endDate = new Date();
-            const startDate = new Date();
-            startDate.setDate(endDate.getDate() - days);
-            const formatDate = date => date.toISOString().split('T')[0];
-
-            const startTime = formatDate(startDate);
-            const endTime = formatDate(endDate);
-            const url = `https://earthquake.usgs.gov/fdsnws/event/1/query?format=geojson&starttime=${startTime}&endtime=${endTime}`;
-
-            fetch(url)
-                .then(response => response.json())
-                .then(data => {
-                    if (!data.features) {
-                        throw new Error("Invalid earthquake data format.");
-                    }
-                    earthquakes = data.features.sort((a, b) => (b.properties.mag || 0) - (a.properties.mag || 0));
-                    updateEarthquakeData();
-                })
-                .catch(error => {
-                    console.error('Error fetching earthquake data:', error);
-                });
+# Frame-time benchmark page for the point renderer
+RENDER_BENCH_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Renderer Benchmark</title>
+    <script src="{{ cesium_url }}/Cesium.js"></script>
+    <link href="{{ cesium_url }}/Widgets/widgets.css" rel="stylesheet">
+    <style>
+        html, body, #cesiumContainer { width: 100%; height: 100%; margin: 0; padding: 0; overflow: hidden; }
+        #results {
+            position: absolute; top: 10px; left: 10px; z-index: 3; margin: 0;
+            background: rgba(255, 255, 255, 0.9); padding: 10px; font-size: 12px;
         }
+    </style>
+</head>
+<body>
+    <div id="cesiumContainer"></div>
+    <pre id="results"></pre>
+    <script>
+        Cesium.Ion.defaultAccessToken = '{{ cesium_token }}';
+    </script>
+    <script src="{{ asset_url('renderer.js') }}"></script>
+    <script src="{{ asset_url('bench-render.js') }}"></script>
+</body>
+</html>
+"""
 
-        // Update earthquake data on the map and top list
-        function updateEarthquakeData() {
-            const top10 = earthquakes.slice(0, 10);
-            const bar = document.getElementById('earthquakeBar');
-            bar.innerHTML = '<div class="bar-item"><strong>Top Earthquakes:</strong></div>';
-
-            top10.forEach((eq, index) => {
-                const mag = eq.properties.mag || 0;
-                const place = eq.properties.place || 'Unknown';
-                const div = document.createElement('div');
-                div.className = 'bar-item';
-                div.innerText = `⭐ ${mag.toFixed(1)} - ${place}`;
-                div.onclick = () => flyToEarthquake(earthquakes.indexOf(eq));
-                bar.appendChild(div);
-            });
-
-            const viewAll = document.createElement('div');
-            viewAll.className = 'bar-item';
-            viewAll.innerHTML = `<strong>View All</strong>`;
-            viewAll.onclick = () => openModal();
-            bar.appendChild(viewAll);
-
-            // Remove existing entities
-            viewer.entities.removeAll();
-            heatmapPoints = [];
-
-            if (heatmapEnabled) {
-                addHeatmap();
-            } else {
-                addEarthquakePoints();
-                if (earthquakes.length > 0) {
-                    viewer.zoomTo(viewer.entities).otherwise(() => {
-                        console.log('Zoom failed');
-                    });
-                }
-            }
-        }
 
-        // Add earthquake points to the Cesium viewer
-        function addEarthquakePoints() {
-            earthquakes.forEach(eq => {
-                const [lon, lat, depth] = eq.geometry.coordinates;
-                const mag = eq.properties.mag || 0;
-                const depthKm = (depth !== null && depth !== undefined) ? depth.toFixed(1) : 'Unknown';
-                viewer.entities.add({
-                    position: Cesium.Cartesian3.fromDegrees(lon, lat),
-                    point: {
-                        pixelSize: Math.max(6 + mag * 2, 6),
-                        color: getColor(mag),
-                        outlineColor: Cesium.Color.BLACK,
-                        outlineWidth: 1
-                    },
-                    description: `
-                        <b>Magnitude:</b> ${mag}<br>
-                        <b>Depth:</b> ${depthKm} km<br>
-                        <b>Location:</b> ${eq.properties.place}<br>
-                        <b>Time:</b> ${new Date(eq.properties.time).toISOString().replace('T', ' ').split('.')[0]} UTC
-                    `
-                });
-            });
-        }
+# Page HTML for the startup configuration
+def render_page(template):
+    return render_template_string(
+        template,
+        cesium_token=CESIUM_ION_ACCESS_TOKEN,
+        cesium_url=CESIUM_URL,
+        offline_cache=OFFLINE_CACHE,
+        asset_url=asset_url
+    )
 
-        // Add heatmap using PointPrimitives
-        function addHeatmap() {
-            const pointCollection = new Cesium.PointPrimitiveCollection();
-            viewer.scene.primitives.add(pointCollection);
-
-            earthquakes.forEach(eq => {
-                const [lon, lat, depth] = eq.geometry.coordinates;
-                const mag = eq.properties.mag || 0;
-                pointCollection.add({
-                    position: Cesium.Cartesian3.fromDegrees(lon, lat),
-                    color: getColor(mag),
-                    pixelSize: Math.max(10 + mag * 3, 10)
-                });
-            });
-
-            heatmapPoints.push(pointCollection);
-        }
 
-        // Fly to a specific earthquake location
-        function flyToEarthquake(index) {
-            const eq = earthquakes[index];
-            if (!eq) {
-                console.error('Invalid earthquake index:', index);
-                return;
-            }
-            const [lon, lat] = eq.geometry.coordinates;
-            viewer.camera.flyTo({
-                destination: Cesium.Cartesian3.fromDegrees(lon, lat, 200000),
-                duration: 2,
-                orientation: { pitch: Cesium.Math.toRadians(270) }
-            });
-        }
+# Pages only depend on startup configuration, so render and compress them once
+def prerender(template):
+    with app.app_context():
+        return PrecompressedBody(render_page(template).encode('utf-8'), 'text/html')
 
-        // Tooltip functionality
-        const tooltip = document.getElementById('tooltip');
-        const handler = new Cesium.ScreenSpaceEventHandler(viewer.scene.canvas);
-
-        handler.setInputAction(movement => {
-            const picked = viewer.scene.pick(movement.endPosition);
-            if (Cesium.defined(picked) && picked.id && picked.id.description) {
-                tooltip.style.display = 'block';
-                tooltip.innerHTML = picked.id.description.getValue();
-                updateTooltipPosition(movement.endPosition);
-            } else {
-                tooltip.style.display = 'none';
-            }
-        }, Cesium.ScreenSpaceEventType.MOUSE_MOVE);
 
-        handler.setInputAction(() => { tooltip.style.display = 'none'; }, Cesium.ScreenSpaceEventType.LEFT_DOWN);
+# Service worker script: static/sw.js after the shell URLs it precaches and a version that
+# changes with them and the page, so every deploy installs a fresh shell cache
+def service_worker(index_page):
+    with open(os.path.join(STATIC_DIR, 'sw.js'), 'rb') as f:
+        source = f.read()
+    shell = ['/', asset_url('app.css'), asset_url('renderer.js'), asset_url('app.js'),
+             f"{CESIUM_URL}/Cesium.js", f"{CESIUM_URL}/Widgets/widgets.css"]
+    config = f"const OFFLINE_CACHE = {json.dumps(OFFLINE_CACHE)};\nconst SHELL_URLS = {json.dumps(shell)};\n"
+    version = hashlib.sha256(config.encode('utf-8') + index_page.digest.encode('utf-8') + source).hexdigest()[:12]
+    config += f"const SHELL_VERSION = '{version}';\n"
+    return PrecompressedBody(config.encode('utf-8') + source, 'text/javascript')
 
-        // Update tooltip position based on mouse movement
-        function updateTooltipPosition(position) {
-            const x = position.x + 15;
-            const y = position.y + 15;
-            tooltip.style.left = x + 'px';
-            tooltip.style.top = y + 'px';
-        }
 
-        // Modal functionality for viewing all earthquakes
-        const modal = document.getElementById('modal');
-        document.getElementById('closeModal').onclick = () => modal.style.display = 'none';
-        window.onclick = event => { if (event.target == modal) modal.style.display = 'none'; }
-
-        // Search location functionality
-        document.getElementById('searchButton').onclick = searchLocation;
-        document.getElementById('searchInput').onkeydown = e => { if (e.key === 'Enter') searchLocation(); };
-
-        function searchLocation() {
-            const query = document.getElementById('searchInput').value.trim();
-            if (!query) return;
-            fetch(`https://nominatim.openstreetmap.org/search?format=json&q=${encodeURIComponent(query)}`)
-                .then(response => response.json())
-                .then(data => {
-                    if (data.length) {
-                        const { lon, lat } = data[0];
-                        viewer.camera.flyTo({
-                            destination: Cesium.Cartesian3.fromDegrees(parseFloat(lon), parseFloat(lat), 2000000),
-                            duration: 2,
-                            orientation: { pitch: Cesium.Math.toRadians(270) }
-                        });
-                    } else {
-                        alert('Location not found.');
-                    }
-                })
-                .catch(error => {
-                    console.error('Error searching location:', error);
-                });
-        }
+INDEX_PAGE = None
+RENDER_BENCH_PAGE = None
+SERVICE_WORKER = None
+_serving_lock = threading.Lock()
 
-        // Open modal to display all earthquakes
-        function openModal() {
-            const tbody = document.querySelector('#fullEqTable tbody');
-            if (!earthquakes.length) {
-                tbody.innerHTML = '<tr><td colspan="4">No earthquake data available.</td></tr>';
-                return;
-            }
-            tbody.innerHTML = earthquakes.map((eq, index) => {
-                const depth = (eq.geometry.coordinates[2] !== null && eq.geometry.coordinates[2] !== undefined) ? eq.geometry.coordinates[2].toFixed(1) : 'Unknown';
-                const mag = eq.properties.mag || 0;
-                return `
-                    <tr onclick='flyToEarthquake(${index})' style="cursor:pointer;">
-                        <td>${mag.toFixed(1)}</td>
-                        <td>${depth}</td>
-                        <td>${eq.properties.place || 'Unknown'}</td>
-                        <td>${new Date(eq.properties.time).toISOString().replace('T', ' ').split('.')[0]} UTC</td>
-                    </tr>
-                `;
-            }).join('');
-            modal.style.display = 'block';
-        }
 
-        // Ensure flyToEarthquake is accessible globally
-        window.flyToEarthquake = flyToEarthquake;
+# Render the pages and open the event store and ingest. This runs in the serving process on
+# its first request, so importing the module (or running the archive command) neither needs
+# the Cesium token nor touches the store, the snapshot lock or USGS.
+def start_serving():
+    global INDEX_PAGE, RENDER_BENCH_PAGE, SERVICE_WORKER, event_store, catalog_snapshot, stream_hub, ingest_worker
+    with _serving_lock:
+        if INDEX_PAGE is not None:
+            return
+        if not CESIUM_ION_ACCESS_TOKEN:
+            raise ValueError("CESIUM_ION_ACCESS_TOKEN environment variable is not set.")
+        if INGEST_INTERVAL > 0:
+            event_store = EventStore(EVENT_STORE_PATH)
+            catalog_snapshot = CatalogSnapshot(CATALOG_SNAPSHOT_PATH)
+            stream_hub = StreamHub(event_store, STREAM_BUFFER, STREAM_MAX_CLIENTS)
+            ingest_worker = IngestWorker(event_store, catalog_snapshot, catalog_providers(CATALOG_PROVIDERS), INGEST_INTERVAL)
+            ingest_worker.start()
+        index_page = prerender(HTML_TEMPLATE)
+        RENDER_BENCH_PAGE = prerender(RENDER_BENCH_TEMPLATE)
+        SERVICE_WORKER = service_worker(index_page)
+        INDEX_PAGE = index_page
 
-        // Basemap selector functionality
-        document.getElementById('basemapSelector').onchange = function() {
-            const selectedBasemap = this.value;
-            while (viewer.imageryLayers.length > 1) {
-                viewer.imageryLayers.remove(viewer.imageryLayers.get(1));
-            }
-            switch(selectedBasemap) {
-                case 'OpenStreetMap':
-                    viewer.imageryLayers.addImageryProvider(new Cesium.OpenStreetMapImageryProvider({
-                        url : 'https://a.tile.openstreetmap.org/'
-                    }));
-                    break;
-                case 'Cesium World Imagery':
-                default:
-                    viewer.imageryLayers.addImageryProvider(new Cesium.IonImageryProvider({ assetId: 2 }));
-            }
-        };
-
-        // Initialize the basemap selector to default
-        document.getElementById('basemapSelector').value = 'Cesium World Imagery';
-
-        // Event listeners for date range and heatmap toggle
-        document.getElementById('dateRange').addEventListener('input', function() {
-            const days = parseInt(this.value);
-            document.getElementById('dateRangeValue').innerText = days;
-            fetchEarthquakes(days);
-        });
-
-        document.getElementById('toggleHeatmap').addEventListener('click', function() {
-            heatmapEnabled = !heatmapEnabled;
-            this.innerText = heatmapEnabled ? 'Disable Heatmap' : 'Enable Heatmap';
-            updateHeatmapVisibility();
-        });
-
-        function updateHeatmapVisibility() {
-            if (heatmapEnabled) {
-                addHeatmap();
-                removeEarthquakePoints();
-            } else {
-                removeHeatmap();
-                addEarthquakePoints();
-                if (earthquakes.length > 0) {
-                    viewer.zoomTo(viewer.entities).otherwise(() => {
-                        console.log('Zoom failed');
-                    });
-                }
-            }
-        }
 
-        // Remove earthquake points when heatmap is enabled
-        function removeEarthquakePoints() {
-            viewer.entities.removeAll();
-        }
+# Request metrics and the optional per-request profiler
+def endpoint_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
 
-        // Remove heatmap
-        function removeHeatmap() {
-            heatmapPoints.forEach(pointCollection => {
-                viewer.scene.primitives.remove(pointCollection);
-            });
-            heatmapPoints = [];
-        }
 
-        // Fetch initial earthquake data
-        fetchEarthquakes(7);
-    </script>
-</body>
-</html>
-"""
+@app.before_request
+def start_request():
+    request.environ['eq.start'] = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(endpoint_label())
+    if PROFILE_TOKEN and request.headers.get('X-Profile') == PROFILE_TOKEN:
+        request.environ['eq.profiler'] = RequestProfiler(PROFILE_INTERVAL)
+
+
+@app.after_request
+def finish_request(response):
+    endpoint = endpoint_label()
+    HTTP_DURATION.observe(time.perf_counter() - request.environ['eq.start'], endpoint)
+    HTTP_REQUESTS.inc(endpoint, str(response.status_code))
+    profiler = request.environ.pop('eq.profiler', None)
+    if profiler is not None:
+        response.headers['X-Profile-File'] = profiler.stop(endpoint)
+    metrics.dump()
+    return response
+
+
+@app.teardown_request
+def end_request(error):
+    if 'eq.start' in request.environ:
+        HTTP_IN_FLIGHT.dec(endpoint_label())
+    profiler = request.environ.pop('eq.profiler', None)
+    if profiler is not None:
+        profiler.stop(endpoint_label())
+
+
+# Runs after start_request, so a failed setup is still counted by the request metrics
+@app.before_request
+def ensure_serving():
+    if INDEX_PAGE is None:
+        start_serving()
+
+
+# Prometheus scrape endpoint
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 
 @app.route('/')
 def index():
-    return render_template_string(
-        HTML_TEMPLATE,
-        cesium_token=CESIUM_ION_ACCESS_TOKEN
-    )
+    with PAGE_RENDER.time():
+        return INDEX_PAGE.respond('no-cache')
+
+
+# Served from the root so the worker's scope covers the page; browsers check it for updates
+# on every visit
+@app.route('/sw.js')
+def service_worker_script():
+    return SERVICE_WORKER.respond('no-cache')
+
+
+@app.route('/bench/render')
+def render_bench():
+    return RENDER_BENCH_PAGE.respond('no-cache')
+
+
+# Content-hashed static assets never change under the same URL
+@app.route('/static/<name>')
+def static_asset(name):
+    asset = STATIC_ASSETS.get(name)
+    if asset is None:
+        abort(404)
+    return asset.respond(f"public, max-age={IMMUTABLE_MAX_AGE}, immutable")
+
+
+# Output formats for catalog responses; data payloads use faster compression settings
+CATALOG_FORMATS = {
+    'bin': (Catalog.to_binary, 'application/octet-stream'),
+    'geojson': (Catalog.to_geojson, 'application/geo+json')
+}
+
+
+def encoded_catalog(catalog, fmt):
+    encode, mimetype = CATALOG_FORMATS[fmt]
+
+    def build():
+        with SERIALIZE_DURATION.time(fmt):
+            body = encode(catalog)
+        return PrecompressedBody(body, mimetype, gzip_level=6, brotli_quality=5)
+    return catalog.memo(('encoded', fmt), build)
+
+
+# Streamed response body; with gzip, each chunk is flushed so the client can decode it on arrival
+def streamed_response(chunks, mimetype, cache_control):
+    if request.accept_encodings['gzip']:
+        def compressed():
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            for chunk in chunks:
+                with COMPRESS_DURATION.time('gzip-stream'):
+                    compressed_chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                yield compressed_chunk
+            yield compressor.flush()
+        response = Response(compressed(), mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(chunks, mimetype=mimetype)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# Streamed catalog bodies: length-prefixed 'bin' payloads (Uint32 byte length, then the
+# payload) or NDJSON, one GeoJSON Feature per line
+def framed_binary(catalog):
+    payload = catalog.to_binary()
+    return struct.pack('<I', len(payload)) + payload
+
+
+CATALOG_STREAM_FORMATS = {
+    'bin': (framed_binary, 'application/octet-stream'),
+    'geojson': (Catalog.to_ndjson, 'application/x-ndjson')
+}
+
+# Events per streamed chunk: the first chunk is small so the largest events show at once,
+# then chunks double up to the maximum
+CATALOG_STREAM_FIRST_CHUNK = 500
+CATALOG_STREAM_MAX_CHUNK = 16000
+
+
+# Encode a catalog lazily in chunks, largest magnitudes first
+def catalog_chunks(catalog, fmt):
+    encode, _ = CATALOG_STREAM_FORMATS[fmt]
+    order = catalog.order('mag', descending=True)
+    first, size = 0, CATALOG_STREAM_FIRST_CHUNK
+    while first < len(order):
+        with SERIALIZE_DURATION.time(f"{fmt}-stream"):
+            chunk = encode(catalog.take(order[first:first + size]))
+        yield chunk
+        first, size = first + size, min(2 * size, CATALOG_STREAM_MAX_CHUNK)
+
+
+def store_ready():
+    return ingest_worker is not None and ingest_worker.ready.is_set()
+
+
+# Catalog for the last `days` days and its sync cursor: from the shared snapshot once the
+# store has synced, otherwise from the cached USGS fetch (cursor None)
+def current_catalog(days):
+    if store_ready():
+        return catalog_snapshot.window(window_start_ms(days))
+    return fetch_usgs(usgs_params(days)).catalog, None
+
+
+# Store-backed responses change with every sync; proxied ones are cached for the TTL
+def catalog_cache_control(cursor):
+    return 'no-cache' if cursor is not None else f"public, max-age={CACHE_TTL}"
+
+
+def request_days():
+    return min(max(request.args.get('days', default=7, type=int), 1), MAX_DAYS)
+
+
+# Optional viewport filters shared by the catalog endpoints
+def spatial_filters():
+    bbox = request.args.get('bbox')
+    min_mag = request.args.get('minmag', type=float)
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        raise InvalidQuery('limit must be positive.')
+    return (parse_bbox(bbox) if bbox else None), min_mag, limit
+
+
+@app.errorhandler(InvalidQuery)
+def invalid_query(error):
+    return jsonify(error=str(error)), 400
+
+
+@app.errorhandler(UpstreamBusy)
+def upstream_busy(error):
+    return jsonify(error=str(error)), 503, {'Retry-After': '5'}
+
+
+@app.errorhandler(UpstreamError)
+def upstream_error(error):
+    return jsonify(error=str(error)), 502
+
+
+# Earthquake catalog proxy shared by all clients; with stream=1 the events are sent in
+# chunks, largest magnitudes first, as they are encoded
+@app.route('/api/earthquakes')
+def earthquakes():
+    days = request_days()
+    fmt = request.args.get('format', 'geojson')
+    if fmt not in CATALOG_FORMATS:
+        return jsonify(error=f"Unsupported format '{fmt}'."), 400
+
+    since = request.args.get('since', type=int)
+    if since is not None:
+        if not store_ready():
+            return jsonify(error='Delta sync is not available yet.'), 409
+        return catalog_delta(since)
+
+    catalog, cursor = current_catalog(days)
+    bbox, min_mag, limit = spatial_filters()
+    if bbox is not None or min_mag is not None or limit is not None:
+        catalog = catalog.take(catalog.query(bbox, min_mag, limit))
+
+    if request.args.get('stream') == '1':
+        _, mimetype = CATALOG_STREAM_FORMATS[fmt]
+        response = streamed_response(catalog_chunks(catalog, fmt), mimetype, catalog_cache_control(cursor))
+        response.headers['X-Catalog-Count'] = str(len(catalog))
+    else:
+        response = encoded_catalog(catalog, fmt).respond(catalog_cache_control(cursor))
+    if cursor is not None:
+        response.headers['X-Catalog-Cursor'] = str(cursor)
+    return response
+
+
+# Provenance of a stored event: the origins merged into it, preferred first
+@app.route('/api/earthquakes/<event_id>/origins')
+def earthquake_origins(event_id):
+    if not store_ready():
+        return jsonify(error='The event store is not available yet.'), 409
+    origins = event_store.event_origins(event_id, ingest_worker.providers[0].name)
+    if origins is None:
+        return jsonify(error=f"Unknown event '{event_id}'."), 404
+    fields = ('source', 'id', 'lon', 'lat', 'depth', 'mag', 'time', 'place')
+    response = jsonify(id=event_id, origins=[dict(zip(fields, origin)) for origin in origins])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# Columns the table view can sort by, and its largest page
+TABLE_SORTS = ('mag', 'depth', 'time', 'place')
+TABLE_MAX_LIMIT = 500
+
+
+# One page of the "View All" table: the sort comes from a memoized permutation, so an
+# unfiltered page is a slice; filters (bbox, minmag and a place substring `q`) mask it first
+@app.route('/api/earthquakes/table')
+def earthquake_table():
+    days = request_days()
+    sort = request.args.get('sort', 'mag')
+    order = request.args.get('order', 'desc')
+    if sort not in TABLE_SORTS or order not in ('asc', 'desc'):
+        raise InvalidQuery(f"Unsupported sort '{sort} {order}'.")
+    offset = request.args.get('offset', default=0, type=int)
+    limit = request.args.get('limit', default=100, type=int)
+    if offset < 0 or not 1 <= limit <= TABLE_MAX_LIMIT:
+        raise InvalidQuery(f"offset must be >= 0 and limit between 1 and {TABLE_MAX_LIMIT}.")
+    bbox = request.args.get('bbox')
+    min_mag = request.args.get('minmag', type=float)
+    text = request.args.get('q', '').strip().casefold()
+
+    catalog, cursor = current_catalog(days)
+    indices = catalog.order(sort, order == 'desc')
+    if bbox or min_mag is not None or text:
+        keep = np.zeros(len(catalog), dtype=bool)
+        keep[catalog.query(parse_bbox(bbox) if bbox else None, min_mag)] = True
+        if text:
+            matches = np.fromiter((text in place.casefold() for place in catalog.places), dtype=bool, count=len(catalog.places))
+            keep &= matches[catalog.place_index]
+        indices = indices[keep[indices]]
+
+    response = jsonify(total=len(indices), offset=offset, rows=catalog.table_rows(indices[offset:offset + limit]))
+    response.headers['Cache-Control'] = catalog_cache_control(cursor)
+    return response
+
+
+SUMMARY_MAX_TOP = 100
+
+
+# Headline numbers for the bottom bar and legend: top-N events, counts per legend class and
+# depth statistics. Memoized on the window's catalog, so it is computed once per generation
+# (bbox summaries are computed per request).
+@app.route('/api/summary')
+def summary():
+    days = request_days()
+    top_n = request.args.get('top', default=10, type=int)
+    if not 0 <= top_n <= SUMMARY_MAX_TOP:
+        raise InvalidQuery(f"top must be between 0 and {SUMMARY_MAX_TOP}.")
+    bbox, min_mag, _ = spatial_filters()
+    catalog, cursor = current_catalog(days)
+    if bbox is not None or min_mag is not None:
+        catalog = catalog.take(catalog.query(bbox, min_mag))
+    response = jsonify(catalog.summary(top_n))
+    response.headers['Cache-Control'] = catalog_cache_control(cursor)
+    return response
+
+
+TIMELINE_MAX_BUCKETS = 5000
+
+
+# Time-bucket index of the date window for playback: `bucket` minutes per bucket from the
+# window start to the end of today (UTC)
+@app.route('/api/timeline')
+def timeline():
+    days = request_days()
+    bucket_minutes = request.args.get('bucket', default=60, type=int)
+    buckets = -(-(days + 1) * 1440 // bucket_minutes) if bucket_minutes > 0 else 0
+    if not 0 < buckets <= TIMELINE_MAX_BUCKETS:
+        raise InvalidQuery(f"bucket must give between 1 and {TIMELINE_MAX_BUCKETS} buckets.")
+    start_ms = window_start_ms(days)
+    catalog, cursor = current_catalog(days)
+    response = jsonify(start=start_ms, bucket=bucket_minutes * 60000, **catalog.timeline(start_ms, bucket_minutes * 60000, buckets))
+    response.headers['Cache-Control'] = catalog_cache_control(cursor)
+    return response
+
+
+GEOCODE_MAX_LIMIT = 10
+
+
+# Place search. Prefixes are answered from the gazetteer (autocomplete=1 never goes further);
+# full searches it cannot answer go to the upstream geocoder through the cache.
+@app.route('/api/geocode')
+def geocode():
+    text = request.args.get('q', '').strip()
+    if not text:
+        raise InvalidQuery('q is required.')
+    limit = min(max(request.args.get('limit', default=5, type=int), 1), GEOCODE_MAX_LIMIT)
+    results = [
+        {'name': place.name, 'country': place.country, 'lat': place.lat, 'lon': place.lon}
+        for place in gazetteer.search(text, limit)
+    ]
+    source = 'gazetteer'
+    if not results and request.args.get('autocomplete') != '1':
+        results, source = geocode_upstream(text, limit), 'upstream'
+    response = jsonify(source=source, results=results)
+    response.headers['Cache-Control'] = f"public, max-age={GEOCODE_CACHE_TTL}"
+    return response
+
+
+# Zoom-level clusters for the date window: the store's pyramid is maintained incrementally
+# by the ingest worker, proxied catalogs build one on first use
+@app.route('/api/clusters')
+def clusters():
+    days = request_days()
+    z = min(max(request.args.get('z', default=0, type=int), 0), ClusterPyramid.MAX_ZOOM)
+    bbox, _, _ = spatial_filters()
+    catalog, cursor = current_catalog(days)
+    pyramid = event_store.clusters if cursor is not None else catalog.clusters()
+    response = jsonify(z=z, clusters=pyramid.query(z, bbox, epoch_day(window_start_ms(days))))
+    response.headers['Cache-Control'] = catalog_cache_control(cursor)
+    return response
+
+
+# Seismicity statistics for the date window over the grid cells overlapping an optional bbox
+@app.route('/api/stats')
+def stats():
+    days = request_days()
+    bbox, _, _ = spatial_filters()
+    catalog, cursor = current_catalog(days)
+    aggregates = event_store.stats if cursor is not None else catalog.stats()
+    response = jsonify(days=days, bbox=bbox, **aggregates.query(bbox, epoch_day(window_start_ms(days))))
+    response.headers['Cache-Control'] = catalog_cache_control(cursor)
+    return response
+
+
+# Heatmap tiles for the date window, weighted by event count, magnitude or energy
+@app.route('/tiles/heat/<int:z>/<int:x>/<int:y>.png')
+def heat_tile(z, x, y):
+    if not (z <= HeatTiles.MAX_ZOOM and x < 1 << z and y < 1 << z):
+        abort(404)
+    weight = request.args.get('weight', 'count')
+    if weight not in HeatTiles.WEIGHTS:
+        raise InvalidQuery(f"Unsupported weight '{weight}'.")
+    days = request_days()
+    if store_ready():
+        tiles, cursor = event_store.heat, event_store.cursor
+        load = lambda: catalog_snapshot.window(window_start_ms(days))[0]
+    else:
+        catalog, cursor = current_catalog(days)
+        tiles, load = catalog.heat_tiles(), lambda: catalog
+    return tiles.tile(load, window_start_ms(days), weight, z, x, y).respond(catalog_cache_control(cursor))
+
+
+# Events inserted, updated or deleted since the client's cursor:
+# events are [id, lon, lat, depth, mag, time, place, x, y, z] rows, deleted is a list of ids
+def catalog_delta(since):
+    cursor = event_store.cursor
+    events, deleted = event_store.changes_since(since, cursor)
+    response = jsonify(cursor=cursor, events=events, deleted=deleted)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# Live feed of store changes. Clients pass their cursor as `since` (or Last-Event-ID on
+# reconnect) and apply each `delta` event like a /api/earthquakes?since= response.
+@app.route('/api/stream')
+def stream():
+    if not store_ready():
+        return jsonify(error='The live feed is not available yet.'), 409
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    client = stream_hub.connect()
+    if client is None:
+        return jsonify(error='Too many live feed clients.'), 503, {'Retry-After': '30'}
+    response = Response(stream_hub.events(client, since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# Largest archive response (events) and the events per streamed chunk
+ARCHIVE_MAX_EVENTS = 250000
+ARCHIVE_CHUNK_EVENTS = 10000
+
+
+# `start` and `end` dates (end inclusive) as a [start_ms, end_ms) range
+def archive_range():
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1)
+    except (KeyError, ValueError):
+        raise InvalidQuery("start and end must be dates as 'YYYY-MM-DD'.") from None
+    if end <= start:
+        raise InvalidQuery('end must not be before start.')
+    return start.timestamp() * 1000, end.timestamp() * 1000
+
+
+# Archived months and their statistics
+@app.route('/api/archive/partitions')
+def archive_partitions():
+    if archive is None:
+        return jsonify(error='The archive is disabled.'), 404
+    partitions = archive.partitions()
+    response = jsonify(partitions=[dict(stats, month=month) for month, stats in partitions.items()])
+    response.headers['Cache-Control'] = f"public, max-age={CACHE_TTL}"
+    return response
+
+
+# Archived events between two dates, optionally within bbox and above minmag, streamed
+# partition by partition in time order as length-prefixed 'bin' payloads (Uint32 byte
+# length, then the payload) up to `limit` events. X-Archive-Partitions reports how many
+# partitions the query scans out of the archive's total.
+@app.route('/api/archive')
+def archive_events():
+    if archive is None:
+        return jsonify(error='The archive is disabled.'), 404
+    start_ms, end_ms = archive_range()
+    bbox, min_mag, limit = spatial_filters()
+    limit = min(limit or ARCHIVE_MAX_EVENTS, ARCHIVE_MAX_EVENTS)
+    months = archive.plan(start_ms, end_ms, bbox, min_mag)
+
+    def chunks():
+        remaining = limit
+        for catalog in archive.scan(months, start_ms, end_ms, bbox, min_mag):
+            for first in range(0, min(len(catalog), remaining), ARCHIVE_CHUNK_EVENTS):
+                yield framed_binary(catalog.take(np.arange(first, min(first + ARCHIVE_CHUNK_EVENTS, len(catalog), remaining))))
+            remaining -= min(len(catalog), remaining)
+            if not remaining:
+                break
+
+    response = streamed_response(chunks(), 'application/octet-stream', f"public, max-age={CACHE_TTL}")
+    response.headers['X-Archive-Partitions'] = f"{len(months)}/{len(archive.partitions())}"
+    return response
+
+
+# `python 3D-EQ.py archive 2020-01 2024-12` backfills archive months from USGS (existing
+# partitions are kept unless --force); without a command the development server runs
+def main():
+    parser = argparse.ArgumentParser(description='3D earthquake viewer')
+    commands = parser.add_subparsers(dest='command')
+    backfill = commands.add_parser('archive', help='backfill historical archive partitions from USGS')
+    backfill.add_argument('first', help='first month (YYYY-MM)')
+    backfill.add_argument('last', help='last month (YYYY-MM)')
+    backfill.add_argument('--force', action='store_true', help='refetch months that are already archived')
+    args = parser.parse_args()
+
+    if args.command != 'archive':
+        app.run(debug=True)
+        return
+    if archive is None:
+        parser.error('ARCHIVE_PATH is empty.')
+    try:
+        months = month_range(args.first, args.last)
+    except InvalidQuery as error:
+        parser.error(str(error))
+    existing = archive.partitions()
+    for month in months:
+        if month in existing and not args.force:
+            print(f"{month}: archived, skipping")
+            continue
+        stats = archive.backfill(usgs_client, month)
+        print(f"{month}: {stats['count']} events")
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    main()
@@ -0,0 +1,55 @@
+# bench/bench_index.py
+#
+# Microbenchmark for the index page: requests/sec when rendering the Jinja
+# template on every request (the old behaviour) versus serving the
+# pre-rendered, precompressed body.
+#
+# Usage: python bench/bench_index.py [iterations]
+
+import importlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('CESIUM_ION_ACCESS_TOKEN', 'benchmark-token')
+os.environ.setdefault('INGEST_INTERVAL', '0')
+
+eq = importlib.import_module('3D-EQ')
+
+
+def render_per_request():
+    return eq.render_page(eq.HTML_TEMPLATE)
+
+
+# Error responses fail the run instead of being counted as served requests
+def measure(label, client, iterations, **kwargs):
+    status = client.get('/', **kwargs).status_code
+    if status not in (200, 304):
+        raise SystemExit(f"{label}: GET / returned {status}")
+    start = time.perf_counter()
+    for _ in range(iterations):
+        client.get('/', **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {iterations / elapsed:>10.0f} req/s")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    client = eq.app.test_client()
+
+    # Temporarily swap the view back to per-request rendering for the baseline
+    eq.app.view_functions['index'], prerendered = render_per_request, eq.app.view_functions['index']
+    measure('before: render per request', client, iterations)
+    eq.app.view_functions['index'] = prerendered
+
+    measure('after: identity', client, iterations)
+    measure('after: gzip', client, iterations, headers={'Accept-Encoding': 'gzip'})
+    measure('after: br', client, iterations, headers={'Accept-Encoding': 'br'})
+    etag = client.get('/', headers={'Accept-Encoding': 'br'}).headers['ETag']
+    measure('after: 304 revalidation', client, iterations,
+            headers={'Accept-Encoding': 'br', 'If-None-Match': etag})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# bench/bench_merge.py
+#
+# Microbenchmark for the multi-catalog merge: a synthetic catalog plus a second
+# agency's relocated view of 60% of it, merged with the default tolerances.
+# Reports the merge time and how many of the re-reported events were matched.
+#
+# Usage: python bench/bench_merge.py [events ...]
+
+import importlib
+import os
+import sys
+import time
+
+import synthetic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('CESIUM_ION_ACCESS_TOKEN', 'benchmark-token')
+os.environ.setdefault('INGEST_INTERVAL', '0')
+
+eq = importlib.import_module('3D-EQ')
+
+
+def origins(source, catalog):
+    return list(zip(
+        [source] * len(catalog['ids']), catalog['ids'], catalog['lon'].tolist(), catalog['lat'].tolist(),
+        catalog['depth'].tolist(), catalog['mag'].tolist(), catalog['time'].tolist(), catalog['places'],
+        catalog['updated'].tolist()
+    ))
+
+
+def main():
+    sizes = [int(value) for value in sys.argv[1:]] or [10000, 100000, 600000]
+    for count in sizes:
+        catalog = synthetic.generate(count)
+        other = synthetic.relocated(catalog)
+        rows = origins('usgs', catalog) + origins('emsc', other)
+        start = time.perf_counter()
+        merged = eq.merge_origins(
+            rows, ['usgs', 'emsc'],
+            eq.MERGE_TIME_TOLERANCE * 1000, eq.MERGE_DISTANCE_TOLERANCE, eq.MERGE_MAG_TOLERANCE
+        )
+        elapsed = time.perf_counter() - start
+        matched = sum(1 for row in merged if ' ' in row[9])
+        print(f"{len(rows):>9} origins -> {len(merged):>8} events in {elapsed:6.2f}s "
+              f"({matched / max(len(other['ids']), 1):.1%} of re-reported events matched)")
+
+
+if __name__ == '__main__':
+    main()
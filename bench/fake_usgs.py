@@ -0,0 +1,231 @@
+# bench/fake_usgs.py
+#
+# Local stand-in for the USGS FDSN event service, so the ingest worker and
+# proxy can be exercised offline. Supports the query parameters the app sends
+# (starttime, endtime, updatedafter, includedeleted, orderby) plus ETag
+# revalidation and the per-query event limit, and lets callers add, revise and
+# delete events while it runs. format=text answers in the FDSN text format, so
+# a second instance can stand in for another provider such as EMSC.
+#
+# Usage: python bench/fake_usgs.py [--port 8081] [--events 5000] [--synthetic [--relocated]]
+#        USGS_BASE_URL=http://127.0.0.1:8081/fdsnws/event/1/query python 3D-EQ.py
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import synthetic
+
+QUERY_PATH = '/fdsnws/event/1/query'
+
+# USGS rejects queries matching more events than this with HTTP 400
+SEARCH_LIMIT = 20000
+
+
+# Parse the ISO 8601 forms FDSN accepts (date only, with time, optional fraction and Z) to ms
+def parse_time(value):
+    value = value.rstrip('Z')
+    for fmt in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return parsed.replace(tzinfo=timezone.utc).timestamp() * 1000
+    raise ValueError(f"Invalid time '{value}'")
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+# FDSN text rendering of GeoJSON features (empty fields for missing values)
+def to_fdsn_text(features):
+    lines = ['#EventID|Time|Latitude|Longitude|Depth/km|Author|Catalog|Contributor|ContributorID|MagType|Magnitude|MagAuthor|EventLocationName']
+    for feature in features:
+        properties = feature['properties']
+        lon, lat, depth = feature['geometry']['coordinates']
+        event_time = datetime.fromtimestamp(properties['time'] / 1000, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]
+        fields = (
+            feature['id'], event_time, lat, lon, '' if depth is None else depth, 'FAKE', 'FAKE', 'FAKE', feature['id'],
+            'ml', '' if properties['mag'] is None else properties['mag'], 'FAKE', properties['place']
+        )
+        lines.append('|'.join(str(field) for field in fields))
+    return '\n'.join(lines) + '\n'
+
+
+class FakeUSGS:
+    def __init__(self, host='127.0.0.1', port=0, search_limit=SEARCH_LIMIT):
+        self.events = {}
+        self.search_limit = search_limit
+        self.requests = 0
+        self.revision = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{QUERY_PATH}"
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Add or replace an event; `updated` defaults to now so pollers see it as a change
+    def add_event(self, event_id, lon, lat, depth, mag, event_time, place='', updated=None, status='reviewed'):
+        with self._lock:
+            self.events[event_id] = {
+                'type': 'Feature',
+                'id': event_id,
+                'properties': {
+                    'mag': mag,
+                    'place': place,
+                    'time': int(event_time),
+                    'updated': int(updated if updated is not None else now_ms()),
+                    'status': status
+                },
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat, depth]}
+            }
+            self.revision += 1
+
+    # Revise an existing event's properties (e.g. mag, place) and bump its updated time
+    def update_event(self, event_id, **properties):
+        with self._lock:
+            feature = self.events[event_id]
+            feature['properties'].update(properties)
+            feature['properties']['updated'] = now_ms()
+            self.revision += 1
+
+    # Add prebuilt GeoJSON features in bulk, e.g. a synthetic.py catalog
+    def add_features(self, features):
+        with self._lock:
+            for feature in features:
+                self.events[feature['id']] = feature
+            self.revision += 1
+
+    def delete_event(self, event_id):
+        self.update_event(event_id, status='deleted')
+
+    def query(self, params):
+        include_deleted = params.get('includedeleted', 'false') == 'true'
+        start = parse_time(params['starttime']) if 'starttime' in params else None
+        end = parse_time(params['endtime']) if 'endtime' in params else None
+        updated_after = parse_time(params['updatedafter']) if 'updatedafter' in params else None
+
+        with self._lock:
+            features = []
+            for feature in self.events.values():
+                properties = feature['properties']
+                if properties['status'] == 'deleted' and not include_deleted:
+                    continue
+                if start is not None and properties['time'] < start:
+                    continue
+                if end is not None and properties['time'] >= end:
+                    continue
+                if updated_after is not None and properties['updated'] <= updated_after:
+                    continue
+                features.append(feature)
+
+        if len(features) > self.search_limit:
+            raise ValueError(f"{len(features)} matching events exceeds search limit of {self.search_limit}.")
+        order = params.get('orderby', 'time')
+        features.sort(key=lambda feature: feature['properties']['time'], reverse=order == 'time')
+        return {'type': 'FeatureCollection', 'metadata': {'count': len(features)}, 'features': features}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                fake.requests += 1
+                parts = urlsplit(self.path)
+                if parts.path != QUERY_PATH:
+                    return self._send(404, b'Not found')
+                params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+                etag = f'"{fake.revision}-{hash(parts.query)}"'
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, b'', etag=etag)
+                try:
+                    result = fake.query(params)
+                except ValueError as error:
+                    return self._send(400, str(error).encode('utf-8'))
+                if params.get('format') == 'text':
+                    if not result['features']:
+                        return self._send(204, b'')
+                    return self._send(200, to_fdsn_text(result['features']).encode('utf-8'), etag=etag)
+                self._send(200, json.dumps(result).encode('utf-8'), etag=etag, content_type='application/json')
+
+            def _send(self, status, body, etag=None, content_type='text/plain'):
+                self.send_response(status)
+                if etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# Populate with uniformly scattered events over the last 30 days
+def populate(fake, count, seed=0):
+    rng = random.Random(seed)
+    end = now_ms()
+    for i in range(count):
+        fake.add_event(
+            f"fake{i:07d}",
+            round(rng.uniform(-180, 180), 4),
+            round(rng.uniform(-80, 80), 4),
+            round(rng.uniform(0, 600), 2),
+            round(rng.uniform(-1, 7), 1),
+            end - rng.randint(0, 30 * 86400 * 1000),
+            place=f"{rng.randint(1, 99)} km of Fake Place {i % 500}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local fake USGS FDSN event service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--search-limit', type=int, default=SEARCH_LIMIT)
+    parser.add_argument('--synthetic', action='store_true', help='serve a realistic synthetic.py catalog instead of uniform events')
+    parser.add_argument('--relocated', action='store_true', help="serve a second agency's view of the synthetic catalog")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeUSGS(args.host, args.port, args.search_limit)
+    if args.synthetic:
+        catalog = synthetic.generate(args.events, seed=args.seed)
+        fake.add_features(synthetic.features(synthetic.relocated(catalog) if args.relocated else catalog))
+    else:
+        populate(fake, args.events, args.seed)
+    print(f"Fake USGS serving {args.events} events at {fake.url}")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,480 @@
+# bench/load.py
+#
+# Load benchmark for the app's HTTP endpoints. It starts a fake USGS that
+# serves a synthetic catalog, then starts the app against it and waits for
+# the first ingest. Then it runs scripted scenarios:
+#
+#   cold         page loads on fresh connections (index, static assets, startup API calls)
+#   slider       date slider drags (summary, clusters and a delta sync at every stop)
+#   bbox         viewport queries (points, clusters, table and heat tiles for random boxes)
+#   concurrency  mixed traffic from each --clients level of concurrent clients
+#
+# Latency percentiles, requests/sec, bytes per response (per endpoint, as sent on the
+# wire) and the server's peak RSS are written to a JSON report. With --baseline, a p95
+# latency, throughput or RSS regression beyond --tolerance fails the run.
+#
+# Usage: python bench/load.py [--events 100000] [--out bench-results.json]
+#        python bench/load.py --server gunicorn --workers 4 --baseline bench-results.json
+#        python bench/load.py --url http://127.0.0.1:5000 [--pid 1234]   (already running app)
+
+import argparse
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import synthetic
+from fake_usgs import SEARCH_LIMIT, FakeUSGS
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# The requests app.js makes, with its limits
+MAX_DAYS = 30
+GLOBAL_LIMIT = 20000
+VIEWPORT_LIMIT = 20000
+TABLE_PAGE_SIZE = 200
+HEAT_TILE_MAX_LAT = 85.05112878
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli else 'gzip, deflate'
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+    return {
+        'mean': 1000 * sum(ordered) / len(ordered),
+        'p50': 1000 * pick(0.5),
+        'p90': 1000 * pick(0.9),
+        'p95': 1000 * pick(0.95),
+        'p99': 1000 * pick(0.99),
+        'max': 1000 * ordered[-1]
+    }
+
+
+# Response body with its content-coding removed
+def decoded(headers, body):
+    encoding = headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        return zlib.decompress(body)
+    if encoding == 'br':
+        return brotli.decompress(body)
+    return body
+
+
+def failed(status):
+    return status == 0 or status >= 400
+
+
+# Every request's (endpoint, status, seconds, bytes), shared by a scenario's client threads
+class Recorder:
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, status, seconds, size):
+        with self._lock:
+            self.samples.append((endpoint, status, seconds, size))
+
+    def summary(self, wall):
+        endpoints = {}
+        for endpoint, status, seconds, size in self.samples:
+            endpoints.setdefault(endpoint, []).append((status, seconds, size))
+        return {
+            'requests': len(self.samples),
+            'errors': sum(1 for sample in self.samples if failed(sample[1])),
+            'seconds': wall,
+            'rps': len(self.samples) / wall if wall else None,
+            'latency_ms': percentiles([sample[2] for sample in self.samples]),
+            'endpoints': {
+                endpoint: {
+                    'requests': len(rows),
+                    'errors': sum(1 for row in rows if failed(row[0])),
+                    'latency_ms': percentiles([row[1] for row in rows]),
+                    'bytes': {
+                        'mean': sum(row[2] for row in rows) / len(rows),
+                        'max': max(row[2] for row in rows),
+                        'total': sum(row[2] for row in rows)
+                    }
+                }
+                for endpoint, rows in sorted(endpoints.items())
+            }
+        }
+
+
+# One browser-like keep-alive connection; the body is read as sent (still compressed),
+# so the recorded size is the bytes on the wire. Status 0 records a connection failure.
+class Client:
+    def __init__(self, base, recorder):
+        parts = urlsplit(base)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.recorder = recorder
+        self.connection = None
+
+    def get(self, path, endpoint):
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            self.connection.request('GET', path, headers={'Accept-Encoding': ACCEPT_ENCODING})
+            response = self.connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            self.recorder.add(endpoint, 0, time.perf_counter() - start, 0)
+            return 0, {}, b''
+        self.recorder.add(endpoint, response.status, time.perf_counter() - start, len(body))
+        if response.getheader('Connection', '').lower() == 'close':
+            self.close()
+        return response.status, dict(response.getheaders()), body
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+# Peak resident memory of a process and its children (gunicorn workers), sampled from /proc
+class RssSampler(threading.Thread):
+    def __init__(self, pid, interval=0.05):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def tree(self):
+        parents = {}
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as file:
+                        parents.setdefault(int(file.read().rsplit(')', 1)[1].split()[1]), []).append(int(entry))
+                except (OSError, IndexError):
+                    pass
+        pids, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            pids.append(pid)
+            pending.extend(parents.get(pid, ()))
+        return pids
+
+    def rss(self):
+        total = 0
+        for pid in self.tree():
+            try:
+                with open(f"/proc/{pid}/status") as file:
+                    for line in file:
+                        if line.startswith('VmRSS:'):
+                            total += int(line.split()[1]) * 1024
+            except OSError:
+                pass
+        return total
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+    # Peak since the last call, restarting from the current RSS
+    def take(self):
+        current = self.rss()
+        peak, self.peak = max(self.peak, current), current
+        return peak
+
+
+# Web Mercator tile containing a point, as the heatmap imagery provider requests them
+def heat_tile(lon, lat, z):
+    lat = max(min(lat, HEAT_TILE_MAX_LAT), -HEAT_TILE_MAX_LAT)
+    n = 1 << z
+    x = min(int((lon + 180) / 360 * n), n - 1)
+    y = min(int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n), n - 1)
+    return f"/tiles/heat/{z}/{x}/{y}.png?days=7&weight=count"
+
+
+def random_bbox(rng):
+    span = rng.choice((2, 5, 10, 30, 60))
+    lon, lat = rng.uniform(-180 + span / 2, 180 - span / 2), rng.uniform(-80 + span / 2, 80 - span / 2)
+    return lon, lat, span, f"{lon - span / 2:.3f},{lat - span / 2:.3f},{lon + span / 2:.3f},{lat + span / 2:.3f}"
+
+
+# A first visit: the page, its assets, then the calls app.js makes at startup
+def cold_load(base, recorder, args, rng):
+    pages = []
+    for _ in range(args.iterations):
+        client = Client(base, recorder)
+        start = time.perf_counter()
+        _, headers, body = client.get('/', '/')
+        for asset in sorted(set(re.findall(rb'/static/[^"\']+', decoded(headers, body)))):
+            client.get(asset.decode(), '/static/<name>')
+        client.get('/api/summary?days=7', '/api/summary')
+        client.get(f"/api/earthquakes?days={MAX_DAYS}&format=bin&limit={GLOBAL_LIMIT}&stream=1", '/api/earthquakes?stream=1')
+        client.get('/api/clusters?days=7&z=1', '/api/clusters')
+        client.get('/api/archive/partitions', '/api/archive/partitions')
+        pages.append(time.perf_counter() - start)
+        client.close()
+    return {'page_load_ms': percentiles(pages)}
+
+
+# Drags of the date slider; the app refetches once the slider rests (debounced), so each
+# stop costs a summary, the clusters for the new window and a delta sync
+def slider(base, recorder, args, rng):
+    client = Client(base, recorder)
+    _, headers, _ = client.get('/api/earthquakes?days=1&format=bin&limit=1', '/api/earthquakes')
+    cursor = headers.get('X-Catalog-Cursor', '0')
+    stops, days = [], 7
+    for _ in range(args.iterations):
+        for _ in range(3):
+            days = min(max(days + rng.choice((-1, 1)) * rng.randint(1, 10), 1), MAX_DAYS)
+            start = time.perf_counter()
+            client.get(f"/api/summary?days={days}", '/api/summary')
+            client.get(f"/api/clusters?days={days}&z=1", '/api/clusters')
+            client.get(f"/api/earthquakes?since={cursor}", '/api/earthquakes?since')
+            stops.append(time.perf_counter() - start)
+    client.close()
+    return {'stop_ms': percentiles(stops)}
+
+
+# Camera moves to random boxes from 2 to 60 degrees across
+def bbox(base, recorder, args, rng):
+    client = Client(base, recorder)
+    for _ in range(args.iterations):
+        lon, lat, span, box = random_bbox(rng)
+        z = max(0, min(8, int(math.log2(360 / span))))
+        client.get(f"/api/earthquakes?days={MAX_DAYS}&format=bin&bbox={box}&limit={VIEWPORT_LIMIT}", '/api/earthquakes?bbox')
+        client.get(f"/api/clusters?days=7&z={z}&bbox={box}", '/api/clusters?bbox')
+        client.get(f"/api/earthquakes/table?days=7&sort=mag&order=desc&limit={TABLE_PAGE_SIZE}&bbox={box}", '/api/earthquakes/table')
+        client.get(heat_tile(lon, lat, min(z + 2, 10)), '/tiles/heat/<z>/<x>/<y>.png')
+    client.close()
+    return {}
+
+
+# Weighted request mix for the concurrency scenario: (weight, endpoint, path factory)
+def traffic(cursor):
+    return (
+        (1, '/', lambda rng: '/'),
+        (2, '/api/earthquakes?stream=1', lambda rng: f"/api/earthquakes?days={MAX_DAYS}&format=bin&limit={GLOBAL_LIMIT}&stream=1"),
+        (4, '/api/summary', lambda rng: f"/api/summary?days={rng.randint(1, MAX_DAYS)}"),
+        (4, '/api/clusters', lambda rng: f"/api/clusters?days={rng.randint(1, MAX_DAYS)}&z=1"),
+        (4, '/api/earthquakes?bbox', lambda rng: f"/api/earthquakes?days={MAX_DAYS}&format=bin&bbox={random_bbox(rng)[3]}&limit={VIEWPORT_LIMIT}"),
+        (4, '/api/earthquakes?since', lambda rng: f"/api/earthquakes?since={cursor}"),
+        (2, '/api/earthquakes/table', lambda rng: f"/api/earthquakes/table?days=7&sort=mag&order=desc&limit={TABLE_PAGE_SIZE}&offset={rng.randrange(0, 2000, TABLE_PAGE_SIZE)}"),
+        (4, '/tiles/heat/<z>/<x>/<y>.png', lambda rng: heat_tile(rng.uniform(-180, 180), rng.uniform(-80, 80), rng.randint(2, 6)))
+    )
+
+
+def concurrent(clients):
+    def scenario(base, recorder, args, rng):
+        _, headers, _ = Client(base, Recorder()).get('/api/earthquakes?days=1&format=bin&limit=1', '')
+        mix = traffic(headers.get('X-Catalog-Cursor', '0'))
+        weights = [entry[0] for entry in mix]
+        deadline = time.perf_counter() + args.duration
+
+        def worker(seed):
+            worker_rng = random.Random(seed)
+            client = Client(base, recorder)
+            while time.perf_counter() < deadline:
+                _, endpoint, path = worker_rng.choices(mix, weights)[0]
+                client.get(path(worker_rng), endpoint)
+            client.close()
+
+        threads = [threading.Thread(target=worker, args=(rng.random(),)) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {'clients': clients}
+    return scenario
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# Start the app against the fake USGS with its state in `workdir`
+def start_app(args, usgs_url, workdir):
+    port = free_port()
+    env = dict(
+        os.environ,
+        USGS_BASE_URL=usgs_url,
+        CESIUM_ION_ACCESS_TOKEN='benchmark-token',
+        INGEST_INTERVAL=str(args.ingest_interval),
+        EVENT_STORE_PATH=os.path.join(workdir, 'earthquakes.sqlite3'),
+        CATALOG_SNAPSHOT_PATH=os.path.join(workdir, 'earthquakes.snapshot'),
+        ARCHIVE_PATH=os.path.join(workdir, 'archive'),
+        METRICS_DIR=os.path.join(workdir, 'metrics'),
+        PYTHONUNBUFFERED='1'
+    )
+    os.makedirs(env['METRICS_DIR'], exist_ok=True)
+    if args.server == 'gunicorn':
+        command = [
+            sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}", '--workers', str(args.workers),
+            '--worker-class', 'gevent', '--worker-connections', '2000', '--timeout', '120', '3D-EQ:app'
+        ]
+    else:
+        command = [
+            sys.executable, '-m', 'flask', '--app', '3D-EQ', 'run', '--host', '127.0.0.1', '--port', str(port),
+            '--no-reload', '--no-debugger', '--with-threads'
+        ]
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}"
+
+
+# Wait until the app answers from its synced event store (cursor header present)
+def wait_ready(base, process, timeout, need_store):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"The app exited with status {process.returncode}.")
+        status, headers, _ = Client(base, Recorder()).get('/api/earthquakes?days=1&format=bin&limit=1', '')
+        if status == 200 and (not need_store or 'X-Catalog-Cursor' in headers):
+            return
+        time.sleep(0.5)
+    raise RuntimeError(f"The app was not ready after {timeout} seconds.")
+
+
+# Scenario results whose p95 latency or peak RSS grew, or whose throughput fell, by more
+# than `tolerance` compared with `baseline`
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, result in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or not previous.get('latency_ms') or not result.get('latency_ms'):
+            continue
+        checks = (
+            ('p95 latency (ms)', previous['latency_ms']['p95'], result['latency_ms']['p95'], 1),
+            ('peak RSS (bytes)', previous.get('peak_rss_bytes'), result.get('peak_rss_bytes'), 1),
+            ('requests/sec', previous.get('rps'), result.get('rps'), -1)
+        )
+        for label, before, after, direction in checks:
+            if before and after and direction * (after - before) > tolerance * before:
+                found.append(f"{name}: {label} {before:.1f} -> {after:.1f}")
+    return found
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load benchmark for the earthquake viewer')
+    parser.add_argument('--events', type=int, default=100000, help='synthetic catalog size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--server', choices=('flask', 'gunicorn'), default='flask')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--ingest-interval', type=float, default=60)
+    parser.add_argument('--url', help='benchmark an already running app instead of starting one')
+    parser.add_argument('--pid', type=int, help='process id of the --url app, for peak RSS')
+    parser.add_argument('--scenarios', default='cold,slider,bbox,concurrency')
+    parser.add_argument('--iterations', type=int, default=20, help='page loads, drags or boxes per scenario')
+    parser.add_argument('--clients', default='1,8,32', help='concurrency levels')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per concurrency level')
+    parser.add_argument('--ready-timeout', type=float, default=300)
+    parser.add_argument('--out', default='bench-results.json')
+    parser.add_argument('--baseline', help='earlier report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    names = args.scenarios.split(',')
+    scenarios = [(name, {'cold': cold_load, 'slider': slider, 'bbox': bbox}[name]) for name in names if name != 'concurrency']
+    if 'concurrency' in names:
+        scenarios += [(f"concurrency-{clients}", concurrent(int(clients))) for clients in args.clients.split(',')]
+
+    fake = process = None
+    workdir = tempfile.TemporaryDirectory(prefix='eq-bench-')
+    try:
+        if args.url:
+            base, pid = args.url.rstrip('/'), args.pid
+            wait_ready(base, None, args.ready_timeout, False)
+        else:
+            started = time.perf_counter()
+            fake = FakeUSGS(search_limit=max(SEARCH_LIMIT, args.events))
+            fake.add_features(synthetic.features(synthetic.generate(args.events, seed=args.seed)))
+            fake.start()
+            process, base = start_app(args, fake.url, workdir.name)
+            pid = process.pid
+            print(f"Serving {args.events} synthetic events; waiting for the first ingest...", file=sys.stderr)
+            wait_ready(base, process, args.ready_timeout, True)
+            print(f"Ready after {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        sampler = None
+        if pid and os.path.isdir('/proc'):
+            sampler = RssSampler(pid)
+            sampler.start()
+            sampler.take()
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'config': {
+                'events': None if args.url else args.events,
+                'seed': args.seed,
+                'server': 'external' if args.url else args.server,
+                'workers': args.workers if args.server == 'gunicorn' and not args.url else None,
+                'iterations': args.iterations,
+                'duration': args.duration,
+                'python': sys.version.split()[0],
+                'revision': git_revision()
+            },
+            'scenarios': {}
+        }
+        rng = random.Random(args.seed)
+        for name, scenario in scenarios:
+            recorder = Recorder()
+            start = time.perf_counter()
+            extra = scenario(base, recorder, args, rng)
+            result = recorder.summary(time.perf_counter() - start)
+            result.update(extra)
+            result['peak_rss_bytes'] = sampler.take() if sampler else None
+            report['scenarios'][name] = result
+            latency = result['latency_ms'] or {}
+            print(f"{name:<16} {result['requests']:>7} req {result['rps']:>9.1f} req/s  "
+                  f"p50 {latency.get('p50', 0):>8.1f} ms  p95 {latency.get('p95', 0):>8.1f} ms  "
+                  f"p99 {latency.get('p99', 0):>8.1f} ms  errors {result['errors']}", file=sys.stderr)
+        if sampler:
+            sampler.stopped.set()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if fake is not None:
+            fake.stop()
+        workdir.cleanup()
+
+    with open(args.out, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.out}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(report, json.load(file), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
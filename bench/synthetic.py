@@ -0,0 +1,230 @@
+# bench/synthetic.py
+#
+# Reproducible synthetic earthquake catalogs for benchmarks, from 1k to 1M
+# events. Magnitudes follow the Gutenberg-Richter law, epicentres follow the
+# major plate boundaries with a diffuse background, depths are shallow on
+# ridges and reach 650 km in subduction zones, and part of the catalog is
+# aftershocks clustered in space and in time (Omori decay) around the largest
+# events. The same seed always produces the same catalog.
+#
+# Usage: python bench/synthetic.py --events 100000 [--seed 0] [--days 30] > catalog.geojson
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+# Plate boundaries as (lon, lat, region) polylines and whether they are subduction zones
+ZONES = (
+    (True, (
+        (-71.5, -45.0, 'Aysen, Chile'), (-72.5, -36.0, 'Concepcion, Chile'), (-71.0, -30.0, 'Coquimbo, Chile'),
+        (-70.5, -20.0, 'Tarapaca, Chile'), (-76.5, -13.0, 'Lima, Peru'), (-80.5, -2.0, 'Guayaquil, Ecuador'),
+        (-78.0, 7.0, 'Panama'), (-86.0, 11.5, 'Nicaragua'), (-92.5, 14.5, 'Chiapas, Mexico'),
+        (-101.0, 17.0, 'Guerrero, Mexico'), (-105.5, 20.0, 'Jalisco, Mexico')
+    )),
+    (False, (
+        (-115.5, 32.5, 'Baja California'), (-117.0, 34.0, 'Southern California'), (-120.5, 36.0, 'Central California'),
+        (-122.5, 38.0, 'Northern California'), (-125.0, 41.0, 'Cape Mendocino, CA'), (-128.0, 47.0, 'Vancouver Island'),
+        (-136.0, 57.0, 'Southeastern Alaska')
+    )),
+    (True, (
+        (-148.0, 61.0, 'Southern Alaska'), (-156.0, 57.0, 'Alaska Peninsula'), (-166.0, 53.5, 'Fox Islands, Aleutians'),
+        (-178.0, 51.5, 'Andreanof Islands, Aleutians'), (172.0, 52.5, 'Near Islands, Aleutians'),
+        (160.0, 53.0, 'Kamchatka, Russia'), (150.0, 46.0, 'Kuril Islands'), (143.0, 40.0, 'Honshu, Japan'),
+        (141.0, 33.0, 'Izu Islands, Japan'), (143.0, 22.0, 'Mariana Islands'), (145.5, 13.0, 'Guam')
+    )),
+    (True, (
+        (132.0, 33.0, 'Kyushu, Japan'), (127.0, 26.0, 'Ryukyu Islands, Japan'), (121.5, 23.5, 'Taiwan'),
+        (121.0, 15.0, 'Luzon, Philippines'), (126.5, 7.0, 'Mindanao, Philippines'), (126.0, 1.0, 'Molucca Sea'),
+        (129.0, -7.0, 'Banda Sea'), (118.0, -10.0, 'Sumbawa, Indonesia'), (108.0, -9.0, 'Java, Indonesia'),
+        (100.0, -3.0, 'Southern Sumatra, Indonesia'), (95.5, 3.5, 'Northern Sumatra, Indonesia'),
+        (93.0, 12.0, 'Andaman Islands, India')
+    )),
+    (True, (
+        (147.0, -6.5, 'New Guinea, Papua New Guinea'), (155.0, -6.0, 'Bougainville, Papua New Guinea'),
+        (160.0, -9.5, 'Solomon Islands'), (167.0, -15.0, 'Vanuatu'), (-177.0, -15.0, 'Fiji'),
+        (-174.5, -20.0, 'Tonga'), (-177.0, -30.0, 'Kermadec Islands, New Zealand'), (177.0, -38.5, 'North Island, New Zealand'),
+        (172.0, -42.5, 'South Island, New Zealand')
+    )),
+    (False, (
+        (95.0, 22.0, 'Myanmar'), (92.0, 27.0, 'Assam, India'), (85.0, 28.0, 'Nepal'), (75.0, 34.0, 'Kashmir'),
+        (70.5, 36.5, 'Hindu Kush, Afghanistan'), (60.0, 30.0, 'Eastern Iran'), (52.0, 28.5, 'Southern Iran'),
+        (44.0, 38.0, 'Eastern Turkey'), (35.0, 37.5, 'Central Turkey'), (28.0, 36.5, 'Dodecanese Islands, Greece'),
+        (22.0, 38.0, 'Southern Greece'), (15.5, 38.5, 'Sicily, Italy'), (13.0, 42.5, 'Central Italy')
+    )),
+    (False, (
+        (-18.0, 64.5, 'Iceland'), (-29.0, 43.0, 'Azores Islands'), (-45.0, 24.0, 'Northern Mid-Atlantic Ridge'),
+        (-30.0, 5.0, 'Central Mid-Atlantic Ridge'), (-13.0, -15.0, 'Ascension Island'),
+        (-14.0, -35.0, 'Southern Mid-Atlantic Ridge'), (-12.0, -55.0, 'Bouvet Island')
+    ))
+)
+DIRECTIONS = ('N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW')
+
+# Share of events off the plate boundaries, and of events that are aftershocks
+BACKGROUND_FRACTION = 0.15
+AFTERSHOCK_FRACTION = 0.3
+# Mainshocks are the largest this share of independent events
+MAINSHOCK_FRACTION = 0.001
+MAX_MAGNITUDE = 9.5
+
+
+# Gutenberg-Richter magnitudes: log10 N(>=M) = a - b M, i.e. exponential above `min_mag`
+def gutenberg_richter(rng, count, b_value, min_mag, max_mag=MAX_MAGNITUDE):
+    mags = min_mag + rng.exponential(1 / (b_value * np.log(10)), count)
+    return np.minimum(mags, max_mag)
+
+
+# Segment table (start, end, region, subduction) over every zone, with lengths as sampling weights
+def segments():
+    rows = []
+    for subduction, vertices in ZONES:
+        for (lon0, lat0, region), (lon1, lat1, _) in zip(vertices, vertices[1:]):
+            if lon1 - lon0 > 180:
+                lon1 -= 360
+            elif lon0 - lon1 > 180:
+                lon1 += 360
+            rows.append((lon0, lat0, lon1, lat1, region, subduction))
+    return rows
+
+
+# Epicentres, depths and region indexes for `count` events on the plate boundaries
+def boundary_events(rng, count, table):
+    lon0, lat0, lon1, lat1 = (np.array([row[k] for row in table]) for k in range(4))
+    subduction = np.array([row[5] for row in table])
+    length = np.hypot((lon1 - lon0) * np.cos(np.radians((lat0 + lat1) / 2)), lat1 - lat0)
+    segment = rng.choice(len(table), count, p=length / length.sum())
+    along = rng.random(count)
+    lon = lon0[segment] + along * (lon1[segment] - lon0[segment]) + rng.normal(0, 1.2, count)
+    lat = lat0[segment] + along * (lat1[segment] - lat0[segment]) + rng.normal(0, 1.0, count)
+    # Crustal events everywhere; a quarter of subduction-zone events are intermediate or deep
+    depth = rng.exponential(12, count)
+    deep = subduction[segment] & (rng.random(count) < 0.25)
+    depth[deep] = 35 + rng.exponential(120, deep.sum())
+    return lon, lat, np.minimum(depth, 650), segment
+
+
+# `count` events as numpy columns (lon, lat, depth, mag, time, updated ms) plus ids and
+# places, spread over the `days` days before `end_ms`
+def generate(count, days=30, seed=0, b_value=1.0, min_mag=1.0, end_ms=None):
+    rng = np.random.default_rng(seed)
+    end_ms = int(time.time() * 1000) if end_ms is None else end_ms
+    span = days * 86400 * 1000
+    table = segments()
+
+    aftershocks = int(count * AFTERSHOCK_FRACTION)
+    primary = count - aftershocks
+    background = int(primary * BACKGROUND_FRACTION)
+    lon, lat, depth, segment = boundary_events(rng, primary - background, table)
+    lon = np.concatenate([lon, rng.uniform(-180, 180, background)])
+    lat = np.concatenate([lat, np.degrees(np.arcsin(rng.uniform(-1, 1, background)))])
+    depth = np.concatenate([depth, rng.exponential(10, background)])
+    segment = np.concatenate([segment, np.full(background, -1)])
+    mag = gutenberg_richter(rng, primary, b_value, min_mag)
+    times = end_ms - rng.integers(0, span, primary)
+
+    # Aftershocks are shared among mainshocks in proportion to 10^M, placed within a
+    # magnitude-scaled radius and delayed following Omori's law (p = 1.1, c = 0.01 days),
+    # sampled by inverting its CDF truncated to the window
+    mainshocks = np.argsort(mag)[-max(1, int(primary * MAINSHOCK_FRACTION)):]
+    weight = 10 ** (mag[mainshocks] - mag[mainshocks].max())
+    parent = mainshocks[rng.choice(len(mainshocks), aftershocks, p=weight / weight.sum())]
+    radius = np.minimum(0.05 * 10 ** (0.5 * (mag[parent] - 4.5)), 2.0)
+    p, c = 1.1, 0.01 * 86400 * 1000
+    within = 1 - (1 + span / c) ** (1 - p)
+    delay = c * ((1 - rng.random(aftershocks) * within) ** (1 / (1 - p)) - 1)
+    after_times = times[parent] + delay.astype(np.int64)
+    after_mag = np.minimum(gutenberg_richter(rng, aftershocks, b_value, min_mag), mag[parent] - 0.1)
+
+    lon = np.concatenate([lon, lon[parent] + rng.normal(0, 1, aftershocks) * radius])
+    lat = np.concatenate([lat, lat[parent] + rng.normal(0, 1, aftershocks) * radius])
+    depth = np.concatenate([depth, np.clip(depth[parent] + rng.normal(0, 5, aftershocks), 0, 650)])
+    segment = np.concatenate([segment, segment[parent]])
+    mag = np.concatenate([mag, np.maximum(after_mag, min_mag)])
+    times = np.concatenate([times, after_times])
+    # Aftershocks past the end of the window wrap to its start rather than piling up
+    times = np.where(times > end_ms, times - span, times)
+
+    lon = (lon + 180) % 360 - 180
+    lat = np.clip(lat, -89.9, 89.9)
+    order = np.argsort(times, kind='stable')
+    regions = [row[4] for row in table]
+    region = [regions[i] if i >= 0 else None for i in segment[order].tolist()]
+    km = rng.integers(1, 100, count)
+    direction = rng.integers(0, len(DIRECTIONS), count)
+    places = [
+        f"{k} km {DIRECTIONS[d]} of {name}" if name else 'Background seismicity'
+        for k, d, name in zip(km.tolist(), direction.tolist(), region)
+    ]
+    return {
+        'ids': [f"sy{i:08d}" for i in range(count)],
+        'lon': lon[order].round(4),
+        'lat': lat[order].round(4),
+        'depth': depth[order].round(2),
+        'mag': mag[order].round(1),
+        'time': times[order],
+        'updated': np.minimum(times[order] + rng.integers(60 * 1000, 3600 * 1000, count), end_ms),
+        'places': places
+    }
+
+
+# A second agency's view of `catalog`: `fraction` of its events re-reported with ids
+# under `prefix`, origin times a few seconds off, epicentres some 15 km away and
+# magnitudes on a slightly different scale, for exercising catalog merging
+def relocated(catalog, fraction=0.6, seed=1, prefix='em'):
+    rng = np.random.default_rng(seed)
+    picked = np.flatnonzero(rng.random(len(catalog['ids'])) < fraction)
+    count = len(picked)
+    lat = np.clip(catalog['lat'][picked] + rng.normal(0, 15, count) / 111.2, -89.9, 89.9)
+    stretch = 1 / np.maximum(np.cos(np.radians(lat)), 0.05)
+    lon = (catalog['lon'][picked] + rng.normal(0, 15, count) / 111.2 * stretch + 180) % 360 - 180
+    return {
+        'ids': [f"{prefix}{i:08d}" for i in range(count)],
+        'lon': lon.round(4),
+        'lat': lat.round(4),
+        'depth': np.abs(catalog['depth'][picked] + rng.normal(0, 5, count)).round(1),
+        'mag': (catalog['mag'][picked] + rng.normal(0.1, 0.15, count)).round(1),
+        'time': catalog['time'][picked] + rng.normal(0, 2000, count).astype(np.int64),
+        'updated': np.minimum(catalog['updated'][picked] + rng.integers(0, 600 * 1000, count), catalog['updated'].max()),
+        'places': [catalog['places'][i].upper() for i in picked.tolist()]
+    }
+
+
+# GeoJSON features (the USGS FDSN layout) for a generated catalog, one at a time
+def features(catalog):
+    columns = zip(
+        catalog['ids'], catalog['lon'].tolist(), catalog['lat'].tolist(), catalog['depth'].tolist(),
+        catalog['mag'].tolist(), catalog['time'].tolist(), catalog['updated'].tolist(), catalog['places']
+    )
+    for event_id, lon, lat, depth, mag, event_time, updated, place in columns:
+        yield {
+            'type': 'Feature',
+            'id': event_id,
+            'properties': {'mag': mag, 'place': place, 'time': event_time, 'updated': updated, 'status': 'reviewed'},
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat, depth]}
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic USGS GeoJSON catalog')
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--b-value', type=float, default=1.0)
+    parser.add_argument('--min-mag', type=float, default=1.0)
+    parser.add_argument('--relocated', action='store_true', help="a second agency's view of the catalog")
+    args = parser.parse_args()
+
+    catalog = generate(args.events, args.days, args.seed, args.b_value, args.min_mag)
+    if args.relocated:
+        catalog = relocated(catalog)
+    out = sys.stdout
+    out.write('{"type": "FeatureCollection", "metadata": {"count": %d}, "features": [' % args.events)
+    for i, feature in enumerate(features(catalog)):
+        out.write((',\n' if i else '\n') + json.dumps(feature))
+    out.write('\n]}\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1429 @@
+const viewer = new Cesium.Viewer('cesiumContainer', {
+    terrainProvider: Cesium.createWorldTerrain(),
+    baseLayerPicker: false,
+    navigationHelpButton: true,
+    sceneModePicker: true,
+    animation: false,
+    timeline: false,
+    fullscreenButton: false,
+    homeButton: true,
+    geocoder: false,
+    infoBox: false,
+    selectionIndicator: false,
+    navigationInstructionsInitiallyVisible: false
+});
+
+// Points sit at their hypocenters below the surface; keep them drawn over the terrain
+// (events on the far side of the globe are still hidden)
+viewer.scene.globe.depthTestAgainstTerrain = false;
+
+const MAX_DAYS = 30;
+const FETCH_DEBOUNCE_MS = 400;
+// The global load carries the largest events; zoomed-in views fetch their own box in detail
+const GLOBAL_LIMIT = 20000;
+const VIEWPORT_LIMIT = 20000;
+const VIEWPORT_MAX_SPAN = 120;
+// Viewport events are kept while within this fraction of the view's size beyond its edges
+const VIEWPORT_MARGIN = 0.5;
+// Above this camera height the view shows server-side clusters instead of individual points
+const POINTS_MAX_HEIGHT = 2.5e6;
+const CLUSTER_MAX_ZOOM = 8;
+// Server-rendered density tiles (weight: count, mag or energy); deeper levels are upsampled
+const HEATMAP_WEIGHT = 'count';
+const HEATMAP_MAX_LEVEL = 10;
+// Location search suggestions come from the server's gazetteer as the user types
+const AUTOCOMPLETE_DEBOUNCE_MS = 150;
+const AUTOCOMPLETE_MIN_LENGTH = 2;
+// "View All" table: fixed row height (see app.css) for virtual scrolling, rows fetched per page
+const TABLE_ROW_HEIGHT = 28;
+const TABLE_PAGE_SIZE = 200;
+const TABLE_OVERSCAN = 10;
+// Playback: activity strip bucket (minutes), how long (in timeline time) newly shown events
+// stay enlarged and by how much
+const PLAYBACK_BUCKET_MINUTES = 60;
+const PLAYBACK_FADE_MS = 12 * 3600 * 1000;
+const PLAYBACK_PULSE = 1.5;
+// Hover: pick tolerance beyond a point's radius, radius searched around the cursor (both in
+// pixels), the candidate count above which GPU picking is used instead, the boundaries of the
+// depth bands (km) the hover grid is split into, and the number of cached tooltips
+const HOVER_TOLERANCE_PX = 4;
+const HOVER_SEARCH_PX = 40;
+const HOVER_MAX_CANDIDATES = 2000;
+const HOVER_DEPTH_BANDS = [0, 20, 50, 100, 200, 350, 500, 800];
+const TOOLTIP_CACHE_SIZE = 64;
+// Largest archive range loaded onto the globe (events, in time order)
+const ARCHIVE_LIMIT = 100000;
+
+let heatmapEnabled = false;
+let heatmapLayer = null;
+let selectedDays = 7;
+// Loaded catalog for the full MAX_DAYS window, sorted by time; the date window
+// shows the suffix [visibleStart, length)
+let earthquakes = decodeCatalog(null);
+let visibleStart = 0;
+let catalogCursor = null;
+// Start (ms) of the time range the loaded window covers, or null before it is loaded
+let loadedFrom = null;
+let fetchController = null;
+let fetchTimer = null;
+let stream = null;
+let viewportController = null;
+let viewportTimer = null;
+// Ids of the events merged in by viewport loads rather than the global load; they are
+// dropped again once the camera has moved away, so panning does not grow the dataset
+const viewportIds = new Set();
+let clusterController = null;
+let clusterMode = false;
+let windowFrame = null;
+// Server summary of the window (top events, legend class counts, depth stats)
+let summary = null;
+let summaryController = null;
+// Seismicity statistics panel for the window and camera region
+let statsController = null;
+// Archive mode: the dataset is a streamed historical range instead of the live window
+let archiveMode = false;
+let archiveController = null;
+// Time-lapse playback over [start, end]; `upto` and `fadeFrom` are the catalog indices of the
+// reveal frontier and of the oldest event still enlarged
+const playback = { active: false, playing: false, start: 0, end: 0, time: 0, last: null, frame: null, upto: 0, fadeFrom: 0 };
+
+// Function to get color based on magnitude
+function getColor(magnitude) {
+    if (magnitude >= 5.0) return Cesium.Color.RED.withAlpha(0.6);
+    if (magnitude >= 4.0) return Cesium.Color.ORANGE.withAlpha(0.6);
+    if (magnitude >= 3.0) return Cesium.Color.YELLOW.withAlpha(0.6);
+    if (magnitude >= 2.0) return Cesium.Color.GREEN.withAlpha(0.6);
+    return Cesium.Color.BLUE.withAlpha(0.6);
+}
+
+function pointStyle(catalog, i) {
+    const mag = catalog.mag[i] || 0;
+    return { pixelSize: Math.max(6 + mag * 2, 6), color: getColor(mag), outlineColor: Cesium.Color.BLACK, outlineWidth: 1 };
+}
+
+const renderer = new PointRenderer(viewer.scene, pointStyle);
+const clusterLayer = new ClusterLayer(viewer.scene, getColor);
+
+// Decode the binary columnar catalog; columns are typed-array views over the response buffer
+function decodeCatalog(buffer) {
+    if (!buffer) {
+        const none = new Float32Array(0);
+        return { length: 0, lon: none, lat: none, depth: none, mag: none, time: new Float64Array(0), positions: none, placeIndex: new Uint32Array(0), places: [], ids: [] };
+    }
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'EQCB' || view.getUint16(4, true) !== 2) {
+        throw new Error("Invalid earthquake data format.");
+    }
+    const count = view.getUint32(8, true);
+    const placeCount = view.getUint32(12, true);
+    let offset = 16;
+    const column = (Type, length) => {
+        const array = new Type(buffer, offset, length);
+        offset += length * Type.BYTES_PER_ELEMENT;
+        return array;
+    };
+    const decoder = new TextDecoder();
+    const strings = length => {
+        const offsets = column(Uint32Array, length + 1);
+        const bytes = new Uint8Array(buffer, offset, offsets[length]);
+        offset += offsets[length] + (4 - offsets[length] % 4) % 4;
+        const values = new Array(length);
+        for (let i = 0; i < length; i++) {
+            values[i] = decoder.decode(bytes.subarray(offsets[i], offsets[i + 1]));
+        }
+        return values;
+    };
+    const catalog = {
+        length: count,
+        lon: column(Float32Array, count),
+        lat: column(Float32Array, count),
+        depth: column(Float32Array, count),
+        mag: column(Float32Array, count),
+        time: column(Float64Array, count),
+        positions: column(Float32Array, count * 3),
+        placeIndex: column(Uint32Array, count)
+    };
+    catalog.places = strings(placeCount);
+    catalog.ids = strings(count);
+    return catalog;
+}
+
+// Accessors for a single event in the columnar catalog
+function eqMag(i) { return earthquakes.mag[i] || 0; }
+function eqPlace(i) { return earthquakes.places[earthquakes.placeIndex[i]] || 'Unknown'; }
+function eqDepth(i) { return isNaN(earthquakes.depth[i]) ? 'Unknown' : earthquakes.depth[i].toFixed(1); }
+function eqTime(i) { return formatTime(earthquakes.time[i]); }
+
+function formatTime(ms) {
+    return new Date(ms).toISOString().replace('T', ' ').split('.')[0];
+}
+
+function escapeHtml(text) {
+    return String(text).replace(/[&<>"']/g, c => `&#${c.charCodeAt(0)};`);
+}
+
+// Build a new catalog from selected rows of `source` plus delta rows
+// [id, lon, lat, depth, mag, time, place, x, y, z] (x/y/z are ECEF hypocenter positions)
+function buildCatalog(source, indices, rows = []) {
+    const count = indices.length + rows.length;
+    const catalog = {
+        length: count,
+        lon: new Float32Array(count),
+        lat: new Float32Array(count),
+        depth: new Float32Array(count),
+        mag: new Float32Array(count),
+        time: new Float64Array(count),
+        positions: new Float32Array(count * 3),
+        placeIndex: new Uint32Array(count),
+        places: source.places,
+        ids: new Array(count)
+    };
+    indices.forEach((i, k) => {
+        catalog.lon[k] = source.lon[i];
+        catalog.lat[k] = source.lat[i];
+        catalog.depth[k] = source.depth[i];
+        catalog.mag[k] = source.mag[i];
+        catalog.time[k] = source.time[i];
+        catalog.positions.set(source.positions.subarray(3 * i, 3 * i + 3), 3 * k);
+        catalog.placeIndex[k] = source.placeIndex[i];
+        catalog.ids[k] = source.ids[i];
+    });
+    if (rows.length) {
+        catalog.places = source.places.slice();
+        const placeLookup = new Map(catalog.places.map((place, i) => [place, i]));
+        rows.forEach(([id, lon, lat, depth, mag, time, place, x, y, z], r) => {
+            const k = indices.length + r;
+            if (!placeLookup.has(place)) {
+                placeLookup.set(place, catalog.places.length);
+                catalog.places.push(place);
+            }
+            catalog.lon[k] = lon;
+            catalog.lat[k] = lat;
+            catalog.depth[k] = depth === null ? NaN : depth;
+            catalog.mag[k] = mag === null ? NaN : mag;
+            catalog.time[k] = time;
+            catalog.positions.set([x, y, z], 3 * k);
+            catalog.placeIndex[k] = placeLookup.get(place);
+            catalog.ids[k] = id;
+        });
+    }
+    return catalog;
+}
+
+// Rows of `catalog` in delta-row form
+function catalogRows(catalog, indices) {
+    return indices.map(i => [
+        catalog.ids[i], catalog.lon[i], catalog.lat[i], catalog.depth[i], catalog.mag[i], catalog.time[i],
+        catalog.places[catalog.placeIndex[i]], catalog.positions[3 * i], catalog.positions[3 * i + 1], catalog.positions[3 * i + 2]
+    ]);
+}
+
+// Union of two catalogs by id; events already loaded are kept
+function mergeCatalogs(catalog, other) {
+    const known = new Set(catalog.ids);
+    const added = [];
+    for (let i = 0; i < other.length; i++) {
+        if (!known.has(other.ids[i])) added.push(i);
+    }
+    if (!added.length) return catalog;
+    return buildCatalog(catalog, Array.from(catalog.ids.keys()), catalogRows(other, added));
+}
+
+// Apply a server delta: replace updated events, append new ones and drop deleted ones
+function applyDelta(catalog, delta) {
+    const changed = new Set(delta.deleted);
+    delta.events.forEach(row => changed.add(row[0]));
+    const keep = [];
+    for (let i = 0; i < catalog.length; i++) {
+        if (!changed.has(catalog.ids[i])) keep.push(i);
+    }
+    return buildCatalog(catalog, keep, delta.events);
+}
+
+// Return the catalog sorted by time (deltas append out of order)
+function sortByTime(catalog) {
+    for (let i = 1; i < catalog.length; i++) {
+        if (catalog.time[i] < catalog.time[i - 1]) {
+            const order = Array.from(catalog.time.keys()).sort((a, b) => catalog.time[a] - catalog.time[b]);
+            return buildCatalog(catalog, order);
+        }
+    }
+    return catalog;
+}
+
+// First index whose value is >= target in a sorted array
+function lowerBound(array, target) {
+    let lo = 0, hi = array.length;
+    while (lo < hi) {
+        const mid = (lo + hi) >>> 1;
+        if (array[mid] < target) lo = mid + 1; else hi = mid;
+    }
+    return lo;
+}
+
+// Start of the window covering the last `days` days (UTC midnight, as on the server)
+function windowStart(days) {
+    const start = new Date();
+    start.setUTCHours(0, 0, 0, 0);
+    start.setUTCDate(start.getUTCDate() - days);
+    return start.getTime();
+}
+
+function fetchBinary(url, signal) {
+    return fetch(url, { signal }).then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        return response.arrayBuffer().then(buffer => [response, buffer]);
+    });
+}
+
+// Read a stream of length-prefixed frames (Uint32 byte length, then the payload) and call
+// onFrame with each payload as soon as it is complete
+function readFrames(body, onFrame) {
+    const reader = body.getReader();
+    let pending = new Uint8Array(0);
+    const pump = () => reader.read().then(({ done, value }) => {
+        if (done) {
+            if (pending.length) throw new Error('Truncated response.');
+            return;
+        }
+        const bytes = new Uint8Array(pending.length + value.length);
+        bytes.set(pending);
+        bytes.set(value, pending.length);
+        const view = new DataView(bytes.buffer);
+        let offset = 0;
+        while (bytes.length - offset >= 4 && bytes.length - offset - 4 >= view.getUint32(offset, true)) {
+            const length = view.getUint32(offset, true);
+            onFrame(bytes.slice(offset + 4, offset + 4 + length).buffer);
+            offset += 4 + length;
+        }
+        pending = bytes.subarray(offset);
+        return pump();
+    });
+    return pump();
+}
+
+// Load the full window once and filter it locally; afterwards only changes since our cursor
+// are fetched. Servers without an event store send no cursor, so we reload the window instead.
+// A newer fetch aborts any still in flight, so a stale response can never win.
+function fetchEarthquakes() {
+    if (fetchController) fetchController.abort();
+    const controller = fetchController = new AbortController();
+    const request = catalogCursor !== null ? syncEarthquakes(controller.signal) : loadEarthquakes(controller.signal);
+    request
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error fetching earthquake data:', error);
+            }
+        })
+        .finally(() => {
+            if (fetchController === controller) fetchController = null;
+        });
+}
+
+// Whether the loaded catalog already holds the window of the last `days` days. Proxied
+// catalogs are then filtered locally and only refetched when a wider window is asked for;
+// store-backed ones stay current through the feed or delta syncs.
+function windowLoaded(days) {
+    return catalogCursor === null && loadedFrom !== null && loadedFrom <= windowStart(days);
+}
+
+// Debounce refetches while the slider is being dragged
+function scheduleFetch() {
+    clearTimeout(fetchTimer);
+    fetchTimer = setTimeout(() => {
+        if (!stream && !windowLoaded(selectedDays)) fetchEarthquakes();
+        loadSummary();
+        loadStats();
+        if (clusterMode) loadClusters();
+        if (heatmapEnabled) updateHeatmapLayer();
+        if (modal.style.display === 'block') resetTable();
+    }, FETCH_DEBOUNCE_MS);
+}
+
+// The window is streamed largest magnitudes first; on the first load every chunk is shown
+// as it arrives, while a reload replaces the dataset once complete so nothing flickers
+function loadEarthquakes(signal) {
+    const from = windowStart(MAX_DAYS);
+    return fetch(`/api/earthquakes?days=${MAX_DAYS}&format=bin&limit=${GLOBAL_LIMIT}&stream=1`, { signal }).then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        const firstLoad = !earthquakes.length;
+        let loaded = decodeCatalog(null);
+        return readFrames(response.body, buffer => {
+            if (signal.aborted) return;
+            loaded = mergeCatalogs(loaded, decodeCatalog(buffer));
+            if (firstLoad) setDataset(loaded);
+        }).then(() => {
+            const cursor = response.headers.get('X-Catalog-Cursor');
+            catalogCursor = cursor !== null ? parseInt(cursor) : null;
+            loadedFrom = from;
+            viewportIds.clear();
+            setDataset(loaded);
+            if (firstLoad) zoomToEarthquakes();
+            openStream();
+        });
+    });
+}
+
+// Fetch and apply the events inserted, updated or deleted since our cursor
+function syncEarthquakes(signal) {
+    return fetch(`/api/earthquakes?since=${catalogCursor}`, { signal })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(delta => {
+            applyServerDelta(delta);
+            openStream();
+        });
+}
+
+function applyServerDelta(delta) {
+    catalogCursor = Math.max(catalogCursor, delta.cursor);
+    if (delta.events.length || delta.deleted.length) {
+        setDataset(applyDelta(earthquakes, delta));
+        loadSummary('no-cache');
+        loadStats('no-cache');
+        if (heatmapEnabled) updateHeatmapLayer();
+    }
+}
+
+// Live feed: the server pushes a delta for every ingest, so the dataset stays current without
+// refetching. The browser reconnects by itself and resumes from the last delta it received;
+// if the feed is refused, the slider falls back to delta syncs.
+function openStream() {
+    if (stream || catalogCursor === null || typeof EventSource === 'undefined') return;
+    const source = stream = new EventSource(`/api/stream?since=${catalogCursor}`);
+    source.addEventListener('delta', event => applyServerDelta(JSON.parse(event.data)));
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED && stream === source) stream = null;
+    };
+}
+
+// Archive mode: a date range from the server's historical archive is streamed partition by
+// partition and each chunk is added to the globe as it arrives. The live window (slider,
+// feed, clusters, heatmap and table) is paused until "Back to Recent" reloads it.
+function loadArchive() {
+    stopPlayback();
+    const start = document.getElementById('archiveStart').value;
+    const end = document.getElementById('archiveEnd').value;
+    const minMag = document.getElementById('archiveMinMag').value;
+    if (!start || !end) return;
+    if (archiveController) archiveController.abort();
+    const controller = archiveController = new AbortController();
+    setArchiveMode(true);
+    loadedFrom = null;
+    viewportIds.clear();
+    setDataset(decodeCatalog(null));
+    const status = document.getElementById('legendStats');
+    const describe = done => `Archive ${start} to ${end}: ${earthquakes.length}${done ? '' : '…'} events` +
+        (earthquakes.length >= ARCHIVE_LIMIT ? ` (first ${ARCHIVE_LIMIT})` : '');
+    status.textContent = describe(false);
+    const minMagParam = minMag !== '' ? `&minmag=${minMag}` : '';
+    fetch(`/api/archive?start=${start}&end=${end}${minMagParam}&limit=${ARCHIVE_LIMIT}`, { signal: controller.signal })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return readFrames(response.body, buffer => {
+                if (archiveController !== controller) return;
+                setDataset(mergeCatalogs(earthquakes, decodeCatalog(buffer)));
+                status.textContent = describe(false);
+            });
+        })
+        .then(() => {
+            if (archiveController === controller) status.textContent = describe(true);
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error fetching archive:', error);
+                status.textContent = 'Archive unavailable.';
+            }
+        })
+        .finally(() => {
+            if (archiveController === controller) archiveController = null;
+        });
+}
+
+function setArchiveMode(enabled) {
+    if (enabled) {
+        if (stream) stream.close();
+        stream = null;
+        if (fetchController) fetchController.abort();
+        if (statsController) statsController.abort();
+        catalogCursor = null;
+        if (heatmapEnabled) document.getElementById('toggleHeatmap').click();
+        document.querySelectorAll('#legend .legend-count').forEach(count => count.textContent = '');
+    }
+    archiveMode = enabled;
+    document.getElementById('dateRange').disabled = enabled;
+    document.getElementById('toggleHeatmap').disabled = enabled;
+    document.getElementById('archiveExit').style.display = enabled ? '' : 'none';
+    document.getElementById('statsPanel').style.display = enabled ? 'none' : '';
+    updateView();
+}
+
+// Leave archive mode and reload the live window from scratch
+function exitArchive() {
+    stopPlayback();
+    if (archiveController) archiveController.abort();
+    archiveController = null;
+    setArchiveMode(false);
+    setDataset(decodeCatalog(null));
+    loadSummary();
+    fetchEarthquakes();
+}
+
+// Offer archive mode when the server has archived months, limited to their date range
+function loadArchivePartitions() {
+    fetch('/api/archive/partitions')
+        .then(response => response.ok ? response.json() : { partitions: [] })
+        .then(({ partitions }) => {
+            const months = partitions.filter(partition => partition.count);
+            if (!months.length) return;
+            const day = ms => new Date(ms).toISOString().slice(0, 10);
+            const first = day(months[0].time_min), last = day(months[months.length - 1].time_max);
+            ['archiveStart', 'archiveEnd'].forEach(id => {
+                const input = document.getElementById(id);
+                input.min = first;
+                input.max = last;
+            });
+            document.getElementById('archiveStart').value = day(months[months.length - 1].time_min);
+            document.getElementById('archiveEnd').value = last;
+            document.getElementById('archiveControls').style.display = '';
+        })
+        .catch(error => {
+            console.error('Error fetching archive partitions:', error);
+        });
+}
+
+// Current camera rectangle as [west, south, east, north] degrees, or null if it cannot be computed
+function cameraBox() {
+    const rectangle = viewer.camera.computeViewRectangle();
+    if (!rectangle) return null;
+    return [rectangle.west, rectangle.south, rectangle.east, rectangle.north].map(Cesium.Math.toDegrees);
+}
+
+function bboxParam(box) {
+    return box.map(value => value.toFixed(3)).join(',');
+}
+
+// Camera rectangle when zoomed in far enough for a detailed viewport load, else null
+function viewportBox() {
+    const box = cameraBox();
+    if (!box) return null;
+    const width = box[0] <= box[2] ? box[2] - box[0] : 360 - box[0] + box[2];
+    if (width > VIEWPORT_MAX_SPAN || box[3] - box[1] > VIEWPORT_MAX_SPAN / 2) return null;
+    return box;
+}
+
+// Load the events in the current camera rectangle and merge them into the dataset, dropping
+// earlier viewport events outside the rectangle and its margin (all of them once zoomed out)
+function loadViewport() {
+    const box = viewportBox();
+    if (viewportController) viewportController.abort();
+    if (!box) {
+        if (viewportIds.size) setDataset(dropViewportEvents(earthquakes, null));
+        return;
+    }
+    const controller = viewportController = new AbortController();
+    fetchBinary(`/api/earthquakes?days=${MAX_DAYS}&format=bin&bbox=${bboxParam(box)}&limit=${VIEWPORT_LIMIT}`, controller.signal)
+        .then(([, buffer]) => {
+            const kept = dropViewportEvents(earthquakes, box);
+            const loaded = decodeCatalog(buffer);
+            const known = new Set(kept.ids);
+            for (let i = 0; i < loaded.length; i++) {
+                if (!known.has(loaded.ids[i])) viewportIds.add(loaded.ids[i]);
+            }
+            const merged = mergeCatalogs(kept, loaded);
+            if (merged !== earthquakes) setDataset(merged);
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error fetching viewport earthquakes:', error);
+            }
+        });
+}
+
+// `catalog` without the viewport events outside `box` widened by VIEWPORT_MARGIN (every
+// viewport event for a null box)
+function dropViewportEvents(catalog, box) {
+    let inside = () => false;
+    if (box) {
+        const [west, south, east, north] = box;
+        const width = west <= east ? east - west : 360 - west + east;
+        const marginLon = width * VIEWPORT_MARGIN, marginLat = (north - south) * VIEWPORT_MARGIN;
+        const span = width + 2 * marginLon;
+        inside = i => catalog.lat[i] >= south - marginLat && catalog.lat[i] <= north + marginLat &&
+            (span >= 360 || ((catalog.lon[i] - west + marginLon) % 360 + 360) % 360 <= span);
+    }
+    const keep = [];
+    for (let i = 0; i < catalog.length; i++) {
+        const id = catalog.ids[i];
+        if (!viewportIds.has(id) || inside(i)) {
+            keep.push(i);
+        } else {
+            viewportIds.delete(id);
+        }
+    }
+    return keep.length === catalog.length ? catalog : buildCatalog(catalog, keep);
+}
+
+// Cluster zoom level for a camera height: one level per halving of the height
+function clusterZoom(height) {
+    return Math.max(0, Math.min(CLUSTER_MAX_ZOOM, Math.floor(Math.log2(4e7 / height))));
+}
+
+// Load clusters for the current view and date window
+function loadClusters() {
+    if (clusterController) clusterController.abort();
+    const controller = clusterController = new AbortController();
+    const box = cameraBox();
+    const z = clusterZoom(viewer.camera.positionCartographic.height);
+    const bbox = box ? `&bbox=${bboxParam(box)}` : '';
+    fetch(`/api/clusters?days=${selectedDays}&z=${z}${bbox}`, { signal: controller.signal })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (clusterMode) clusterLayer.set(data.clusters);
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error fetching clusters:', error);
+            }
+        });
+}
+
+// Switch between clusters and raw points by camera height (archive ranges and playback are always points)
+function updateView() {
+    clusterMode = !archiveMode && !playback.active && viewer.camera.positionCartographic.height > POINTS_MAX_HEIGHT;
+    updateLayerVisibility();
+    if (clusterMode) {
+        loadClusters();
+    } else {
+        clusterLayer.clear();
+        if (!archiveMode) loadViewport();
+    }
+    if (!archiveMode) loadStats();
+}
+
+viewer.camera.moveEnd.addEventListener(() => {
+    clearTimeout(viewportTimer);
+    viewportTimer = setTimeout(updateView, FETCH_DEBOUNCE_MS);
+});
+
+// Replace the loaded catalog; the renderer diffs it against the points already shown
+function setDataset(catalog) {
+    earthquakes = sortByTime(catalog);
+    visibleStart = archiveMode ? 0 : lowerBound(earthquakes.time, windowStart(selectedDays));
+    renderer.sync(earthquakes, visibleStart, earthquakes.length);
+    if (playback.active) seekPlayback(playback.time);
+    updateEarthquakeData();
+}
+
+// Move the date window: the cutoff is found by binary search and only the events
+// entering or leaving the window are added or removed
+function setWindow(days) {
+    const start = lowerBound(earthquakes.time, windowStart(days));
+    if (start < visibleStart) {
+        renderer.add(earthquakes, start, visibleStart);
+    } else if (start > visibleStart) {
+        renderer.remove(earthquakes, visibleStart, start);
+    }
+    visibleStart = start;
+    updateEarthquakeData();
+}
+
+// Indices of the `limit` largest visible events, by descending magnitude (one pass keeping
+// a small sorted list instead of sorting the window)
+function topByMagnitude(limit) {
+    const top = [];
+    for (let i = visibleStart; i < earthquakes.length; i++) {
+        const mag = eqMag(i);
+        if (top.length === limit && mag <= eqMag(top[limit - 1])) continue;
+        let k = top.length;
+        while (k > 0 && eqMag(top[k - 1]) < mag) k--;
+        top.splice(k, 0, i);
+        if (top.length > limit) top.pop();
+    }
+    return top;
+}
+
+// Fetch the window summary; it fills the bar before the catalog has loaded and the legend counts
+// `cache` is 'no-cache' when a stored copy would be out of date (after a live delta)
+function loadSummary(cache = 'default') {
+    if (summaryController) summaryController.abort();
+    const controller = summaryController = new AbortController();
+    fetch(`/api/summary?days=${selectedDays}`, { signal: controller.signal, cache })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            summary = data;
+            if (archiveMode) return;
+            updateLegend();
+            if (!earthquakes.length) updateEarthquakeData();
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error fetching summary:', error);
+            }
+        });
+}
+
+function updateLegend() {
+    const counts = document.querySelectorAll('#legend .legend-count');
+    summary.magnitude_classes.forEach((magnitudeClass, k) => {
+        if (counts[k]) counts[k].textContent = `(${magnitudeClass.count})`;
+    });
+    const depth = value => value === null ? 'Unknown' : `${value.toFixed(1)} km`;
+    document.getElementById('legendStats').textContent =
+        `${summary.count} events · max depth ${depth(summary.max_depth)} · mean depth ${depth(summary.mean_depth)}`;
+}
+
+// Load counts, energy release and the b-value for the date window in the camera region
+function loadStats(cache = 'default') {
+    if (statsController) statsController.abort();
+    const controller = statsController = new AbortController();
+    const box = cameraBox();
+    const bbox = box ? `&bbox=${bboxParam(box)}` : '';
+    fetch(`/api/stats?days=${selectedDays}${bbox}`, { signal: controller.signal, cache })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(stats => {
+            if (!archiveMode) updateStatsPanel(stats);
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error fetching stats:', error);
+            }
+        });
+}
+
+// Grid cell [west, south, east, north] as "30–40°N 140–150°E"
+function cellLabel([west, south, east, north]) {
+    const range = (low, high, positive, negative) => high <= 0
+        ? `${-high}–${-low}°${negative}`
+        : low >= 0 ? `${low}–${high}°${positive}` : `${-low}°${negative}–${high}°${positive}`;
+    return `${range(south, north, 'N', 'S')} ${range(west, east, 'E', 'W')}`;
+}
+
+function updateStatsPanel(stats) {
+    const b = stats.b_value;
+    document.getElementById('statsSummary').textContent =
+        `${stats.bbox ? 'In view' : 'Global'}, last ${stats.days} days: ${stats.count} events` +
+        (stats.energy_magnitude === null ? '' : ` · energy ${stats.energy.toExponential(2)} J (one M${stats.energy_magnitude.toFixed(1)})`);
+    document.getElementById('statsBValue').textContent = b
+        ? `b-value ${b.b.toFixed(2)} ± ${b.error.toFixed(2)} (Mc ${b.mc.toFixed(1)}, ${b.count} events)`
+        : 'b-value: too few events';
+
+    const cells = document.getElementById('statsCells');
+    cells.innerHTML = '';
+    stats.cells.slice(0, 3).forEach(cell => {
+        const div = document.createElement('div');
+        div.className = 'stats-cell';
+        div.textContent = `${cellLabel(cell.bbox)}: ${cell.count}` + (cell.b_value ? ` · b ${cell.b_value.b.toFixed(2)}` : '');
+        div.onclick = () => flyToLocation((cell.bbox[0] + cell.bbox[2]) / 2, (cell.bbox[1] + cell.bbox[3]) / 2);
+        cells.appendChild(div);
+    });
+    drawDailyCounts(stats.daily);
+}
+
+// Daily event counts as a bar sparkline
+function drawDailyCounts(daily) {
+    const canvas = document.getElementById('statsDaily');
+    const context = canvas.getContext('2d');
+    context.clearRect(0, 0, canvas.width, canvas.height);
+    if (!daily.length) return;
+    const max = Math.max(1, ...daily.map(day => day.count));
+    const width = canvas.width / daily.length;
+    context.fillStyle = '#4a90d9';
+    daily.forEach(({ count }, i) => {
+        const height = Math.max(count ? 1 : 0, count / max * canvas.height);
+        context.fillRect(i * width + 0.5, canvas.height - height, Math.max(width - 1, 1), height);
+    });
+    canvas.title = `${daily[0].date} to ${daily[daily.length - 1].date}, up to ${max} events per day`;
+}
+
+// Update the top earthquakes list for the current window: from the loaded catalog, or from
+// the server summary until the catalog arrives
+function updateEarthquakeData() {
+    const top10 = earthquakes.length || archiveMode
+        ? topByMagnitude(10).map(i => ({ mag: eqMag(i), place: eqPlace(i), lon: earthquakes.lon[i], lat: earthquakes.lat[i] }))
+        : (summary ? summary.top : []).map(([, mag, , place, , lon, lat]) => ({ mag: mag || 0, place: place || 'Unknown', lon, lat }));
+    const bar = document.getElementById('earthquakeBar');
+    bar.innerHTML = '<div class="bar-item"><strong>Top Earthquakes:</strong></div>';
+
+    top10.forEach(({ mag, place, lon, lat }) => {
+        const div = document.createElement('div');
+        div.className = 'bar-item';
+        div.innerText = `⭐ ${mag.toFixed(1)} - ${place}`;
+        div.onclick = () => flyToLocation(lon, lat);
+        bar.appendChild(div);
+    });
+
+    if (archiveMode) return;
+    const viewAll = document.createElement('div');
+    viewAll.className = 'bar-item';
+    viewAll.innerHTML = `<strong>View All</strong>`;
+    viewAll.onclick = () => openModal();
+    bar.appendChild(viewAll);
+}
+
+function zoomToEarthquakes() {
+    if (renderer.size > 0) {
+        viewer.camera.flyToBoundingSphere(Cesium.BoundingSphere.fromPoints(renderer.positions()), { duration: 0 });
+    }
+}
+
+function describeCluster([, , count, maxMag, , place]) {
+    return `
+        <b>${count} earthquake${count === 1 ? '' : 's'}</b><br>
+        <b>Largest:</b> ${maxMag === null ? 'Unknown' : maxMag.toFixed(1)} - ${escapeHtml(place || 'Unknown')}
+    `;
+}
+
+// Tooltip HTML, built on demand for the hovered event
+function describeEarthquake(i) {
+    return `
+        <b>Magnitude:</b> ${earthquakes.mag[i] || 0}<br>
+        <b>Depth:</b> ${eqDepth(i)} km<br>
+        <b>Location:</b> ${escapeHtml(eqPlace(i))}<br>
+        <b>Time:</b> ${eqTime(i)} UTC
+    `;
+}
+
+// Fly to a specific earthquake location
+function flyToEarthquake(index) {
+    if (!(index >= 0 && index < earthquakes.length)) {
+        console.error('Invalid earthquake index:', index);
+        return;
+    }
+    flyToLocation(earthquakes.lon[index], earthquakes.lat[index]);
+}
+
+function flyToLocation(lon, lat) {
+    viewer.camera.flyTo({
+        destination: Cesium.Cartesian3.fromDegrees(lon, lat, 200000),
+        duration: 2,
+        orientation: { pitch: Cesium.Math.toRadians(270) }
+    });
+}
+
+// Tooltip functionality
+const tooltip = document.getElementById('tooltip');
+const handler = new Cesium.ScreenSpaceEventHandler(viewer.scene.canvas);
+
+// Hover lookups run at most once per animation frame, for the latest mouse position. Events
+// are found through a 1° lon/lat hash of the loaded catalog per depth band and a screen-space
+// distance test of the few candidates near the cursor; GPU picking is only used when the
+// cursor region holds too many candidates to test. Tooltip HTML comes from a small cache
+// keyed by event.
+const hover = { position: null, frame: null, key: null, hash: null };
+// Ellipsoids through the depth band boundaries, where the cursor ray crosses each band
+const HOVER_BAND_ELLIPSOIDS = HOVER_DEPTH_BANDS.map(depth => new Cesium.Ellipsoid(
+    Cesium.Ellipsoid.WGS84.radii.x - depth * 1000, Cesium.Ellipsoid.WGS84.radii.y - depth * 1000, Cesium.Ellipsoid.WGS84.radii.z - depth * 1000
+));
+const tooltipCache = new Map();
+
+handler.setInputAction(movement => {
+    hover.position = Cesium.Cartesian2.clone(movement.endPosition, hover.position || new Cesium.Cartesian2());
+    if (hover.frame === null) hover.frame = requestAnimationFrame(updateHover);
+}, Cesium.ScreenSpaceEventType.MOUSE_MOVE);
+
+function updateHover() {
+    hover.frame = null;
+    const position = hover.position;
+    const cluster = clusterLayer.clusterAt(viewer.scene, position);
+    if (cluster !== undefined) {
+        const [lon, lat, count, maxMag] = cluster;
+        return showTooltip(`cluster:${lon}:${lat}:${count}:${maxMag}`, () => describeCluster(cluster), position);
+    }
+    const index = renderer.collection.show ? eventAt(position) : undefined;
+    if (index !== undefined) {
+        return showTooltip(`${earthquakes.ids[index]}:${earthquakes.mag[index]}:${earthquakes.depth[index]}`, () => describeEarthquake(index), position);
+    }
+    tooltip.style.display = 'none';
+    hover.key = null;
+}
+
+// Catalog index of the shown event under a window position, or undefined. Points are drawn at
+// their hypocentres, so each depth band is searched around the stretch of the cursor ray that
+// passes through it, and candidates are tested where they are drawn.
+function eventAt(position) {
+    const ray = viewer.camera.getPickRay(position);
+    if (!ray) return undefined;
+    if (!hover.hash || hover.hash.catalog !== earthquakes) hover.hash = buildHoverHash(earthquakes);
+    const candidates = [];
+    for (let band = 0; band + 1 < HOVER_DEPTH_BANDS.length; band++) {
+        if (hover.hash.starts[(band + 1) * 360 * 180] === hover.hash.starts[band * 360 * 180]) continue;
+        const top = Cesium.IntersectionTests.rayEllipsoid(ray, HOVER_BAND_ELLIPSOIDS[band]);
+        // The ray misses the band (and every deeper one) when it misses its top
+        if (!top) break;
+        // A ray grazing the band leaves it through its top again
+        const bottom = Cesium.IntersectionTests.rayEllipsoid(ray, HOVER_BAND_ELLIPSOIDS[band + 1]);
+        const near = Cesium.Ray.getPoint(ray, top.start);
+        const far = Cesium.Ray.getPoint(ray, bottom ? bottom.start : top.stop);
+        const center = Cesium.Cartesian3.midpoint(near, far, new Cesium.Cartesian3());
+        const cartographic = Cesium.Cartographic.fromCartesian(center);
+        if (!cartographic) continue;
+        const metersPerPixel = viewer.camera.getPixelSize(new Cesium.BoundingSphere(near, 0), viewer.scene.drawingBufferWidth, viewer.scene.drawingBufferHeight);
+        // Degrees shrink with depth: one is 111.32 km at the surface
+        const metersPerDegree = 111320 * (1 - HOVER_DEPTH_BANDS[band + 1] / 6371);
+        const radius = (HOVER_SEARCH_PX * metersPerPixel + Cesium.Cartesian3.distance(near, far) / 2) / metersPerDegree;
+        const lon = Cesium.Math.toDegrees(cartographic.longitude), lat = Cesium.Math.toDegrees(cartographic.latitude);
+        if (!hoverCandidates(band, lon, lat, radius, candidates)) return renderer.indexOf(viewer.scene.pick(position));
+    }
+
+    let best, bestDistance = Infinity;
+    for (const i of candidates) {
+        const point = renderer.points.get(earthquakes.ids[i]);
+        if (!point || !point.show) continue;
+        const screen = Cesium.SceneTransforms.wgs84ToWindowCoordinates(viewer.scene, point.position);
+        if (!screen) continue;
+        const distance = Math.hypot(screen.x - position.x, screen.y - position.y);
+        if (distance <= point.pixelSize / 2 + HOVER_TOLERANCE_PX && distance < bestDistance) {
+            best = point.eqIndex;
+            bestDistance = distance;
+        }
+    }
+    return best;
+}
+
+// Epicentre grid of the loaded catalog per depth band: event indices sorted by band and 1°
+// cell, with each cell's start (unknown depths are drawn at the surface, deeper events than
+// the last boundary go in the deepest band)
+function buildHoverHash(catalog) {
+    const cellCount = 360 * 180;
+    const cells = new Int32Array(catalog.length);
+    const starts = new Int32Array((HOVER_DEPTH_BANDS.length - 1) * cellCount + 1);
+    for (let i = 0; i < catalog.length; i++) {
+        let band = 0;
+        while (band + 2 < HOVER_DEPTH_BANDS.length && catalog.depth[i] >= HOVER_DEPTH_BANDS[band + 1]) band++;
+        const column = Math.min(359, Math.max(0, Math.floor(catalog.lon[i] + 180)));
+        const row = Math.min(179, Math.max(0, Math.floor(catalog.lat[i] + 90)));
+        cells[i] = band * cellCount + row * 360 + column;
+        starts[cells[i] + 1]++;
+    }
+    for (let cell = 0; cell < starts.length - 1; cell++) starts[cell + 1] += starts[cell];
+    const next = starts.slice(0, -1);
+    const order = new Int32Array(catalog.length);
+    for (let i = 0; i < catalog.length; i++) order[next[cells[i]]++] = i;
+    return { catalog, starts, order };
+}
+
+// Add the indices of the depth band's events in the cells within `radius` degrees of
+// (lon, lat) to `candidates`; false once there are more than HOVER_MAX_CANDIDATES
+function hoverCandidates(band, lon, lat, radius, candidates) {
+    const { starts, order } = hover.hash;
+    const first = band * 360 * 180;
+    const lonRadius = radius / Math.max(Math.cos(Cesium.Math.toRadians(lat)), 0.01);
+    const firstColumn = Math.floor(lon - lonRadius + 180);
+    const columns = Math.min(Math.floor(lon + lonRadius + 180) - firstColumn + 1, 360);
+    const firstRow = Math.max(0, Math.floor(lat - radius + 90));
+    const lastRow = Math.min(179, Math.floor(lat + radius + 90));
+    for (let row = firstRow; row <= lastRow; row++) {
+        for (let k = 0; k < columns; k++) {
+            const cell = first + row * 360 + ((firstColumn + k) % 360 + 360) % 360;
+            for (let j = starts[cell]; j < starts[cell + 1]; j++) candidates.push(order[j]);
+            if (candidates.length > HOVER_MAX_CANDIDATES) return false;
+        }
+    }
+    return true;
+}
+
+// Show the tooltip for `key`; the HTML is only rebuilt (or rewritten) when the hover target changes
+function showTooltip(key, describe, position) {
+    if (key !== hover.key) {
+        let html = tooltipCache.get(key);
+        if (html === undefined) {
+            html = describe();
+            if (tooltipCache.size >= TOOLTIP_CACHE_SIZE) tooltipCache.delete(tooltipCache.keys().next().value);
+        } else {
+            tooltipCache.delete(key);
+        }
+        tooltipCache.set(key, html);
+        tooltip.innerHTML = html;
+        hover.key = key;
+    }
+    tooltip.style.display = 'block';
+    updateTooltipPosition(position);
+}
+
+handler.setInputAction(() => {
+    tooltip.style.display = 'none';
+    hover.key = null;
+}, Cesium.ScreenSpaceEventType.LEFT_DOWN);
+
+// Update tooltip position based on mouse movement
+function updateTooltipPosition(position) {
+    const x = position.x + 15;
+    const y = position.y + 15;
+    tooltip.style.left = x + 'px';
+    tooltip.style.top = y + 'px';
+}
+
+// Modal functionality for viewing all earthquakes
+const modal = document.getElementById('modal');
+document.getElementById('closeModal').onclick = () => modal.style.display = 'none';
+window.onclick = event => { if (event.target == modal) modal.style.display = 'none'; }
+
+// Search location functionality: suggestions (by their label) are remembered so picking one
+// flies straight there; anything else is geocoded by the server
+const searchInput = document.getElementById('searchInput');
+const suggestions = new Map();
+let suggestTimer = null;
+let suggestController = null;
+
+document.getElementById('searchButton').onclick = searchLocation;
+searchInput.onkeydown = e => { if (e.key === 'Enter') searchLocation(); };
+searchInput.addEventListener('input', () => {
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(suggestLocations, AUTOCOMPLETE_DEBOUNCE_MS);
+});
+
+function geocode(query, autocomplete, signal) {
+    const params = new URLSearchParams({ q: query });
+    if (autocomplete) params.set('autocomplete', '1');
+    return fetch(`/api/geocode?${params}`, { signal }).then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        return response.json();
+    });
+}
+
+function placeLabel(place) {
+    return place.country ? `${place.name}, ${place.country}` : place.name;
+}
+
+function suggestLocations() {
+    const query = searchInput.value.trim();
+    if (query.length < AUTOCOMPLETE_MIN_LENGTH || suggestions.has(query)) return;
+    if (suggestController) suggestController.abort();
+    const controller = suggestController = new AbortController();
+    geocode(query, true, controller.signal)
+        .then(data => {
+            suggestions.clear();
+            data.results.forEach(place => suggestions.set(placeLabel(place), place));
+            document.getElementById('searchSuggestions').innerHTML =
+                Array.from(suggestions.keys(), label => `<option value="${escapeHtml(label)}"></option>`).join('');
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error fetching suggestions:', error);
+            }
+        });
+}
+
+function flyToPlace({ lon, lat }) {
+    viewer.camera.flyTo({
+        destination: Cesium.Cartesian3.fromDegrees(lon, lat, 2000000),
+        duration: 2,
+        orientation: { pitch: Cesium.Math.toRadians(270) }
+    });
+}
+
+function searchLocation() {
+    const query = searchInput.value.trim();
+    if (!query) return;
+    if (suggestions.has(query)) {
+        flyToPlace(suggestions.get(query));
+        return;
+    }
+    geocode(query, false)
+        .then(data => {
+            if (data.results.length) {
+                flyToPlace(data.results[0]);
+            } else {
+                alert('Location not found.');
+            }
+        })
+        .catch(error => {
+            console.error('Error searching location:', error);
+        });
+}
+
+// "View All" table: the server sorts, filters and pages the window; only the rows in
+// view (plus a small overscan) are in the DOM, with spacer rows standing in for the rest
+const tableScroll = document.getElementById('tableScroll');
+const tableBody = document.querySelector('#fullEqTable tbody');
+const tableState = { sort: 'mag', order: 'desc', filter: '', total: null, pages: new Map(), generation: 0, frame: null, filterTimer: null };
+
+function openModal() {
+    modal.style.display = 'block';
+    resetTable();
+}
+
+// Drop loaded pages and start again from the top (after a sort, filter or window change)
+function resetTable() {
+    tableState.generation++;
+    tableState.pages.clear();
+    tableState.total = null;
+    tableScroll.scrollTop = 0;
+    document.querySelectorAll('#fullEqTable th').forEach(th => {
+        const arrow = th.dataset.sort === tableState.sort ? (tableState.order === 'desc' ? ' ▼' : ' ▲') : '';
+        th.textContent = th.textContent.replace(/ [▲▼]$/, '') + arrow;
+    });
+    loadTablePage(0);
+    renderTable();
+}
+
+function loadTablePage(page) {
+    if (tableState.pages.has(page)) return;
+    tableState.pages.set(page, null);
+    const generation = tableState.generation;
+    const params = new URLSearchParams({
+        days: selectedDays, sort: tableState.sort, order: tableState.order,
+        offset: page * TABLE_PAGE_SIZE, limit: TABLE_PAGE_SIZE
+    });
+    if (tableState.filter) params.set('q', tableState.filter);
+    fetch(`/api/earthquakes/table?${params}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (generation !== tableState.generation) return;
+            tableState.total = data.total;
+            tableState.pages.set(page, data.rows);
+            renderTable();
+        })
+        .catch(error => {
+            if (generation === tableState.generation) tableState.pages.delete(page);
+            console.error('Error fetching earthquake table:', error);
+        });
+}
+
+function tableRow(k) {
+    const rows = tableState.pages.get(Math.floor(k / TABLE_PAGE_SIZE));
+    return rows ? rows[k % TABLE_PAGE_SIZE] : undefined;
+}
+
+function renderTable() {
+    const total = tableState.total;
+    if (total === null) {
+        tableBody.innerHTML = '<tr><td colspan="4">Loading...</td></tr>';
+        return;
+    }
+    if (total === 0) {
+        tableBody.innerHTML = '<tr><td colspan="4">No earthquake data available.</td></tr>';
+        return;
+    }
+    const first = Math.max(0, Math.floor(tableScroll.scrollTop / TABLE_ROW_HEIGHT) - TABLE_OVERSCAN);
+    const last = Math.min(total, Math.ceil((tableScroll.scrollTop + tableScroll.clientHeight) / TABLE_ROW_HEIGHT) + TABLE_OVERSCAN);
+    const html = [`<tr style="height:${first * TABLE_ROW_HEIGHT}px"></tr>`];
+    for (let k = first; k < last; k++) {
+        const row = tableRow(k);
+        if (row === undefined) {
+            loadTablePage(Math.floor(k / TABLE_PAGE_SIZE));
+            html.push('<tr><td colspan="4">...</td></tr>');
+            continue;
+        }
+        const [, mag, depth, place, time] = row;
+        html.push(`
+            <tr data-row="${k}">
+                <td>${mag === null ? 'Unknown' : mag.toFixed(1)}</td>
+                <td>${depth === null ? 'Unknown' : depth.toFixed(1)}</td>
+                <td>${escapeHtml(place || 'Unknown')}</td>
+                <td>${formatTime(time)} UTC</td>
+            </tr>
+        `);
+    }
+    html.push(`<tr style="height:${(total - last) * TABLE_ROW_HEIGHT}px"></tr>`);
+    tableBody.innerHTML = html.join('');
+}
+
+tableScroll.addEventListener('scroll', () => {
+    if (tableState.frame === null) {
+        tableState.frame = requestAnimationFrame(() => {
+            tableState.frame = null;
+            renderTable();
+        });
+    }
+});
+
+tableBody.addEventListener('click', event => {
+    const tr = event.target.closest('tr[data-row]');
+    const row = tr && tableRow(parseInt(tr.dataset.row));
+    if (row) flyToLocation(row[5], row[6]);
+});
+
+// Clicking a header sorts by it; clicking it again flips the direction
+document.querySelectorAll('#fullEqTable th').forEach(th => {
+    th.addEventListener('click', () => {
+        if (tableState.sort === th.dataset.sort) {
+            tableState.order = tableState.order === 'desc' ? 'asc' : 'desc';
+        } else {
+            tableState.sort = th.dataset.sort;
+            tableState.order = th.dataset.sort === 'place' ? 'asc' : 'desc';
+        }
+        resetTable();
+    });
+});
+
+document.getElementById('tableFilter').addEventListener('input', function() {
+    clearTimeout(tableState.filterTimer);
+    tableState.filterTimer = setTimeout(() => {
+        tableState.filter = this.value.trim();
+        resetTable();
+    }, FETCH_DEBOUNCE_MS);
+});
+
+// Ensure flyToEarthquake is accessible globally
+window.flyToEarthquake = flyToEarthquake;
+
+// Basemap selector functionality
+document.getElementById('basemapSelector').onchange = function() {
+    const selectedBasemap = this.value;
+    while (viewer.imageryLayers.length > 1) {
+        viewer.imageryLayers.remove(viewer.imageryLayers.get(1));
+    }
+    heatmapLayer = null;
+    switch(selectedBasemap) {
+        case 'OpenStreetMap':
+            viewer.imageryLayers.addImageryProvider(new Cesium.OpenStreetMapImageryProvider({
+                url : 'https://a.tile.openstreetmap.org/'
+            }));
+            break;
+        case 'Cesium World Imagery':
+        default:
+            viewer.imageryLayers.addImageryProvider(new Cesium.IonImageryProvider({ assetId: 2 }));
+    }
+    updateHeatmapLayer();
+};
+
+// Initialize the basemap selector to default
+document.getElementById('basemapSelector').value = 'Cesium World Imagery';
+
+// Time-lapse playback of the loaded events: they are revealed in time order by toggling show
+// flags on the points already drawn, so frames never create or destroy primitives. Newly
+// revealed events are enlarged and shrink back over PLAYBACK_FADE_MS of timeline time; only
+// that recent slice is resized each frame.
+function startPlayback() {
+    if (!playback.active) {
+        playback.active = true;
+        playback.start = archiveMode && earthquakes.length ? earthquakes.time[0] : windowStart(selectedDays);
+        playback.end = archiveMode && earthquakes.length ? earthquakes.time[earthquakes.length - 1] : Date.now();
+        playback.time = playback.start;
+        playback.upto = playback.fadeFrom = visibleStart;
+        if (heatmapEnabled) document.getElementById('toggleHeatmap').click();
+        document.getElementById('playbackStop').disabled = false;
+        updateView();
+        loadTimeline();
+        seekPlayback(playback.start);
+    }
+    if (playback.time >= playback.end) playback.time = playback.start;
+    playback.playing = true;
+    playback.last = null;
+    document.getElementById('playbackToggle').innerText = '❚❚ Pause';
+    if (playback.frame === null) playback.frame = requestAnimationFrame(playbackFrame);
+}
+
+function pausePlayback() {
+    playback.playing = false;
+    document.getElementById('playbackToggle').innerText = '▶ Play';
+}
+
+function stopPlayback() {
+    if (!playback.active) return;
+    pausePlayback();
+    playback.active = false;
+    cancelAnimationFrame(playback.frame);
+    playback.frame = null;
+    renderer.unreveal();
+    document.getElementById('playbackStop').disabled = true;
+    document.getElementById('playbackScrub').value = 1000;
+    document.getElementById('playbackTime').textContent = '';
+    updateView();
+}
+
+// Advance by the wall-clock time since the last frame times the selected speed (hours per second)
+function playbackFrame(now) {
+    playback.frame = null;
+    if (!playback.playing) return;
+    if (playback.last !== null) {
+        const speed = parseFloat(document.getElementById('playbackSpeed').value);
+        seekPlayback(Math.min(playback.time + (now - playback.last) * speed * 3600, playback.end));
+    } else {
+        seekPlayback(playback.time);
+    }
+    playback.last = now;
+    if (playback.time >= playback.end) {
+        pausePlayback();
+    } else {
+        playback.frame = requestAnimationFrame(playbackFrame);
+    }
+}
+
+// Show the events up to `time`, enlarging those revealed within the fade period
+function seekPlayback(time) {
+    playback.time = time;
+    const upto = Math.max(visibleStart, lowerBound(earthquakes.time, time + 1));
+    const fadeFrom = Math.max(visibleStart, lowerBound(earthquakes.time, time - PLAYBACK_FADE_MS));
+    renderer.reveal(earthquakes, upto);
+    renderer.emphasize(earthquakes, playback.fadeFrom, Math.min(playback.upto, earthquakes.length), () => 0);
+    renderer.emphasize(earthquakes, fadeFrom, upto, i => PLAYBACK_PULSE * (1 - (time - earthquakes.time[i]) / PLAYBACK_FADE_MS));
+    playback.upto = upto;
+    playback.fadeFrom = fadeFrom;
+    const span = playback.end - playback.start;
+    document.getElementById('playbackScrub').value = span > 0 ? Math.round(1000 * (time - playback.start) / span) : 1000;
+    document.getElementById('playbackTime').textContent = formatTime(time);
+}
+
+// Activity strip behind the scrubber: events per bucket from the server's time-bucket index of
+// the window, coloured by each bucket's largest magnitude (archive ranges have no strip)
+function loadTimeline() {
+    const canvas = document.getElementById('playbackActivity');
+    const context = canvas.getContext('2d');
+    context.clearRect(0, 0, canvas.width, canvas.height);
+    if (archiveMode) return;
+    fetch(`/api/timeline?days=${selectedDays}&bucket=${PLAYBACK_BUCKET_MINUTES}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(({ start, bucket, counts, max_mag }) => {
+            const peak = Math.max(1, ...counts);
+            const scale = canvas.width / (playback.end - playback.start);
+            counts.forEach((count, k) => {
+                if (!count) return;
+                const x = (start + k * bucket - playback.start) * scale;
+                const height = Math.max(1, canvas.height * Math.sqrt(count / peak));
+                context.fillStyle = getColor(max_mag[k] || 0).withAlpha(1).toCssColorString();
+                context.fillRect(x, canvas.height - height, Math.max(1, bucket * scale), height);
+            });
+        })
+        .catch(error => {
+            console.error('Error fetching timeline:', error);
+        });
+}
+
+document.getElementById('playbackToggle').addEventListener('click', () => {
+    if (playback.playing) pausePlayback(); else startPlayback();
+});
+document.getElementById('playbackStop').addEventListener('click', stopPlayback);
+
+// Scrubbing starts paused playback at the chosen point
+document.getElementById('playbackScrub').addEventListener('input', function() {
+    if (!playback.active) {
+        startPlayback();
+        pausePlayback();
+    }
+    seekPlayback(playback.start + (playback.end - playback.start) * parseInt(this.value) / 1000);
+});
+
+// Event listeners for date range and heatmap toggle
+// The window is filtered locally at most once per frame; the refetch is debounced
+document.getElementById('dateRange').addEventListener('input', function() {
+    stopPlayback();
+    selectedDays = parseInt(this.value);
+    document.getElementById('dateRangeValue').innerText = selectedDays;
+    if (windowFrame === null) {
+        windowFrame = requestAnimationFrame(() => {
+            windowFrame = null;
+            setWindow(selectedDays);
+        });
+    }
+    scheduleFetch();
+});
+
+document.getElementById('toggleHeatmap').addEventListener('click', function() {
+    heatmapEnabled = !heatmapEnabled;
+    this.innerText = heatmapEnabled ? 'Disable Heatmap' : 'Enable Heatmap';
+    updateHeatmapLayer();
+});
+
+document.getElementById('archiveLoad').addEventListener('click', loadArchive);
+document.getElementById('archiveExit').addEventListener('click', exitArchive);
+
+// The heatmap is an imagery layer of server-rendered density tiles for the date window. Tiles
+// are cached by the server and revalidated by the browser, so after the window or the data
+// changes the layer is simply recreated.
+function updateHeatmapLayer() {
+    if (heatmapLayer) {
+        viewer.imageryLayers.remove(heatmapLayer);
+        heatmapLayer = null;
+    }
+    if (heatmapEnabled) {
+        heatmapLayer = viewer.imageryLayers.addImageryProvider(new Cesium.UrlTemplateImageryProvider({
+            url: `/tiles/heat/{z}/{x}/{y}.png?days=${selectedDays}&weight=${HEATMAP_WEIGHT}`,
+            maximumLevel: HEATMAP_MAX_LEVEL
+        }));
+    }
+    updateLayerVisibility();
+}
+
+// Points show below the cluster height; the heatmap replaces both
+function updateLayerVisibility() {
+    renderer.collection.show = !heatmapEnabled && !clusterMode;
+    clusterLayer.show = !heatmapEnabled;
+}
+
+// Offline cache (static/sw.js): repeat visits are drawn from stored payloads while they are
+// refetched, and the worker reports payloads that changed. A stored catalog with a cursor
+// catches up through the live feed like any other.
+if ('serviceWorker' in navigator) {
+    if (OFFLINE_CACHE) {
+        navigator.serviceWorker.register('/sw.js').catch(error => {
+            console.error('Error registering service worker:', error);
+        });
+        navigator.serviceWorker.addEventListener('message', ({ data }) => {
+            if (data.type === 'updated') reloadPayload(data.url);
+        });
+    } else {
+        navigator.serviceWorker.getRegistrations().then(registrations => {
+            registrations.forEach(registration => registration.unregister());
+        });
+    }
+}
+
+// Reload a payload the service worker found changed, if it is still on screen
+function reloadPayload(key) {
+    if (archiveMode) return;
+    const url = new URL(key, location.origin);
+    const current = parseInt(url.searchParams.get('days')) === selectedDays;
+    if (url.pathname === '/api/earthquakes') {
+        if (catalogCursor !== null) return;
+        if (url.searchParams.has('bbox')) {
+            loadViewport();
+        } else {
+            fetchEarthquakes();
+        }
+    } else if (url.pathname === '/api/summary' && current) {
+        loadSummary();
+    } else if (url.pathname === '/api/stats' && current) {
+        loadStats();
+    } else if (url.pathname === '/api/clusters' && current && clusterMode) {
+        loadClusters();
+    } else if (url.pathname === '/api/timeline' && current && playback.active) {
+        loadTimeline();
+    }
+}
+
+// Fetch initial earthquake data; the small summary usually arrives first and fills the bar
+loadSummary();
+fetchEarthquakes();
+updateView();
+loadArchivePartitions();
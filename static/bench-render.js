@@ -0,0 +1,154 @@
+// Frame-time benchmark for PointRenderer with a synthetic catalog.
+// Open /bench/render?n=100000&seconds=10 (seconds per phase); results are shown
+// on the page and stored in window.benchResult for automated runs.
+
+const params = new URLSearchParams(location.search);
+const count = parseInt(params.get('n') || '100000');
+const seconds = parseFloat(params.get('seconds') || '10');
+
+const viewer = new Cesium.Viewer('cesiumContainer', {
+    baseLayerPicker: false,
+    animation: false,
+    timeline: false,
+    geocoder: false,
+    homeButton: false,
+    sceneModePicker: false,
+    navigationHelpButton: false,
+    fullscreenButton: false,
+    infoBox: false,
+    selectionIndicator: false
+});
+
+// Deterministic PRNG so runs are comparable
+function mulberry32(seed) {
+    return () => {
+        seed |= 0;
+        seed = seed + 0x6D2B79F5 | 0;
+        let t = Math.imul(seed ^ seed >>> 15, 1 | seed);
+        t = t + Math.imul(t ^ t >>> 7, 61 | t) ^ t;
+        return ((t ^ t >>> 14) >>> 0) / 4294967296;
+    };
+}
+
+// Same column layout as decodeCatalog(); magnitudes follow Gutenberg-Richter (b = 1)
+function syntheticCatalog(n, seed) {
+    const random = mulberry32(seed);
+    const now = Date.now();
+    const catalog = {
+        length: n,
+        lon: new Float32Array(n),
+        lat: new Float32Array(n),
+        depth: new Float32Array(n),
+        mag: new Float32Array(n),
+        time: new Float64Array(n),
+        positions: new Float32Array(n * 3),
+        placeIndex: new Uint32Array(n),
+        places: ['Synthetic'],
+        ids: new Array(n)
+    };
+    for (let i = 0; i < n; i++) {
+        catalog.ids[i] = `bench${i}`;
+        catalog.lon[i] = random() * 360 - 180;
+        catalog.lat[i] = Math.asin(random() * 2 - 1) * 180 / Math.PI;
+        catalog.depth[i] = random() * 600;
+        catalog.mag[i] = Math.min(-Math.log10(1 - random()), 9);
+        catalog.time[i] = now - (n - i) * 1000;
+        const position = Cesium.Cartesian3.fromDegrees(catalog.lon[i], catalog.lat[i], -1000 * catalog.depth[i]);
+        catalog.positions.set([position.x, position.y, position.z], 3 * i);
+    }
+    return catalog;
+}
+
+function style(catalog, i) {
+    const mag = catalog.mag[i];
+    return {
+        pixelSize: Math.max(6 + mag * 2, 6),
+        color: mag >= 4 ? Cesium.Color.RED.withAlpha(0.6) : Cesium.Color.YELLOW.withAlpha(0.6),
+        outlineColor: Cesium.Color.BLACK,
+        outlineWidth: 1
+    };
+}
+
+function timed(fn) {
+    const start = performance.now();
+    fn();
+    return performance.now() - start;
+}
+
+function percentile(sorted, p) {
+    return sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * p))];
+}
+
+function report(results) {
+    window.benchResult = results;
+    document.getElementById('results').textContent = JSON.stringify(results, null, 2);
+}
+
+const catalog = syntheticCatalog(count, 1);
+const renderer = new PointRenderer(viewer.scene, style);
+const results = { count };
+
+results.initialSyncMs = timed(() => renderer.sync(catalog, 0, count));
+
+// Window moves: drop and re-add the oldest 10%
+const tenth = Math.floor(count / 10);
+results.removeTenthMs = timed(() => renderer.remove(catalog, 0, tenth));
+results.addTenthMs = timed(() => renderer.add(catalog, 0, tenth));
+
+// Dataset refresh where 1% of events were revised and 1% are new
+const refreshed = syntheticCatalog(count, 1);
+for (let i = 0; i < count; i += 100) refreshed.mag[i] += 0.5;
+for (let i = 1; i < count; i += 100) refreshed.ids[i] = `bench-new${i}`;
+results.syncRefreshMs = timed(() => renderer.sync(refreshed, 0, count));
+
+// Frame statistics over `seconds` of rendering, calling step(progress) before each frame
+function measureFrames(step) {
+    return new Promise(resolve => {
+        const frames = [];
+        const begin = performance.now();
+        let last = null;
+        const removeRender = viewer.scene.postRender.addEventListener(() => {
+            const now = performance.now();
+            if (last !== null) frames.push(now - last);
+            last = now;
+            step(Math.min((now - begin) / (seconds * 1000), 1));
+        });
+        setTimeout(() => {
+            removeRender();
+            const sorted = frames.slice().sort((a, b) => a - b);
+            const mean = frames.reduce((sum, value) => sum + value, 0) / Math.max(frames.length, 1);
+            resolve({
+                frames: frames.length,
+                fps: 1000 / mean,
+                frameMs: { mean, p50: percentile(sorted, 0.5), p95: percentile(sorted, 0.95), p99: percentile(sorted, 0.99), max: sorted[sorted.length - 1] }
+            });
+        }, seconds * 1000);
+    });
+}
+
+report(Object.assign({ status: 'running' }, results));
+
+// Frame times while the camera orbits the globe, then during a time-lapse playback that
+// reveals the whole catalog once, enlarging the events of the last 2% of the timeline
+measureFrames(() => viewer.camera.rotate(Cesium.Cartesian3.UNIT_Z, 0.003))
+    .then(orbit => {
+        Object.assign(results, orbit);
+        report(Object.assign({ status: 'running' }, results));
+        const fade = Math.ceil(count / 50);
+        let fadeFrom = 0, upto = 0;
+        renderer.reveal(refreshed, 0);
+        return measureFrames(progress => {
+            const to = Math.floor(progress * count);
+            const from = Math.max(0, to - fade);
+            renderer.reveal(refreshed, to);
+            renderer.emphasize(refreshed, fadeFrom, upto, () => 0);
+            renderer.emphasize(refreshed, from, to, i => 1.5 * (1 - (to - i) / fade));
+            fadeFrom = from;
+            upto = to;
+        });
+    })
+    .then(playback => {
+        renderer.unreveal();
+        results.playback = playback;
+        report(Object.assign(results, { status: 'done' }));
+    });
@@ -0,0 +1,221 @@
+// Batched earthquake renderer: every event is a point in one PointPrimitiveCollection,
+// tracked in an id -> primitive map so dataset and window changes are applied as
+// add/update/remove diffs instead of full rebuilds.
+//
+// `style(catalog, i)` returns { color, pixelSize, outlineColor, outlineWidth } for event i.
+class PointRenderer {
+    constructor(scene, style) {
+        this.collection = scene.primitives.add(new Cesium.PointPrimitiveCollection());
+        this.points = new Map();
+        this.style = style;
+        this.catalog = null;
+        this.revealed = null;
+    }
+
+    get size() {
+        return this.points.size;
+    }
+
+    // Show events [from, to) of `catalog`, adding new ones and updating moved or revised ones
+    add(catalog, from, to) {
+        this.catalog = catalog;
+        for (let i = from; i < to; i++) {
+            const id = catalog.ids[i];
+            const point = this.points.get(id);
+            if (point) {
+                this._update(point, catalog, i);
+            } else {
+                this.points.set(id, this._create(catalog, i));
+            }
+        }
+    }
+
+    // Hide events [from, to) of `catalog`
+    remove(catalog, from, to) {
+        for (let i = from; i < to; i++) {
+            const id = catalog.ids[i];
+            const point = this.points.get(id);
+            if (point) {
+                this.collection.remove(point);
+                this.points.delete(id);
+            }
+        }
+    }
+
+    // Show exactly events [from, to) of a new catalog: ids that are no longer present are
+    // removed, existing points are updated in place and only new ids are created
+    sync(catalog, from, to) {
+        const wanted = new Set();
+        for (let i = from; i < to; i++) wanted.add(catalog.ids[i]);
+        for (const [id, point] of this.points) {
+            if (!wanted.has(id)) {
+                this.collection.remove(point);
+                this.points.delete(id);
+            }
+        }
+        this.add(catalog, from, to);
+    }
+
+    clear() {
+        this.collection.removeAll();
+        this.points.clear();
+        this.revealed = null;
+    }
+
+    // Playback: show only the shown events before catalog index `to` by toggling show flags.
+    // Only events between the previous and the new position are touched, unless the catalog
+    // changed since the last call, in which case every point is reset once.
+    reveal(catalog, to) {
+        if (!this.revealed || this.revealed.catalog !== catalog) {
+            for (const point of this.points.values()) {
+                point.show = point.eqIndex < to;
+                point.pixelSize = point.eqSize;
+            }
+        } else {
+            const from = this.revealed.to;
+            const [low, high, show] = to < from ? [to, from, false] : [from, to, true];
+            for (let i = low; i < high; i++) {
+                const point = this.points.get(catalog.ids[i]);
+                if (point) point.show = show;
+            }
+        }
+        this.revealed = { catalog, to };
+    }
+
+    // End playback: every point is shown again at its normal size
+    unreveal() {
+        for (const point of this.points.values()) {
+            point.show = true;
+            point.pixelSize = point.eqSize;
+        }
+        this.revealed = null;
+    }
+
+    // Enlarge events [from, to) by a factor of 1 + strength(i); a strength of 0 restores the
+    // normal size. Only sizes change, so each frame is a batched attribute update.
+    emphasize(catalog, from, to, strength) {
+        for (let i = from; i < to; i++) {
+            const point = this.points.get(catalog.ids[i]);
+            if (point) point.pixelSize = point.eqSize * (1 + strength(i));
+        }
+    }
+
+    // Catalog index of a picked primitive, or undefined
+    indexOf(picked) {
+        if (picked && picked.primitive && picked.primitive.eqIndex !== undefined && this.points.get(picked.id) === picked.primitive) {
+            return picked.primitive.eqIndex;
+        }
+        return undefined;
+    }
+
+    positions() {
+        return Array.from(this.points.values(), point => point.position);
+    }
+
+    // Positions come precomputed from the server as ECEF hypocenters
+    _position(catalog, i) {
+        return Cesium.Cartesian3.fromArray(catalog.positions, 3 * i);
+    }
+
+    _create(catalog, i) {
+        const point = this.collection.add(Object.assign({
+            id: catalog.ids[i],
+            position: this._position(catalog, i)
+        }, this.style(catalog, i)));
+        point.eqIndex = i;
+        point.eqSize = point.pixelSize;
+        point.eqX = catalog.positions[3 * i];
+        point.eqY = catalog.positions[3 * i + 1];
+        point.eqZ = catalog.positions[3 * i + 2];
+        point.eqMag = catalog.mag[i];
+        return point;
+    }
+
+    // Only touch attributes that changed, so unchanged points stay clean in the GPU buffers
+    _update(point, catalog, i) {
+        point.eqIndex = i;
+        const x = catalog.positions[3 * i], y = catalog.positions[3 * i + 1], z = catalog.positions[3 * i + 2];
+        if (point.eqX !== x || point.eqY !== y || point.eqZ !== z) {
+            point.eqX = x;
+            point.eqY = y;
+            point.eqZ = z;
+            point.position = new Cesium.Cartesian3(x, y, z);
+        }
+        if (!(point.eqMag === catalog.mag[i] || (isNaN(point.eqMag) && isNaN(catalog.mag[i])))) {
+            point.eqMag = catalog.mag[i];
+            Object.assign(point, this.style(catalog, i));
+            point.eqSize = point.pixelSize;
+        }
+    }
+}
+
+// Cluster markers: a point sized by event count and coloured by the largest magnitude,
+// with the count as a label. Cluster sets are small, so they are replaced wholesale.
+class ClusterLayer {
+    constructor(scene, color) {
+        this.points = scene.primitives.add(new Cesium.PointPrimitiveCollection());
+        this.labels = scene.primitives.add(new Cesium.LabelCollection());
+        this.color = color;
+        this.clusters = [];
+    }
+
+    // `clusters` rows are [lon, lat, count, maxMag, repId, repPlace, repLon, repLat]
+    set(clusters) {
+        this.clear();
+        this.clusters = clusters;
+        clusters.forEach(([lon, lat, count, maxMag], i) => {
+            const position = Cesium.Cartesian3.fromDegrees(lon, lat);
+            const point = this.points.add({
+                position,
+                pixelSize: Math.min(12 + 6 * Math.log10(count), 40),
+                color: this.color(maxMag || 0),
+                outlineColor: Cesium.Color.WHITE,
+                outlineWidth: 1
+            });
+            point.clusterIndex = i;
+            if (count > 1) {
+                this.labels.add({
+                    position,
+                    text: String(count),
+                    font: '12px sans-serif',
+                    fillColor: Cesium.Color.BLACK,
+                    horizontalOrigin: Cesium.HorizontalOrigin.CENTER,
+                    verticalOrigin: Cesium.VerticalOrigin.CENTER,
+                    disableDepthTestDistance: Number.POSITIVE_INFINITY
+                });
+            }
+        });
+    }
+
+    set show(value) {
+        this.points.show = value;
+        this.labels.show = value;
+    }
+
+    clear() {
+        this.points.removeAll();
+        this.labels.removeAll();
+        this.clusters = [];
+    }
+
+    // Cluster row drawn under a window position, found by projecting the (few) markers that
+    // face the camera
+    clusterAt(scene, position) {
+        if (!this.points.show) return undefined;
+        let best, bestDistance = Infinity;
+        const toCamera = new Cesium.Cartesian3();
+        for (let i = 0; i < this.points.length; i++) {
+            const point = this.points.get(i);
+            Cesium.Cartesian3.subtract(scene.camera.positionWC, point.position, toCamera);
+            if (Cesium.Cartesian3.dot(toCamera, point.position) <= 0) continue;
+            const screen = Cesium.SceneTransforms.wgs84ToWindowCoordinates(scene, point.position);
+            if (!screen) continue;
+            const distance = Math.hypot(screen.x - position.x, screen.y - position.y);
+            if (distance <= point.pixelSize / 2 && distance < bestDistance) {
+                best = this.clusters[point.clusterIndex];
+                bestDistance = distance;
+            }
+        }
+        return best;
+    }
+}
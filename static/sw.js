@@ -0,0 +1,225 @@
+// Offline cache, served as /sw.js after the OFFLINE_CACHE, SHELL_URLS and SHELL_VERSION
+// definitions. The page shell is precached in Cache Storage and answered from it while the
+// page itself is revalidated in the background. API payloads are kept in IndexedDB keyed by
+// path and query: a repeat request is answered from there at once and refetched in the
+// background, and the page is told when the refetch brought something new. Store-backed
+// catalogs carry their sync cursor, so the page catches up with deltas from the live feed
+// instead of reloading them. Requests made with `cache: 'no-cache'` go to the network first.
+
+const SHELL_CACHE = `shell-${SHELL_VERSION}`;
+// Cesium's workers and assets are fetched on demand from its versioned (immutable) release URL
+const RUNTIME_CACHE = 'cesium-runtime';
+const CESIUM_URL = SHELL_URLS.find(url => url.endsWith('/Cesium.js')).replace(/Cesium\.js$/, '');
+const RUNTIME_MAX_ENTRIES = 300;
+
+const PAYLOAD_PATHS = ['/api/earthquakes', '/api/summary', '/api/stats', '/api/clusters', '/api/timeline'];
+const PAYLOAD_DB = 'eq-payloads';
+const PAYLOAD_MAX_ENTRIES = 100;
+const PAYLOAD_MAX_BYTES = 64 * 1024 * 1024;
+// Payloads younger than this (or than their max-age) are served without a background refetch;
+// catalogs with a sync cursor are refetched less often since the live feed keeps the page current
+const REVALIDATE_AFTER_MS = 10 * 1000;
+const CURSOR_REVALIDATE_AFTER_MS = 10 * 60 * 1000;
+// Response headers kept with a payload (the body is stored decoded)
+const PAYLOAD_HEADERS = ['content-type', 'cache-control', 'x-catalog-cursor', 'x-catalog-count'];
+
+self.addEventListener('install', event => {
+    if (!OFFLINE_CACHE) {
+        self.skipWaiting();
+        return;
+    }
+    // Cesium comes from another origin without CORS, so it is stored as an opaque response
+    const local = SHELL_URLS.filter(url => url.startsWith('/'));
+    const remote = SHELL_URLS.filter(url => !url.startsWith('/'));
+    event.waitUntil(caches.open(SHELL_CACHE).then(cache => Promise.all([
+        cache.addAll(local),
+        ...remote.map(url => fetch(url, { mode: 'no-cors' }).then(response => cache.put(url, response)).catch(() => {}))
+    ])).then(() => self.skipWaiting()));
+});
+
+// Drop the shell caches of earlier versions; with OFFLINE_CACHE off, drop everything and leave
+self.addEventListener('activate', event => {
+    event.waitUntil(caches.keys().then(names => Promise.all(names
+        .filter(name => !OFFLINE_CACHE || (name.startsWith('shell-') && name !== SHELL_CACHE))
+        .map(name => caches.delete(name))
+    )).then(() => {
+        if (OFFLINE_CACHE) return self.clients.claim();
+        return new Promise(resolve => {
+            const request = indexedDB.deleteDatabase(PAYLOAD_DB);
+            request.onsuccess = request.onerror = request.onblocked = resolve;
+        }).then(() => self.registration.unregister());
+    }));
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (!OFFLINE_CACHE || request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (url.origin === self.location.origin) {
+        if (request.mode === 'navigate' && url.pathname === '/') {
+            event.respondWith(shellResponse(event, '/'));
+        } else if (url.pathname.startsWith('/static/')) {
+            event.respondWith(shellResponse(event, url.pathname));
+        } else if (PAYLOAD_PATHS.includes(url.pathname) && !url.searchParams.has('since')) {
+            event.respondWith(payloadResponse(event, url.pathname + url.search));
+        }
+    } else if (request.url.startsWith(CESIUM_URL)) {
+        event.respondWith(cesiumResponse(request));
+    }
+});
+
+// The page is revalidated in the background; content-hashed assets never change
+function shellResponse(event, key) {
+    return caches.open(SHELL_CACHE).then(cache => cache.match(key).then(cached => {
+        const network = () => fetch(event.request).then(response => {
+            if (response.ok) return cache.put(key, response.clone()).then(() => response);
+            return response;
+        });
+        if (!cached) return network();
+        if (key === '/') event.waitUntil(network().catch(() => {}));
+        return cached;
+    }));
+}
+
+function cesiumResponse(request) {
+    return caches.open(RUNTIME_CACHE).then(cache => cache.match(request).then(cached => cached || fetch(request).then(response => {
+        if (response.ok || response.type === 'opaque') {
+            cache.put(request, response.clone()).then(() => trimCache(cache, RUNTIME_MAX_ENTRIES));
+        }
+        return response;
+    })));
+}
+
+// Oldest entries first (cache keys keep insertion order)
+function trimCache(cache, maxEntries) {
+    return cache.keys().then(keys => Promise.all(keys.slice(0, Math.max(0, keys.length - maxEntries)).map(key => cache.delete(key))));
+}
+
+// Stale-while-revalidate from IndexedDB; misses and no-cache requests go to the network and
+// store the answer, falling back to a stored copy when the network fails
+function payloadResponse(event, key) {
+    const fresh = event.request.cache === 'no-cache' || event.request.cache === 'reload';
+    return readPayload(key).catch(() => null).then(entry => {
+        if (!entry || fresh) {
+            return fetch(event.request).then(response => {
+                if (response.ok) event.waitUntil(response.clone().arrayBuffer().then(body => writePayload(key, response, body)));
+                return response;
+            }, error => {
+                if (entry) return toResponse(entry);
+                throw error;
+            });
+        }
+        if (Date.now() - entry.stored > revalidateAfter(entry)) {
+            event.waitUntil(revalidate(key, entry).catch(() => {}));
+        }
+        return toResponse(entry);
+    });
+}
+
+function revalidateAfter(entry) {
+    const headers = new Map(entry.headers);
+    if (headers.has('x-catalog-cursor')) return CURSOR_REVALIDATE_AFTER_MS;
+    const maxAge = /max-age=(\d+)/.exec(headers.get('cache-control') || '');
+    return Math.max(REVALIDATE_AFTER_MS, maxAge ? parseInt(maxAge[1]) * 1000 : 0);
+}
+
+// Refetch a payload; if it changed and has no cursor to follow, tell the pages to reload it
+function revalidate(key, entry) {
+    return fetch(key).then(response => {
+        if (!response.ok) return;
+        return response.arrayBuffer().then(body => writePayload(key, response, body).then(() => {
+            if (new Map(entry.headers).has('x-catalog-cursor') || sameBytes(entry.body, body)) return;
+            return self.clients.matchAll({ type: 'window' }).then(clients => {
+                clients.forEach(client => client.postMessage({ type: 'updated', url: key }));
+            });
+        }));
+    });
+}
+
+function sameBytes(a, b) {
+    if (a.byteLength !== b.byteLength) return false;
+    const x = new Uint8Array(a), y = new Uint8Array(b);
+    for (let i = 0; i < x.length; i++) {
+        if (x[i] !== y[i]) return false;
+    }
+    return true;
+}
+
+function toResponse(entry) {
+    return new Response(entry.body, { status: 200, headers: entry.headers });
+}
+
+// Payload database: `bodies` holds the stored responses, `entries` their size and last use,
+// indexed by last use so the least recently used are evicted first
+function openPayloads() {
+    if (!openPayloads.db) {
+        openPayloads.db = new Promise((resolve, reject) => {
+            const request = indexedDB.open(PAYLOAD_DB, 1);
+            request.onupgradeneeded = () => {
+                const db = request.result;
+                db.createObjectStore('bodies');
+                db.createObjectStore('entries', { keyPath: 'key' }).createIndex('used', 'used');
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+        openPayloads.db.catch(() => { openPayloads.db = null; });
+    }
+    return openPayloads.db;
+}
+
+function done(transaction) {
+    return new Promise((resolve, reject) => {
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+// Stored payload { body, headers, stored }, or null; a hit marks the entry as used
+function readPayload(key) {
+    return openPayloads().then(db => {
+        const transaction = db.transaction(['bodies', 'entries'], 'readwrite');
+        let payload = null;
+        transaction.objectStore('bodies').get(key).onsuccess = event => {
+            payload = event.target.result || null;
+        };
+        const entries = transaction.objectStore('entries');
+        entries.get(key).onsuccess = event => {
+            const entry = event.target.result;
+            if (entry) {
+                entry.used = Date.now();
+                entries.put(entry);
+            }
+        };
+        return done(transaction).then(() => payload);
+    });
+}
+
+// Store a payload, then evict the least recently used ones beyond the entry and byte bounds
+function writePayload(key, response, body) {
+    const headers = PAYLOAD_HEADERS.filter(name => response.headers.has(name)).map(name => [name, response.headers.get(name)]);
+    const now = Date.now();
+    return openPayloads().then(db => {
+        const transaction = db.transaction(['bodies', 'entries'], 'readwrite');
+        const bodies = transaction.objectStore('bodies');
+        const entries = transaction.objectStore('entries');
+        bodies.put({ body, headers, stored: now }, key);
+        entries.put({ key, size: body.byteLength, used: now });
+
+        let count = 0, bytes = 0;
+        entries.index('used').openCursor(null, 'prev').onsuccess = event => {
+            const cursor = event.target.result;
+            if (!cursor) return;
+            count += 1;
+            bytes += cursor.value.size;
+            if (cursor.value.key !== key && (count > PAYLOAD_MAX_ENTRIES || bytes > PAYLOAD_MAX_BYTES)) {
+                bodies.delete(cursor.value.key);
+                cursor.delete();
+                count -= 1;
+                bytes -= cursor.value.size;
+            }
+            cursor.continue();
+        };
+        return done(transaction);
+    });
+}
@@ -0,0 +1,25 @@
+# tests/conftest.py
+#
+# The app is a single module with a dash in its name, so it is imported by path;
+# bench/ is on the path for the fake USGS service.
+
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'bench')]
+os.environ.setdefault('CESIUM_ION_ACCESS_TOKEN', 'test-token')
+os.environ.setdefault('INGEST_INTERVAL', '0')
+
+
+@pytest.fixture(scope='session')
+def eq():
+    return importlib.import_module('3D-EQ')
+
+
+@pytest.fixture
+def store(eq, tmp_path):
+    return eq.EventStore(str(tmp_path / 'events.sqlite3'))
@@ -0,0 +1,74 @@
+import numpy as np
+
+T = 1_700_000_000_000
+DAY = 86400000
+
+
+def random_rows(rng, count):
+    return [
+        (f"ev{i}", float(lon), float(lat), 10.0, float(mag), int(T - age), f"place {i}")
+        for i, (lon, lat, mag, age) in enumerate(zip(
+            rng.uniform(-180, 180, count), rng.uniform(-90, 90, count), np.round(rng.uniform(0, 8, count), 1), rng.integers(0, 30 * DAY, count)
+        ))
+    ]
+
+
+def counts(pyramid, z, start_day, bbox=None):
+    return sorted((cluster[0], cluster[1], cluster[2], cluster[3]) for cluster in pyramid.query(z, bbox, start_day))
+
+
+def test_zoom_is_clamped(eq):
+    pyramid = eq.ClusterPyramid()
+    pyramid.apply(random_rows(np.random.default_rng(0), 500), [])
+    assert counts(pyramid, 99, 0) == counts(pyramid, eq.ClusterPyramid.MAX_ZOOM, 0)
+    assert counts(pyramid, -3, 0) == counts(pyramid, 0, 0)
+
+
+def test_every_level_counts_every_event(eq):
+    rows = random_rows(np.random.default_rng(1), 2000)
+    pyramid = eq.ClusterPyramid()
+    pyramid.apply(rows, [])
+    start_day = eq.epoch_day(T) - 7
+    recent = sum(1 for row in rows if eq.epoch_day(row[5]) >= start_day)
+    for z in range(eq.ClusterPyramid.MAX_ZOOM + 1):
+        assert sum(cluster[2] for cluster in pyramid.query(z, None, 0)) == len(rows)
+        assert sum(cluster[2] for cluster in pyramid.query(z, None, start_day)) == recent
+
+
+def test_incremental_updates_match_a_rebuild(eq):
+    rows = random_rows(np.random.default_rng(2), 1000)
+    pyramid = eq.ClusterPyramid()
+    pyramid.apply(rows, [])
+    revised = [(event_id, -lon, lat, depth, mag + 0.5, event_time, place) for event_id, lon, lat, depth, mag, event_time, place in rows[:200]]
+    deleted = [row[0] for row in rows[200:400]]
+    pyramid.apply(revised, deleted)
+
+    rebuilt = eq.ClusterPyramid()
+    rebuilt.apply(revised + rows[400:], [])
+    for z in (0, 3, eq.ClusterPyramid.MAX_ZOOM):
+        for bbox in (None, (170, -40, -170, 40)):
+            assert counts(pyramid, z, 0, bbox) == counts(rebuilt, z, 0, bbox)
+
+
+def test_clusters_endpoint_reports_the_clamped_zoom(eq, monkeypatch):
+    catalog = eq.Catalog.from_rows([row[:7] for row in random_rows(np.random.default_rng(3), 100)])
+    monkeypatch.setattr(eq, 'INDEX_PAGE', object())
+    monkeypatch.setattr(eq, 'current_catalog', lambda days: (catalog, None))
+    client = eq.app.test_client()
+    assert client.get('/api/clusters?days=30&z=99').get_json()['z'] == eq.ClusterPyramid.MAX_ZOOM
+    assert client.get('/api/clusters?days=30&z=-3').get_json()['z'] == 0
+
+
+def test_grid_index_matches_brute_force(eq):
+    rng = np.random.default_rng(4)
+    lon = rng.uniform(-180, 180, 5000).astype(np.float32)
+    lat = rng.uniform(-90, 90, 5000).astype(np.float32)
+    lon[:3], lat[:3] = (-180, 180, 0.5), (-90, 90, 10.0)
+    grid = eq.GridIndex(lon, lat)
+    for west, south, east, north in [(-180, -90, 180, 90), (0.5, 10.0, 0.5, 10.0), (-30.25, -20.5, 40.75, 49.9), (170, -50, -170, 10)]:
+        if west <= east:
+            expected = (lon >= west) & (lon <= east)
+        else:
+            expected = (lon >= west) | (lon <= east)
+        expected = np.flatnonzero(expected & (lat >= south) & (lat <= north))
+        assert np.sort(grid.query(west, south, east, north)).tolist() == expected.tolist()
@@ -0,0 +1,198 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from fake_usgs import FakeUSGS
+
+HOUR = 3600 * 1000
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+# (id, lon, lat, depth, mag, time, place, updated, deleted) rows as the providers return them
+def row(event_id, event_time, updated, mag=3.0, place='Somewhere', deleted=False):
+    return (event_id, 10.0, 20.0, 5.0, mag, event_time, place, updated, deleted)
+
+
+def ids(events):
+    return sorted(event[0] for event in events)
+
+
+def test_apply_keeps_newest_revision(store):
+    t = now_ms() - HOUR
+    assert store.apply([row('a', t, 100), row('b', t, 100)]) == 2
+    assert store.apply([row('a', t, 50, mag=9.0)]) == 0
+    assert store.apply([row('a', t, 200, mag=4.0)]) == 1
+    assert store.watermark() == 200
+
+    store.follow(store.latest()[1])
+    events, deleted = store.changes_since(0)
+    assert {event[0]: event[4] for event in events} == {'a': 4.0, 'b': 3.0}
+    assert deleted == []
+
+
+def test_changes_since_returns_only_newer_changes_and_tombstones(store):
+    t = now_ms() - HOUR
+    store.apply([row('a', t, 100), row('b', t, 100), row('c', t, 100)])
+    store.follow(store.latest()[1])
+    cursor = store.cursor
+
+    store.apply([row('a', t, 200, mag=5.0), row('b', t, 200, deleted=True)])
+    # Changes past the followed cursor are not served yet
+    assert store.changes_since(cursor) == ([], [])
+
+    store.follow(store.latest()[1])
+    events, deleted = store.changes_since(cursor)
+    assert ids(events) == ['a']
+    assert events[0][4] == 5.0
+    assert len(events[0]) == 10
+    assert deleted == ['b']
+    assert store.changes_since(store.cursor) == ([], [])
+
+    # A deleted event that comes back is an upsert again
+    store.apply([row('b', t, 300)])
+    store.follow(store.latest()[1])
+    assert ids(store.changes_since(cursor)[0]) == ['a', 'b']
+
+
+def test_prune_tombstones_then_forgets_old_events(store, eq):
+    cutoff = eq.window_start_ms(eq.MAX_DAYS)
+    store.apply([row('old', cutoff - HOUR, 100), row('new', now_ms() - HOUR, 100)])
+    store.follow(store.latest()[1])
+    cursor = store.cursor
+
+    assert store.prune(cutoff) == 1
+    store.follow(store.latest()[1])
+    assert store.changes_since(cursor) == ([], ['old'])
+    assert store.latest()[0].ids == ['new']
+
+    # Once the tombstone is a day past the cutoff it is removed for good
+    assert store.prune(cutoff + 86400000 + 2 * HOUR) == 0
+    events, deleted = store.changes_since(0)
+    assert ids(events) == ['new'] and deleted == []
+    assert store.prune(cutoff) == 0
+
+
+def test_follow_notifies_listeners_and_retries_after_a_failure(store):
+    t = now_ms() - HOUR
+    store.apply([row('a', t, 100)])
+    store.follow(store.latest()[1])
+
+    received = []
+    store.subscribe(lambda rows, deleted: received.append((ids(rows), deleted)))
+    assert received == [(['a'], [])]
+
+    failures = [RuntimeError('listener failed')]
+
+    def flaky(rows, deleted):
+        if failures:
+            raise failures.pop()
+
+    store.subscribe(flaky, replay=False)
+    store.apply([row('b', t, 200), row('a', t, 200, deleted=True)])
+    cursor = store.latest()[1]
+    with pytest.raises(RuntimeError):
+        store.follow(cursor)
+    assert store.cursor < cursor
+
+    store.follow(cursor)
+    assert store.cursor == cursor
+    assert received[-1] == (['b'], ['a'])
+
+
+def test_delta_endpoint_rounds_like_the_catalog(eq, store, monkeypatch):
+    ready = threading.Event()
+    ready.set()
+    monkeypatch.setattr(eq, 'INDEX_PAGE', object())
+    monkeypatch.setattr(eq, 'event_store', store)
+    monkeypatch.setattr(eq, 'ingest_worker', SimpleNamespace(ready=ready))
+    t = now_ms() - HOUR
+    store.apply([row('a', t, 100)])
+    store.follow(store.latest()[1])
+    cursor = store.cursor
+    store.apply([('a', 142.123456789, 38.1, 10.000000000000002, 6.800000000000001, t, 'Honshu', 200, False)])
+    store.follow(store.latest()[1])
+
+    body = eq.app.test_client().get(f"/api/earthquakes?since={cursor}").get_json()
+    assert body['cursor'] == store.cursor
+    assert body['events'][0][:7] == ['a', 142.12346, 38.1, 10.0, 6.8, t, 'Honshu']
+    assert body['deleted'] == []
+
+
+def test_catalog_binary_round_trip(eq):
+    t = float(now_ms())
+    catalog = eq.Catalog.from_rows([
+        ('a', -179.5, -60.25, 10.0, 4.5, t - 2000, 'Fiji'),
+        ('b', 12.5, 41.75, float('nan'), float('nan'), t - 1000, 'Rome, Itàly'),
+        ('c', 170.0, 0.0, 600.0, -0.5, t, 'Fiji')
+    ])
+    decoded = eq.Catalog.from_binary(catalog.to_binary())
+
+    assert decoded.ids == ['a', 'b', 'c']
+    assert decoded.places == ['Fiji', 'Rome, Itàly']
+    assert decoded.place_index.tolist() == [0, 1, 0]
+    for name in ('lon', 'lat', 'depth', 'mag', 'time'):
+        np.testing.assert_array_equal(getattr(decoded, name), getattr(catalog, name))
+    np.testing.assert_array_equal(decoded.positions(), catalog.positions().astype(np.float32))
+
+    empty = eq.Catalog.from_binary(eq.Catalog.from_rows([]).to_binary())
+    assert len(empty) == 0 and empty.places == []
+
+
+def test_catalog_binary_rejects_other_payloads(eq):
+    payload = bytearray(eq.Catalog.from_rows([]).to_binary())
+    payload[4] = eq.CATALOG_VERSION + 1
+    with pytest.raises(ValueError):
+        eq.Catalog.from_binary(bytes(payload))
+    with pytest.raises(ValueError):
+        eq.Catalog.from_binary(b'JUNK' + bytes(eq.CATALOG_HEADER.size))
+
+
+@pytest.fixture
+def fake_usgs():
+    fake = FakeUSGS().start()
+    yield fake
+    fake.stop()
+
+
+def test_ingest_sync_against_fake_usgs(eq, store, fake_usgs, tmp_path):
+    t = now_ms() - HOUR
+    past = now_ms() - 10 * HOUR
+    fake_usgs.add_event('us1', 142.0, 38.0, 30.0, 5.5, t, place='Honshu', updated=past)
+    fake_usgs.add_event('us2', -118.0, 34.0, 8.0, 2.1, t + 1000, place='California', updated=past)
+    fake_usgs.add_event('us3', -70.0, -30.0, 50.0, 4.0, eq.window_start_ms(eq.MAX_DAYS) - HOUR, updated=past)
+
+    client = eq.UpstreamClient('usgs', fake_usgs.url, 2, 5, 5)
+    snapshot = eq.CatalogSnapshot(str(tmp_path / 'catalog.snapshot'))
+    worker = eq.IngestWorker(store, snapshot, [eq.GeoJsonProvider('usgs', client)], 0)
+
+    worker.sync()
+    assert snapshot.refresh()
+    catalog, cursor = snapshot.window(eq.window_start_ms(eq.MAX_DAYS))
+    assert catalog.ids == ['us1', 'us2']
+    assert store.watermark() == past
+    store.follow(cursor)
+
+    # The next sync only asks for revisions and picks up the update and the deletion
+    fake_usgs.update_event('us1', mag=5.8)
+    fake_usgs.delete_event('us2')
+    requests = fake_usgs.requests
+    worker.sync()
+    assert fake_usgs.requests == requests + 1
+    assert snapshot.refresh()
+    catalog, new_cursor = snapshot.window(eq.window_start_ms(eq.MAX_DAYS))
+    assert catalog.ids == ['us1']
+    assert catalog.mag.tolist() == [pytest.approx(5.8)]
+
+    store.follow(new_cursor)
+    events, deleted = store.changes_since(cursor)
+    assert ids(events) == ['us1'] and deleted == ['us2']
+
+    # Nothing new upstream: no new snapshot is published
+    worker.sync()
+    assert not snapshot.refresh()
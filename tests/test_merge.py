@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+SOURCES = ['usgs', 'emsc', 'gfz']
+T = 1_700_000_000_000
+
+
+# (source, id, lon, lat, depth, mag, time, place, updated) origin rows
+def origin(source, event_id, lon, lat, mag=4.0, time=T, updated=1):
+    return (source, event_id, lon, lat, 10.0, mag, time, f"{source} place", updated)
+
+
+def merge(eq, origins, sources=SOURCES):
+    return eq.merge_origins(origins, sources, 16000, 100, 0.5)
+
+
+def groups(merged):
+    return sorted(row[9] for row in merged)
+
+
+def test_empty(eq):
+    assert merge(eq, []) == []
+
+
+def test_same_quake_takes_the_preferred_origin(eq):
+    merged = merge(eq, [
+        origin('emsc', 'em1', 142.3, 38.2, mag=4.2, time=T + 3000, updated=5),
+        origin('usgs', 'us1', 142.0, 38.0, updated=2),
+        origin('gfz', 'gf1', 142.1, 38.1, time=T - 2000, updated=3)
+    ])
+    assert merged == [('us1', 142.0, 38.0, 10.0, 4.0, T, 'usgs place', 5, False, 'usgs:us1 emsc:em1 gfz:gf1')]
+
+
+@pytest.mark.parametrize('other', [
+    origin('emsc', 'em1', 142.0, 38.0, time=T + 17000),
+    origin('emsc', 'em1', 143.5, 38.0),
+    origin('emsc', 'em1', 142.0, 38.0, mag=4.6)
+], ids=['time', 'distance', 'magnitude'])
+def test_outside_a_tolerance_stays_apart(eq, other):
+    assert groups(merge(eq, [origin('usgs', 'us1', 142.0, 38.0), other])) == ['emsc:em1', 'usgs:us1']
+
+
+def test_unknown_magnitude_still_matches(eq):
+    merged = merge(eq, [origin('usgs', 'us1', 10.0, 45.0), origin('emsc', 'em1', 10.1, 45.0, mag=None)])
+    assert groups(merged) == ['usgs:us1 emsc:em1']
+
+
+def test_unconfigured_sources_are_left_out(eq):
+    merged = merge(eq, [origin('usgs', 'us1', 10.0, 45.0), origin('isc', 'is1', 10.0, 45.0), origin('isc', 'is2', 50.0, 0.0)])
+    assert groups(merged) == ['usgs:us1']
+    assert merge(eq, [origin('isc', 'is1', 10.0, 45.0)]) == []
+
+
+def test_store_forgets_removed_sources(store):
+    for source in ('usgs', 'emsc', 'gfz'):
+        store.apply_origins(source, [origin(source, f"{source}1", 10.0, 45.0)[1:] + (False,)])
+    assert store.retain_sources(['usgs', 'emsc']) == 1
+    assert sorted(row[0] for row in store.origins(0)) == ['emsc', 'usgs']
+    assert store.watermark('gfz') is None and store.watermark('emsc') == 1
+    assert store.retain_sources(['usgs', 'emsc']) == 0
+
+
+def test_one_origin_per_source_closest_first(eq):
+    merged = merge(eq, [
+        origin('usgs', 'us1', 20.0, 40.0),
+        origin('usgs', 'us2', 20.5, 40.0, time=T + 1000),
+        origin('emsc', 'em1', 20.4, 40.0, time=T + 1000)
+    ])
+    assert groups(merged) == ['usgs:us1', 'usgs:us2 emsc:em1']
+
+
+@pytest.mark.parametrize('lon, lat, other_lon, other_lat', [
+    (179.9, -17.0, -179.9, -17.0),
+    (45.0, 89.9, -135.0, 89.9),
+    (0.0, -89.95, 90.0, -89.95)
+], ids=['antimeridian', 'north-pole', 'south-pole'])
+def test_matches_across_grid_edges(eq, lon, lat, other_lon, other_lat):
+    merged = merge(eq, [origin('usgs', 'us1', lon, lat), origin('emsc', 'em1', other_lon, other_lat)])
+    assert groups(merged) == ['usgs:us1 emsc:em1']
+
+
+# Well separated quakes, each reported by USGS and a jittered copy from EMSC, plus origins
+# only one catalog has: every copy finds its quake whatever the batch size
+@pytest.mark.parametrize('batch_pairs', [None, 1, 7])
+def test_scattered_catalogs(eq, monkeypatch, batch_pairs):
+    if batch_pairs:
+        monkeypatch.setattr(eq, 'MERGE_BATCH_PAIRS', batch_pairs)
+    rng = np.random.default_rng(0)
+    lon = np.repeat(np.arange(-175, 180, 10.0), 17)
+    lat = np.tile(np.arange(-80, 90, 10.0), 36)
+    times = T + rng.integers(0, 86400000, len(lon))
+    origins = []
+    for i in range(len(lon)):
+        origins.append(origin('usgs', f"us{i}", lon[i], lat[i], time=int(times[i])))
+        if i % 5:
+            origins.append(origin(
+                'emsc', f"em{i}", lon[i] + rng.uniform(-0.3, 0.3), lat[i] + rng.uniform(-0.3, 0.3),
+                mag=4.0 + rng.uniform(-0.4, 0.4), time=int(times[i] + rng.integers(-10000, 10000))
+            ))
+    origins.append(origin('emsc', 'lonely', 0.0, 5.0))
+
+    merged = merge(eq, origins)
+    expected = [f"usgs:us{i} emsc:em{i}" if i % 5 else f"usgs:us{i}" for i in range(len(lon))] + ['emsc:lonely']
+    assert groups(merged) == sorted(expected)
@@ -0,0 +1,49 @@
+import time
+
+DAY = 86400000
+
+
+# Time-sorted catalog of one event per day, the last one now
+def catalog(eq, ids):
+    now = int(time.time() * 1000)
+    return eq.Catalog.from_rows([
+        (event_id, 10.0, 20.0, 5.0, 3.0, now - (len(ids) - 1 - i) * DAY, f"place {i}") for i, event_id in enumerate(ids)
+    ])
+
+
+def test_readers_follow_the_writers_generations(eq, tmp_path):
+    path = str(tmp_path / 'catalog.snapshot')
+    writer = eq.CatalogSnapshot(path)
+    reader = eq.CatalogSnapshot(path)
+    assert writer.acquire_writer()
+    assert writer.acquire_writer()
+    # The lock is held for good by the first snapshot to take it
+    assert not reader.acquire_writer()
+    assert not reader.refresh() and reader.generation == 0
+
+    writer.publish(catalog(eq, ['a', 'b']), 7)
+    assert reader.refresh()
+    assert (reader.generation, reader.cursor) == (1, 7)
+    window, cursor = reader.window(eq.window_start_ms(eq.MAX_DAYS))
+    assert (window.ids, cursor) == (['a', 'b'], 7)
+    assert not reader.refresh()
+
+    writer.publish(catalog(eq, ['a', 'b', 'c']), 9)
+    assert reader.refresh()
+    assert (reader.generation, reader.cursor) == (2, 9)
+    assert reader.window(eq.window_start_ms(eq.MAX_DAYS))[0].ids == ['a', 'b', 'c']
+    # A shorter window is cut from the same snapshot
+    assert reader.window(eq.window_start_ms(0))[0].ids == ['c']
+
+
+def test_generation_survives_a_new_writer(eq, tmp_path):
+    path = str(tmp_path / 'catalog.snapshot')
+    eq.CatalogSnapshot(path).publish(catalog(eq, ['a']), 3)
+    # A restarted process maps the published snapshot and continues its generation count
+    restarted = eq.CatalogSnapshot(path)
+    assert restarted.refresh() and restarted.cursor == 3
+    restarted.publish(catalog(eq, ['a', 'b']), 4)
+    reader = eq.CatalogSnapshot(path)
+    assert reader.refresh()
+    assert (reader.generation, reader.cursor) == (2, 4)
+    assert reader.window(eq.window_start_ms(eq.MAX_DAYS))[0].ids == ['a', 'b']
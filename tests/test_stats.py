@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+import pytest
+
+DAY = 86400000
+
+
+# (id, lon, lat, depth, mag, time, place) rows over the last 30 days, some without magnitude
+def random_rows(rng, count, prefix='ev'):
+    now = int(time.time() * 1000)
+    mag = np.round(rng.uniform(-1.5, 8.0, count), 1)
+    mag[rng.random(count) < 0.05] = np.nan
+    return [
+        (f"{prefix}{i}", float(lon), float(lat), 10.0, float(m), int(t), '')
+        for i, (lon, lat, m, t) in enumerate(zip(
+            rng.uniform(-180, 180, count), rng.uniform(-90, 90, count), mag, now - rng.integers(0, 30 * DAY, count)
+        ))
+    ]
+
+
+def normalized(result):
+    result = dict(result)
+    result['daily'] = [day for day in result['daily'] if day['count']]
+    result['energy'] = pytest.approx(result['energy'], rel=1e-9)
+    result['cells'] = [dict(cell, energy=pytest.approx(cell['energy'], rel=1e-9)) for cell in result['cells']]
+    return result
+
+
+BBOXES = [None, (-30, -20, 39.9, 49.9), (170, -50, -170, 10)]
+
+
+def test_incremental_updates_match_a_rebuild(eq):
+    rng = np.random.default_rng(1)
+    rows = random_rows(rng, 4000)
+    stats = eq.SeismicityStats()
+    for batch in np.array_split(np.arange(len(rows)), 5):
+        stats.apply([rows[i] for i in batch], [])
+
+    # Revise some events (magnitude, location, day), delete others, and resend a few unchanged
+    live = {row[0]: row for row in rows}
+    revised = [
+        (event_id, -lon, lat / 2, depth, mag + 0.5 if mag == mag else 3.0, event_time - DAY, place)
+        for event_id, lon, lat, depth, mag, event_time, place in rows[:600]
+    ]
+    deleted = [row[0] for row in rows[600:900]] + ['never-seen']
+    stats.apply(revised + rows[900:950], deleted)
+    live.update((row[0], row) for row in revised)
+    for event_id in deleted:
+        live.pop(event_id, None)
+
+    rebuilt = eq.SeismicityStats()
+    rebuilt.apply(list(live.values()), [])
+    assert stats.events == rebuilt.events
+    start_day = eq.epoch_day(time.time() * 1000) - 40
+    for bbox in BBOXES:
+        for day in (start_day, start_day + 35):
+            assert normalized(stats.query(bbox, day)) == normalized(rebuilt.query(bbox, day))
+
+    # Deleting everything leaves empty counts, not wrapped-around ones
+    stats.apply([], list(live))
+    assert not stats.histograms.any() and not stats.unknown.any()
+    assert stats.query(None, start_day)['count'] == 0
+
+
+def test_query_counts_match_brute_force(eq):
+    rng = np.random.default_rng(2)
+    rows = random_rows(rng, 3000)
+    stats = eq.SeismicityStats()
+    stats.apply(rows, [])
+
+    _, lon, lat, _, mag, event_time, _ = (np.array(column) for column in zip(*rows))
+    start_day = eq.epoch_day(time.time() * 1000) - 10
+    result = stats.query((-30, -20, 39.9, 49.9), start_day)
+    inside = (lon >= -30) & (lon < 40) & (lat >= -20) & (lat < 50) & (event_time // DAY >= start_day)
+    assert result['count'] == int(inside.sum())
+    assert result['without_magnitude'] == int((inside & np.isnan(mag)).sum())
+    assert result['max_mag'] == pytest.approx(np.nanmax(mag[inside]))
+    assert sum(day['count'] for day in result['daily']) == result['count']
+
+
+def test_days_beyond_the_ring_are_dropped(eq):
+    stats = eq.SeismicityStats()
+    first_day = 20000
+    stats.apply([('old', 0.0, 0.0, 10.0, 4.0, first_day * DAY, '')], [])
+    later = (first_day + eq.SeismicityStats.SLOTS) * DAY
+    stats.apply([('new', 0.0, 0.0, 10.0, 5.0, later, '')], [])
+    # The old event's slot now holds the new day; taking it out must not touch that day
+    stats.apply([], ['old'])
+    result = stats.query(None, first_day)
+    assert result['count'] == 1 and result['max_mag'] == 5.0
+    # Events older than the ring are not counted at all
+    stats.apply([('older', 0.0, 0.0, 10.0, 6.0, first_day * DAY, '')], [])
+    assert stats.query(None, first_day)['count'] == 1
+    assert 'older' not in stats.events
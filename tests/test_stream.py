@@ -0,0 +1,56 @@
+import json
+import time
+
+HOUR = 3600 * 1000
+
+
+def row(event_id, updated, mag=3.0, deleted=False):
+    return (event_id, 10.0, 20.0, 5.0, mag, int(time.time() * 1000) - HOUR, 'Somewhere', updated, deleted)
+
+
+# (id, payload) of each queued SSE message
+def messages(client):
+    parsed = []
+    while not client.queue.empty():
+        fields = dict(line.split(': ', 1) for line in client.queue.get_nowait().decode('utf-8').strip().split('\n'))
+        parsed.append((int(fields['id']), json.loads(fields['data'])))
+    return parsed
+
+
+def test_deltas_carry_the_cursor_they_bring_the_client_to(eq, store):
+    hub = eq.StreamHub(store, 10, 10)
+    client = hub.connect()
+
+    store.apply([row('a', 100)])
+    store.follow(store.latest()[1])
+    first = store.cursor
+    store.apply([row('a', 200, mag=4.0), row('b', 200)])
+    store.follow(store.latest()[1])
+    second = store.cursor
+
+    (first_id, first_data), (second_id, second_data) = messages(client)
+    assert (first_id, first_data['cursor']) == (first, first)
+    assert [event[0] for event in first_data['events']] == ['a']
+    assert (second_id, second_data['cursor']) == (second, second)
+    assert sorted(event[0] for event in second_data['events']) == ['a', 'b']
+
+    # Reconnecting with the last id replays nothing the client already has
+    assert store.changes_since(second_id) == ([], [])
+
+
+def test_deltas_round_like_the_catalog(eq, store):
+    hub = eq.StreamHub(store, 10, 10)
+    client = hub.connect()
+    t = int(time.time() * 1000) - HOUR
+    store.apply([
+        ('a', 142.123456789, -38.987654321, 10.000000000000002, 6.800000000000001, t, 'Honshu', 100, False),
+        ('b', -0.1, 0.1, None, None, t + 1, 'Nowhere', 100, False)
+    ])
+    store.follow(store.latest()[1])
+
+    (_, data), = messages(client)
+    catalog = store.latest()[0]
+    for event, (event_id, mag, depth, place, event_time, lon, lat) in zip(data['events'], catalog.table_rows(catalog.order('time'))):
+        assert event[:7] == [event_id, lon, lat, depth, mag, event_time, place]
+    assert data['events'][0][1:5] == [142.12346, -38.98766, 10.0, 6.8]
+    assert data['events'][1][3:5] == [None, None]
@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+BODY = b'{"type": "FeatureCollection", "features": []}'
+
+
+@pytest.fixture
+def upstream(eq, monkeypatch):
+    answers = []
+    monkeypatch.setattr(eq, 'usgs_cache', eq.TTLCache('usgs', 60, 10))
+
+    def get(params, headers=None):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(eq.usgs_client, 'get', get)
+    return answers
+
+
+def test_expired_entry_is_served_when_usgs_fails(eq, upstream):
+    params = eq.usgs_params(1)
+    upstream.append((200, {'ETag': '"1"'}, BODY))
+    entry = eq.fetch_usgs(params)
+    eq.usgs_cache.put(params, entry._replace(fetched_at=time.monotonic() - 3600))
+
+    upstream.append(eq.UpstreamError('connection refused'))
+    assert eq.fetch_usgs(params).catalog is entry.catalog
+    upstream.append((503, {}, b''))
+    assert eq.fetch_usgs(params).catalog is entry.catalog
+    assert not upstream
+
+
+def test_failure_without_a_cached_entry_is_raised(eq, upstream):
+    upstream.append((503, {}, b''))
+    with pytest.raises(eq.UpstreamError):
+        eq.fetch_usgs(eq.usgs_params(2))